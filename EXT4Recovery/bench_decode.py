@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# Micro-benchmark decode inode: struct.unpack từng field (cách cũ) và Struct.unpack_from (hiện tại)
+#
+#   python3 bench_decode.py [image] [số_inode]
+#
+# Không có image thì dùng inode table ngẫu nhiên.
+
+import os
+import struct
+import sys
+import time
+
+from ext4_structures import Inode, EXT4_SUPERBLOCK_OFFSET
+from ext4_utils import EXT4Utils
+
+
+def parse_inode_per_field(data: bytes) -> Inode:
+
+    # Bản cũ: cắt slice + struct.unpack cho từng field
+    inode = Inode()
+    inode.i_mode = struct.unpack('<H', data[0:2])[0]
+    inode.i_uid = struct.unpack('<H', data[2:4])[0]
+    inode.i_size_lo = struct.unpack('<I', data[4:8])[0]
+    inode.i_atime = struct.unpack('<I', data[8:12])[0]
+    inode.i_ctime = struct.unpack('<I', data[12:16])[0]
+    inode.i_mtime = struct.unpack('<I', data[16:20])[0]
+    inode.i_dtime = struct.unpack('<I', data[20:24])[0]
+    inode.i_gid = struct.unpack('<H', data[24:26])[0]
+    inode.i_links_count = struct.unpack('<H', data[26:28])[0]
+    inode.i_blocks_lo = struct.unpack('<I', data[28:32])[0]
+    inode.i_flags = struct.unpack('<I', data[32:36])[0]
+    inode.i_osd1 = struct.unpack('<I', data[36:40])[0]
+    inode.i_block = struct.unpack('<15I', data[40:100])
+    inode.i_generation = struct.unpack('<I', data[100:104])[0]
+    inode.i_file_acl_lo = struct.unpack('<I', data[104:108])[0]
+    inode.i_size_high = struct.unpack('<I', data[108:112])[0]
+    inode.i_obso_faddr = struct.unpack('<I', data[112:116])[0]
+    inode.i_osd2 = bytes(data[116:128])
+    if len(data) >= 256:
+        inode.i_extra_isize = struct.unpack('<H', data[128:130])[0]
+        inode.i_checksum_hi = struct.unpack('<H', data[130:132])[0]
+        inode.i_ctime_extra = struct.unpack('<I', data[132:136])[0]
+        inode.i_mtime_extra = struct.unpack('<I', data[136:140])[0]
+        inode.i_atime_extra = struct.unpack('<I', data[140:144])[0]
+        inode.i_crtime = struct.unpack('<I', data[144:148])[0]
+        inode.i_crtime_extra = struct.unpack('<I', data[148:152])[0]
+        inode.i_version_hi = struct.unpack('<I', data[152:156])[0]
+    return inode
+
+
+def load_inode_table(image_file: str, count: int):
+
+    # Lấy inode table của group 0 (lặp lại nếu không đủ count inode)
+    utils = EXT4Utils()
+    sb = utils.parse_superblock(utils.read_bytes(image_file, EXT4_SUPERBLOCK_OFFSET, 1024))
+    block_size = sb.get_block_size()
+    gdt_offset = (2 if block_size == 1024 else 1) * block_size
+    gd = utils.parse_group_descriptor(utils.read_bytes(image_file, gdt_offset, 64))
+    table = utils.read_bytes(image_file, gd.get_inode_table() * block_size,
+                             sb.s_inodes_per_group * sb.s_inode_size)
+    repeat = -(-count * sb.s_inode_size // len(table))
+    return (table * repeat)[:count * sb.s_inode_size], sb.s_inode_size
+
+
+def bench(name: str, func, table: bytes, inode_size: int, count: int) -> float:
+
+    start = time.perf_counter()
+    func(table, inode_size, count)
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed
+    print(f"  {name:<32} {elapsed:7.3f}s  {rate:>12,.0f} inodes/s")
+    return rate
+
+
+def run_per_field(table: bytes, inode_size: int, count: int) -> None:
+
+    for i in range(count):
+        offset = i * inode_size
+        parse_inode_per_field(table[offset:offset + inode_size])
+
+
+def run_unpack_from(table: bytes, inode_size: int, count: int) -> None:
+
+    parse_inode = EXT4Utils.parse_inode
+    for i in range(count):
+        parse_inode(table, i * inode_size, inode_size)
+
+
+def main():
+
+    image_file = sys.argv[1] if len(sys.argv) > 1 else None
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+
+    if image_file:
+        table, inode_size = load_inode_table(image_file, count)
+    else:
+        inode_size = 256
+        table = os.urandom(count * inode_size)
+
+    print(f"Decode {count:,} inodes ({inode_size} bytes/inode)")
+    before = bench("struct.unpack từng field", run_per_field, table, inode_size, count)
+    after = bench("Struct.unpack_from", run_unpack_from, table, inode_size, count)
+    print(f"  Tăng tốc: x{after / before:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Set, Union
+
+
+# read_blocks lưu view read-only trên buffer preadv; read_block luôn trả về bytes
+BlockData = Union[bytes, memoryview]
+
+
+class BlockCache:
+    """LRU cache cho block, giới hạn theo số bytes, dùng chung giữa các BlockDevice
+
+    Value là bytes hoặc memoryview read-only (block đọc qua read_blocks).
+    Key là (device key, block size, block number): cùng một file nhưng đọc với
+    block size khác nhau (ví dụ khi dò backup superblock) là các entry khác nhau.
+    """
+
+    def __init__(self, capacity_bytes: int = 64 * 1024 * 1024):
+
+        self.capacity_bytes = capacity_bytes
+        self._entries: "OrderedDict[tuple, BlockData]" = OrderedDict()
+        self._block_sizes: Dict[Hashable, Set[int]] = {}
+        self._stamps: Dict[Hashable, Hashable] = {}
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+
+        # Thống kê
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.bytes_saved = 0
+
+    def get(self, device_key: Hashable, block_number: int, block_size: int) -> Optional[BlockData]:
+
+        key = (device_key, block_size, block_number)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.bytes_saved += len(data)
+            return data
+
+    def put(self, device_key: Hashable, block_number: int, block_size: int, data: BlockData) -> None:
+
+        if len(data) > self.capacity_bytes:
+            return
+
+        key = (device_key, block_size, block_number)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old)
+
+            self._entries[key] = data
+            self.current_bytes += len(data)
+            self._block_sizes.setdefault(device_key, set()).add(block_size)
+
+            while self.current_bytes > self.capacity_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def invalidate_range(self, device_key: Hashable, offset: int, length: int) -> None:
+
+        if length <= 0:
+            return
+
+        with self._lock:
+            for block_size in self._block_sizes.get(device_key, ()):
+                first = offset // block_size
+                last = (offset + length - 1) // block_size
+                for block_number in range(first, last + 1):
+                    old = self._entries.pop((device_key, block_size, block_number), None)
+                    if old is not None:
+                        self.current_bytes -= len(old)
+                        self.invalidations += 1
+
+    def invalidate_device(self, device_key: Hashable) -> None:
+
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == device_key]
+            for key in stale:
+                self.current_bytes -= len(self._entries.pop(key))
+            self.invalidations += len(stale)
+            self._block_sizes.pop(device_key, None)
+
+    def validate(self, device_key: Hashable, stamp: Hashable) -> None:
+
+        # stamp = (mtime, size) lúc mở device; khác lần trước nghĩa là file đã bị
+        # thay đổi từ bên ngoài (mount, fsck, ...) nên bỏ hết block cũ
+        with self._lock:
+            previous = self._stamps.get(device_key)
+            self._stamps[device_key] = stamp
+        if previous is not None and previous != stamp:
+            self.invalidate_device(device_key)
+
+    def clear(self) -> None:
+
+        with self._lock:
+            self._entries.clear()
+            self._block_sizes.clear()
+            self.current_bytes = 0
+
+    def reset_stats(self) -> None:
+
+        with self._lock:
+            self.hits = self.misses = self.evictions = 0
+            self.invalidations = self.bytes_saved = 0
+
+    @property
+    def hit_ratio(self) -> float:
+
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+
+        with self._lock:
+            return {
+                'capacity_bytes': self.capacity_bytes,
+                'current_bytes': self.current_bytes,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hit_ratio,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'bytes_saved': self.bytes_saved,
+            }
+
+
+# Cache mặc định dùng chung cho mọi BlockDevice trong process
+shared_block_cache = BlockCache()
@@ -0,0 +1,667 @@
+import errno
+import mmap
+import os
+import stat
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from block_cache import BlockCache, shared_block_cache
+
+
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+
+# Chép vùng dữ liệu sang file khác: thử lần lượt, cách nào lỗi thì lùi xuống cách sau
+COPY_METHODS = ('copy_file_range', 'sendfile', 'pread')
+
+# copy_file_range / sendfile không dùng được giữa hai fd này (khác filesystem, O_DIRECT,
+# kernel cũ...) - không phải lỗi I/O thật
+_COPY_FALLBACK_ERRNOS = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EBADF,
+                         getattr(errno, 'EOPNOTSUPP', errno.ENOSYS),
+                         getattr(errno, 'ENOTSUP', errno.ENOSYS)}
+
+
+class BlockDevice:
+    """Handle mở image/device một lần, đọc ghi bằng os.pread/os.pwrite"""
+
+    # Khoảng trống tối đa (số block) giữa hai block vẫn được gộp chung một lần đọc
+    DEFAULT_MAX_GAP = 8
+
+    # Mỗi lần gọi copy_file_range / sendfile chép tối đa chừng này; buffer của pread/pwrite
+    COPY_CHUNK = 64 * 1024 * 1024
+    COPY_BUFFER = 8 * 1024 * 1024
+
+    def __init__(self, path: str, writable: bool = False,
+                 cache: Optional[BlockCache] = shared_block_cache):
+
+        self.path = path
+        self.writable = writable
+        self.cache = cache
+        self.key = None
+        self.stamp = None
+        # Số lần ghi qua handle này: cache theo stamp (ví dụ bảng GDT) dùng để biết dữ liệu đã đổi
+        self.writes = 0
+        # Cách chép dữ liệu sang file khác đã chạy được (copy_to), None = chưa thử
+        self.copy_method: Optional[str] = None
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+        self.open()
+
+    def open(self) -> None:
+
+        with self._lock:
+            if self._fd is not None:
+                return
+            flags = os.O_RDWR if self.writable else os.O_RDONLY
+            self._fd = os.open(self.path, flags | getattr(os, 'O_BINARY', 0))
+
+            # Key cache theo (st_dev, st_ino): nhiều handle tới cùng một image dùng chung cache
+            st = os.fstat(self._fd)
+            self.key = (st.st_rdev, 0) if stat.S_ISBLK(st.st_mode) else (st.st_dev, st.st_ino)
+            self.stamp = (st.st_mtime_ns, st.st_size)
+        if self.cache is not None:
+            self.cache.validate(self.key, self.stamp)
+
+    def close(self) -> None:
+
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __repr__(self) -> str:
+        mode = 'rw' if self.writable else 'ro'
+        return f"BlockDevice({self.path!r}, {mode})"
+
+    @property
+    def closed(self) -> bool:
+        return self._fd is None
+
+    def fileno(self) -> int:
+
+        if self._fd is None:
+            raise ValueError(f"BlockDevice {self.path} đã đóng")
+        return self._fd
+
+    def is_block_device(self) -> bool:
+
+        return stat.S_ISBLK(os.fstat(self.fileno()).st_mode)
+
+    def size(self) -> int:
+
+        # st_size = 0 với block device nên dùng lseek(SEEK_END)
+        return os.lseek(self.fileno(), 0, os.SEEK_END)
+
+    def data_ranges(self, start: int = 0, end: Optional[int] = None) -> List[Tuple[int, int]]:
+
+        # Các vùng (offset, length) có dữ liệu trong [start, end) theo SEEK_DATA/SEEK_HOLE;
+        # filesystem/device không hỗ trợ thì coi cả vùng là dữ liệu
+        size = self.size()
+        if end is None or end > size:
+            end = size
+        if start >= end:
+            return []
+        if not hasattr(os, 'SEEK_DATA'):
+            return [(start, end - start)]
+
+        fd = self.fileno()
+        ranges: List[Tuple[int, int]] = []
+        offset = start
+        try:
+            while offset < end:
+                try:
+                    data_start = os.lseek(fd, offset, os.SEEK_DATA)
+                except OSError as e:
+                    if e.errno == errno.ENXIO:
+                        # Không còn dữ liệu phía sau: phần còn lại là hole
+                        break
+                    raise
+                if data_start >= end:
+                    break
+                data_end = min(os.lseek(fd, data_start, os.SEEK_HOLE), end)
+                ranges.append((data_start, data_end - data_start))
+                offset = data_end
+        except OSError:
+            return [(start, end - start)]
+        return ranges
+
+    def iter_ranges(self, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, int, bool]]:
+
+        # (offset, length, is_data) phủ kín [start, end); hole (is_data=False) đọc ra toàn zero
+        size = self.size()
+        if end is None or end > size:
+            end = size
+        offset = start
+        for data_start, length in self.data_ranges(start, end):
+            if data_start > offset:
+                yield offset, data_start - offset, False
+            yield data_start, length, True
+            offset = data_start + length
+        if offset < end:
+            yield offset, end - offset, False
+
+    def _ensure_writable(self) -> None:
+
+        # Mở lại ở chế độ đọc/ghi khi có lệnh ghi đầu tiên
+        with self._lock:
+            if self.writable and self._fd is not None:
+                return
+            self._replace_fd(os.open(self.path, os.O_RDWR | getattr(os, 'O_BINARY', 0)))
+            self.writable = True
+
+    def _replace_fd(self, new_fd: int) -> None:
+
+        # Gọi khi đang giữ self._lock. Thread khác có thể đã lấy fileno() và đang đọc:
+        # dup2 đè lên đúng số fd cũ thay vì đóng nó, số fd đó luôn hợp lệ
+        if self._fd is None:
+            self._fd = new_fd
+            return
+        try:
+            os.dup2(new_fd, self._fd, inheritable=False)
+        finally:
+            os.close(new_fd)
+
+    def pread(self, size: int, offset: int) -> bytes:
+
+        fd = self.fileno()
+        data = os.pread(fd, size, offset)
+        if len(data) == size or not data:
+            return data
+
+        # pread có thể trả về thiếu (device, pipe, signal) - đọc tiếp cho đủ
+        chunks = [data]
+        got = len(data)
+        while got < size:
+            chunk = os.pread(fd, size - got, offset + got)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            got += len(chunk)
+        return b''.join(chunks)
+
+    def readinto(self, buf, offset: int) -> int:
+
+        # Đọc thẳng vào buffer có sẵn (không tạo bytes mới); trả về số byte đọc được
+        view = memoryview(buf).cast('B')
+        fd = self.fileno()
+        got = 0
+        while got < len(view):
+            if hasattr(os, 'preadv'):
+                n = os.preadv(fd, [view[got:]], offset + got)
+            else:
+                chunk = os.pread(fd, len(view) - got, offset + got)
+                n = len(chunk)
+                view[got:got + n] = chunk
+            if n <= 0:
+                break
+            got += n
+        return got
+
+    def read_view(self, offset: int, size: int) -> memoryview:
+
+        # Bản pread không có mapping: bọc bytes vừa đọc trong memoryview
+        return memoryview(self.pread(size, offset))
+
+    def pwrite(self, data: bytes, offset: int) -> int:
+
+        if not self.writable:
+            self._ensure_writable()
+
+        fd = self.fileno()
+        view = memoryview(data)
+        written = 0
+        while written < len(view):
+            n = os.pwrite(fd, view[written:], offset + written)
+            if n <= 0:
+                break
+            written += n
+
+        if self.cache is not None:
+            self.cache.invalidate_range(self.key, offset, max(written, len(view)))
+        self.writes += 1
+        return written
+
+    def read_block(self, block_number: int, block_size: int) -> bytes:
+
+        if self.cache is None:
+            return self._read_block_uncached(block_number, block_size)
+
+        data = self.cache.get(self.key, block_number, block_size)
+        if data is None or isinstance(data, memoryview):
+            # Block do read_blocks nạp vào cache là memoryview: đổi sang bytes một lần rồi lưu lại
+            data = self._read_block_uncached(block_number, block_size) if data is None else data.tobytes()
+            self.cache.put(self.key, block_number, block_size, data)
+        return data
+
+    def _read_block_uncached(self, block_number: int, block_size: int) -> bytes:
+
+        data = self.pread(block_size, block_number * block_size)
+        if len(data) < block_size:
+            # Pad với zeros nếu đọc không đủ
+            data += b'\x00' * (block_size - len(data))
+        return data
+
+    def read_blocks(self, block_list: Iterable[int], block_size: int,
+                    max_gap: int = DEFAULT_MAX_GAP, use_cache: bool = True) -> Dict[int, memoryview]:
+
+        # Sắp xếp, bỏ trùng, lấy từ cache trước; phần còn lại gộp thành các run
+        # liên tiếp (cho phép hở tối đa max_gap block) và đọc mỗi run bằng 1 preadv
+        result: Dict[int, memoryview] = {}
+        missing: List[int] = []
+        for block_number in sorted(set(block_list)):
+            cached = None
+            if use_cache and self.cache is not None:
+                cached = self.cache.get(self.key, block_number, block_size)
+            if cached is not None:
+                result[block_number] = memoryview(cached)
+            else:
+                missing.append(block_number)
+
+        for run in self._coalesce(missing, max_gap, IOV_MAX):
+            views = self._read_run(run, block_size)
+            for block_number, view in views.items():
+                result[block_number] = view
+                if use_cache and self.cache is not None:
+                    self.cache.put(self.key, block_number, block_size, view)
+        return result
+
+    def read_range(self, start_block: int, count: int, block_size: int,
+                   use_cache: bool = True) -> List[memoryview]:
+
+        blocks = self.read_blocks(range(start_block, start_block + count), block_size,
+                                  use_cache=use_cache)
+        return [blocks[start_block + i] for i in range(count)]
+
+    @staticmethod
+    def _coalesce(blocks: List[int], max_gap: int, max_iov: int) -> List[List[int]]:
+
+        runs: List[List[int]] = []
+        current: List[int] = []
+        iov = 0
+        for block_number in blocks:
+            if current:
+                gap = block_number - current[-1] - 1
+                if gap <= max_gap and iov + 1 + (gap > 0) <= max_iov:
+                    current.append(block_number)
+                    iov += 1 + (gap > 0)
+                    continue
+                runs.append(current)
+            current = [block_number]
+            iov = 1
+        if current:
+            runs.append(current)
+        return runs
+
+    def _read_run(self, run: List[int], block_size: int) -> Dict[int, memoryview]:
+
+        # Mỗi block có buffer riêng; các block hở ở giữa đọc vào buffer bỏ đi
+        buffers: List[bytearray] = []
+        owners: List[Optional[int]] = []
+        previous = None
+        for block_number in run:
+            if previous is not None and block_number - previous > 1:
+                buffers.append(bytearray((block_number - previous - 1) * block_size))
+                owners.append(None)
+            buffers.append(bytearray(block_size))
+            owners.append(block_number)
+            previous = block_number
+
+        self._readv_into(buffers, run[0] * block_size)
+        return {owner: memoryview(buf).toreadonly()
+                for owner, buf in zip(owners, buffers) if owner is not None}
+
+    def _readv_into(self, buffers: List[bytearray], offset: int) -> int:
+
+        fd = self.fileno()
+        total = sum(len(buf) for buf in buffers)
+        if not hasattr(os, 'preadv'):
+            data = self.pread(total, offset)
+            pos = 0
+            for buf in buffers:
+                chunk = data[pos:pos + len(buf)]
+                buf[:len(chunk)] = chunk
+                pos += len(buf)
+            return len(data)
+
+        got = os.preadv(fd, buffers, offset)
+        if got >= total or got == 0:
+            return got
+
+        # Đọc thiếu: đọc tiếp phần còn lại từ buffer đang dở; thiếu hẳn (EOF) giữ zeros
+        pos = 0
+        for buf in buffers:
+            if got < pos + len(buf):
+                start = max(0, got - pos)
+                rest = self.pread(len(buf) - start, offset + pos + start)
+                buf[start:start + len(rest)] = rest
+            pos += len(buf)
+        return total
+
+    def write_block(self, block_number: int, data: bytes, block_size: int) -> int:
+
+        return self.pwrite(data, block_number * block_size)
+
+    def copy_to(self, out_fd: int, offset: int, length: int, out_offset: int) -> int:
+
+        # Chép [offset, offset + length) của image sang out_fd tại out_offset, dữ liệu không
+        # đi qua object Python: copy_file_range -> sendfile -> pread/pwrite. Trả về số byte đã chép
+        done = 0
+        buf = None
+        while done < length:
+            method = self.copy_method or COPY_METHODS[0]
+            size = min(length - done, self.COPY_CHUNK)
+            try:
+                if method == 'copy_file_range':
+                    n = os.copy_file_range(self.fileno(), out_fd, size,
+                                           offset + done, out_offset + done)
+                elif method == 'sendfile':
+                    os.lseek(out_fd, out_offset + done, os.SEEK_SET)
+                    n = os.sendfile(out_fd, self.fileno(), offset + done, size)
+                else:
+                    if buf is None:
+                        buf = bytearray(min(length, self.COPY_BUFFER))
+                    view = memoryview(buf)[:min(size, len(buf))]
+                    n = self.readinto(view, offset + done)
+                    written = 0
+                    while written < n:
+                        written += os.pwrite(out_fd, view[written:n], out_offset + done + written)
+            except AttributeError:
+                # Python không có os.copy_file_range (< 3.8) / os.sendfile
+                self.copy_method = COPY_METHODS[COPY_METHODS.index(method) + 1]
+                continue
+            except OSError as e:
+                if e.errno not in _COPY_FALLBACK_ERRNOS or method == COPY_METHODS[-1]:
+                    raise
+                self.copy_method = COPY_METHODS[COPY_METHODS.index(method) + 1]
+                continue
+
+            if n <= 0:
+                # Hết image
+                break
+            self.copy_method = method
+            done += n
+        return done
+
+    def flush(self) -> None:
+
+        if self._fd is not None and self.writable:
+            os.fsync(self._fd)
+
+
+class DirectBlockDevice(BlockDevice):
+    """BlockDevice đọc bỏ qua page cache: O_DIRECT, hoặc posix_fadvise nếu không có
+
+    Dùng khi quét cả một device lớn đang chạy (/dev/sdX nhiều TB) để không đẩy
+    page cache của các dịch vụ khác ra ngoài. Offset/kích thước lẻ (ví dụ
+    superblock ở offset 1024) được căn lại qua buffer trung gian.
+    """
+
+    # Căn theo 4096 là đủ cho cả sector 512 và 4K
+    ALIGNMENT = 4096
+
+    def __init__(self, path: str, writable: bool = False,
+                 cache: Optional[BlockCache] = shared_block_cache,
+                 alignment: int = ALIGNMENT):
+
+        self.alignment = alignment
+        self.direct = False
+        super().__init__(path, writable=writable, cache=cache)
+
+    def open(self) -> None:
+
+        super().open()
+        if hasattr(os, 'O_DIRECT') and not self.writable:
+            try:
+                self._reopen(direct=True)
+            except OSError:
+                # tmpfs, một số FUSE... không cho O_DIRECT
+                self.direct = False
+        if not self.direct:
+            self._advise(0, 0, 'POSIX_FADV_SEQUENTIAL')
+
+    def _reopen(self, direct: bool) -> None:
+
+        flags = os.O_RDWR if self.writable else os.O_RDONLY
+        if direct:
+            flags |= os.O_DIRECT
+        with self._lock:
+            if self.direct == direct and self._fd is not None:
+                # Thread khác vừa mở lại xong
+                return
+            self._replace_fd(os.open(self.path, flags | getattr(os, 'O_BINARY', 0)))
+            self.direct = direct
+
+    def _ensure_writable(self) -> None:
+
+        # Ghi đi đường thường (dữ liệu ghi không căn); đọc sau đó dùng fadvise
+        super()._ensure_writable()
+        self.direct = False
+
+    def _advise(self, offset: int, length: int, advice: str) -> None:
+
+        if self.direct or not hasattr(os, 'posix_fadvise') or self._fd is None:
+            return
+        try:
+            os.posix_fadvise(self._fd, offset, length, getattr(os, advice))
+        except OSError:
+            pass
+
+    def _aligned_read(self, size: int, offset: int) -> bytes:
+
+        # Mở rộng vùng đọc ra biên alignment, đọc vào buffer mmap (căn theo page)
+        align = self.alignment
+        start = offset - offset % align
+        end = -(-(offset + size) // align) * align
+        buf = mmap.mmap(-1, end - start)
+        try:
+            view = memoryview(buf)
+            got = 0
+            while got < len(view):
+                n = os.preadv(self.fileno(), [view[got:]], start + got)
+                if n <= 0:
+                    break
+                got += n
+                if got % align:
+                    # Đọc thiếu giữa chừng chỉ xảy ra ở cuối file
+                    break
+            lo = offset - start
+            hi = min(lo + size, got)
+            data = bytes(view[lo:hi]) if hi > lo else b''
+            view.release()
+            return data
+        finally:
+            buf.close()
+
+    def pread(self, size: int, offset: int) -> bytes:
+
+        if self.direct:
+            try:
+                return self._aligned_read(size, offset)
+            except OSError:
+                # Filesystem nhận cờ O_DIRECT nhưng từ chối lúc đọc (EINVAL)
+                self._reopen(direct=False)
+
+        data = super().pread(size, offset)
+        self._advise(offset, size, 'POSIX_FADV_DONTNEED')
+        return data
+
+    def readinto(self, buf, offset: int) -> int:
+
+        view = memoryview(buf).cast('B')
+        if self.direct:
+            align = self.alignment
+            if offset % align == 0 and len(view) % align == 0:
+                # Buffer của ReadaheadReader là mmap (căn theo page): đọc thẳng vào
+                try:
+                    return super().readinto(view, offset)
+                except OSError:
+                    pass
+            data = self.pread(len(view), offset)
+            view[:len(data)] = data
+            return len(data)
+
+        got = super().readinto(view, offset)
+        self._advise(offset, got, 'POSIX_FADV_DONTNEED')
+        return got
+
+    def _readv_into(self, buffers: List[bytearray], offset: int) -> int:
+
+        # bytearray không căn địa chỉ: đọc một lần qua buffer căn rồi chia ra
+        data = self.pread(sum(len(buf) for buf in buffers), offset)
+        pos = 0
+        for buf in buffers:
+            chunk = data[pos:pos + len(buf)]
+            buf[:len(chunk)] = chunk
+            pos += len(buf)
+        return len(data)
+
+
+class MappedBlockDevice(BlockDevice):
+    """BlockDevice đọc qua mmap, trả về memoryview trỏ thẳng vào mapping"""
+
+    # 1 GiB mỗi cửa sổ, tối đa 4 cửa sổ cùng lúc (4 GiB address space)
+    DEFAULT_WINDOW_SIZE = 1 << 30
+    DEFAULT_MAX_WINDOWS = 4
+
+    def __init__(self, path: str, writable: bool = False,
+                 cache: Optional[BlockCache] = shared_block_cache,
+                 window_size: int = DEFAULT_WINDOW_SIZE,
+                 max_windows: int = DEFAULT_MAX_WINDOWS):
+
+        granularity = mmap.ALLOCATIONGRANULARITY
+        self.window_size = max(granularity, (window_size // granularity) * granularity)
+        self.max_windows = max(1, max_windows)
+        self._windows: "OrderedDict[int, mmap.mmap]" = OrderedDict()
+        self._map_lock = threading.Lock()
+        self._size = 0
+        self.mapped = True
+        super().__init__(path, writable=writable, cache=cache)
+
+    def open(self) -> None:
+
+        super().open()
+        self._size = self.size()
+        if self._size == 0:
+            # Không map được file rỗng / device không báo kích thước
+            self.mapped = False
+
+    def close(self) -> None:
+
+        with self._map_lock:
+            windows = list(self._windows.values())
+            self._windows.clear()
+        for window in windows:
+            try:
+                window.close()
+            except BufferError:
+                # Còn memoryview đang trỏ vào: để GC unmap khi view được giải phóng
+                pass
+        super().close()
+
+    def _get_window(self, index: int) -> Optional[mmap.mmap]:
+
+        with self._map_lock:
+            window = self._windows.get(index)
+            if window is not None:
+                self._windows.move_to_end(index)
+                return window
+
+            start = index * self.window_size
+            length = min(self.window_size, self._size - start)
+            if length <= 0:
+                return None
+            try:
+                window = mmap.mmap(self.fileno(), length, access=mmap.ACCESS_READ, offset=start)
+            except (OSError, ValueError):
+                # Device không hỗ trợ mmap: chuyển hẳn sang pread
+                self.mapped = False
+                return None
+
+            self._windows[index] = window
+            while len(self._windows) > self.max_windows:
+                # Bỏ tham chiếu; mapping được unmap khi không còn view nào dùng
+                self._windows.popitem(last=False)
+            return window
+
+    def read_view(self, offset: int, size: int) -> memoryview:
+
+        if not self.mapped or offset >= self._size:
+            return memoryview(BlockDevice.pread(self, size, offset))
+
+        index = offset // self.window_size
+        local = offset - index * self.window_size
+        if local + size > self.window_size:
+            # Vùng đọc vắt qua 2 cửa sổ: copy qua pread
+            return memoryview(BlockDevice.pread(self, size, offset))
+
+        window = self._get_window(index)
+        if window is None:
+            return memoryview(BlockDevice.pread(self, size, offset))
+        return memoryview(window)[local:local + size]
+
+    def pread(self, size: int, offset: int) -> bytes:
+
+        if not self.mapped:
+            return super().pread(size, offset)
+        return bytes(self.read_view(offset, size))
+
+    def read_blocks(self, block_list: Iterable[int], block_size: int,
+                    max_gap: int = BlockDevice.DEFAULT_MAX_GAP, use_cache: bool = True) -> Dict[int, memoryview]:
+
+        if not self.mapped:
+            return super().read_blocks(block_list, block_size, max_gap, use_cache)
+
+        # Đã map: view thẳng vào mapping, không cần syscall hay cache
+        result: Dict[int, memoryview] = {}
+        for block_number in sorted(set(block_list)):
+            view = self.read_view(block_number * block_size, block_size)
+            if len(view) < block_size:
+                view = memoryview(bytes(view) + b'\x00' * (block_size - len(view)))
+            result[block_number] = view
+        return result
+
+    def _read_block_uncached(self, block_number: int, block_size: int) -> bytes:
+
+        data = self.read_view(block_number * block_size, block_size)
+        if len(data) < block_size:
+            return bytes(data) + b'\x00' * (block_size - len(data))
+        return bytes(data)
+
+    def pwrite(self, data: bytes, offset: int) -> int:
+
+        written = super().pwrite(data, offset)
+        # Mapping MAP_SHARED thấy ngay dữ liệu mới qua page cache
+        self._size = max(self._size, offset + written)
+        return written
+
+
+def open_image(path: str, writable: bool = False, use_mmap: bool = True,
+               cache: Optional[BlockCache] = shared_block_cache,
+               direct: Optional[bool] = False) -> BlockDevice:
+
+    # direct=None: tự bật chế độ bỏ qua page cache khi quét block device thật
+    if direct is None:
+        try:
+            direct = stat.S_ISBLK(os.stat(path).st_mode)
+        except OSError:
+            direct = False
+    if direct:
+        return DirectBlockDevice(path, writable=writable, cache=cache)
+    if use_mmap:
+        return MappedBlockDevice(path, writable=writable, cache=cache)
+    return BlockDevice(path, writable=writable, cache=cache)
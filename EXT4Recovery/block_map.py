@@ -0,0 +1,209 @@
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from ext4_structures import Extent, EXT4_EXTENTS_FL, EXT4_INLINE_DATA_FL
+from extent_tree import ExtentTree
+from indirect_map import IndirectBlockMapper
+
+
+# Số block map (mỗi inode một map) giữ lại trong BlockMapCache
+BLOCK_MAP_CACHE_SIZE = 1024
+
+# (logical, physical, số block, uninit)
+Run = Tuple[int, int, int, bool]
+
+
+class InodeBlockMap:
+    """Ánh xạ logical -> physical block của một inode
+
+    Lưu các run (logical, physical, length) trong các mảng song song sắp xếp theo logical;
+    tra một block hoặc một khoảng bằng bisect: O(log n) theo số run.
+    Logical block không nằm trong run nào là hole (đọc ra toàn 0).
+    """
+
+    __slots__ = ('logical', 'physical', 'length', 'uninit', 'meta_blocks')
+
+    def __init__(self, runs: Iterable[Run] = (), meta_blocks: Sequence[int] = ()):
+
+        self.logical = array('Q')
+        self.physical = array('Q')
+        self.length = array('I')
+        self.uninit = bytearray()
+        self.meta_blocks = list(meta_blocks)
+
+        for logical, physical, length, uninit in sorted(runs):
+            if length <= 0:
+                continue
+            # Bỏ phần chồng lấn với run trước (tree hỏng)
+            if self.logical:
+                end = self.logical[-1] + self.length[-1]
+                if logical < end:
+                    skip = end - logical
+                    if skip >= length:
+                        continue
+                    logical, physical, length = logical + skip, physical + skip, length - skip
+                # Gộp run liền kề cả logical lẫn physical
+                if logical == end and physical == self.physical[-1] + self.length[-1] \
+                        and bool(uninit) == bool(self.uninit[-1]) and self.length[-1] + length < 1 << 32:
+                    self.length[-1] += length
+                    continue
+            self.logical.append(logical)
+            self.physical.append(physical)
+            self.length.append(length)
+            self.uninit.append(1 if uninit else 0)
+
+    @classmethod
+    def from_extents(cls, extents: Iterable[Extent], meta_blocks: Sequence[int] = ()) -> 'InodeBlockMap':
+
+        return cls(((e.ee_block, e.get_start_block(), e.get_length(), e.is_uninitialized())
+                    for e in extents), meta_blocks)
+
+    @classmethod
+    def from_block_list(cls, blocks: Sequence[int], first_logical: int = 0,
+                        meta_blocks: Sequence[int] = ()) -> 'InodeBlockMap':
+
+        # blocks[i] là physical của logical first_logical + i (0 = hole)
+        runs = []
+        start = None
+        for i, physical in enumerate(blocks):
+            if start is not None and physical and physical == blocks[i - 1] + 1:
+                continue
+            if start is not None:
+                runs.append((first_logical + start, blocks[start], i - start, False))
+            start = i if physical else None
+        if start is not None:
+            runs.append((first_logical + start, blocks[start], len(blocks) - start, False))
+        return cls(runs, meta_blocks)
+
+    def __len__(self) -> int:
+        return len(self.logical)
+
+    def __iter__(self) -> Iterator[Run]:
+
+        for i in range(len(self.logical)):
+            yield self.logical[i], self.physical[i], self.length[i], bool(self.uninit[i])
+
+    @property
+    def mapped_blocks(self) -> int:
+
+        return sum(self.length)
+
+    @property
+    def end(self) -> int:
+
+        # Logical block ngay sau run cuối cùng
+        if not self.logical:
+            return 0
+        return self.logical[-1] + self.length[-1]
+
+    def _find(self, logical: int) -> int:
+
+        # Index của run chứa logical, -1 nếu là hole
+        i = bisect_right(self.logical, logical) - 1
+        if i >= 0 and logical < self.logical[i] + self.length[i]:
+            return i
+        return -1
+
+    def lookup(self, logical: int) -> Optional[int]:
+
+        # Physical block của logical; None nếu là hole hoặc thuộc extent uninit
+        i = self._find(logical)
+        if i < 0 or self.uninit[i]:
+            return None
+        return self.physical[i] + logical - self.logical[i]
+
+    def lookup_run(self, logical: int) -> Optional[Run]:
+
+        # Phần còn lại của run chứa logical (bắt đầu từ chính logical)
+        i = self._find(logical)
+        if i < 0:
+            return None
+        skip = logical - self.logical[i]
+        return logical, self.physical[i] + skip, self.length[i] - skip, bool(self.uninit[i])
+
+    def range(self, first: int, count: int) -> List[Run]:
+
+        # Các đoạn đã map trong [first, first + count), cắt theo biên của khoảng
+        last = first + count
+        i = max(bisect_right(self.logical, first) - 1, 0)
+        result = []
+        while i < len(self.logical) and self.logical[i] < last:
+            start = max(first, self.logical[i])
+            end = min(last, self.logical[i] + self.length[i])
+            if start < end:
+                result.append((start, self.physical[i] + start - self.logical[i], end - start,
+                               bool(self.uninit[i])))
+            i += 1
+        return result
+
+    def physical_blocks(self, include_uninit: bool = False) -> List[int]:
+
+        blocks = []
+        for logical, physical, length, uninit in self:
+            if uninit and not include_uninit:
+                continue
+            blocks.extend(range(physical, physical + length))
+        return blocks
+
+
+class BlockMapCache:
+    """LRU cache InodeBlockMap theo (image, inode)"""
+
+    def __init__(self, capacity: int = BLOCK_MAP_CACHE_SIZE):
+
+        self.capacity = capacity
+        self._entries: "OrderedDict[Hashable, InodeBlockMap]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[InodeBlockMap]:
+
+        with self._lock:
+            block_map = self._entries.get(key)
+            if block_map is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return block_map
+
+    def put(self, key: Hashable, block_map: InodeBlockMap) -> None:
+
+        with self._lock:
+            self._entries[key] = block_map
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+def build_block_map(inode, inode_num: int = 0, extent_tree: Optional[ExtentTree] = None,
+                    indirect: Optional[IndirectBlockMapper] = None) -> InodeBlockMap:
+
+    # Extent tree (mọi độ sâu) hoặc block pointer (direct + indirect/double/triple)
+    if inode.i_flags & EXT4_INLINE_DATA_FL:
+        # Dữ liệu nằm trong inode, i_block không phải pointer
+        return InodeBlockMap()
+    if inode.i_flags & EXT4_EXTENTS_FL:
+        if extent_tree is None:
+            return InodeBlockMap()
+        extents, tree_blocks = extent_tree.walk_inode(inode, inode_num)
+        return InodeBlockMap.from_extents(extents, tree_blocks)
+
+    if indirect is None:
+        return InodeBlockMap.from_block_list(inode.i_block[:12])
+    runs, pointer_blocks = indirect.walk_inode(inode)
+    return InodeBlockMap(runs, pointer_blocks)
@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+import time
+from typing import Dict
+
+
+# Tên file trạng thái trong thư mục đích (mỗi dòng một inode đã phục hồi xong)
+STATE_FILE_NAME = '.recover_state.jsonl'
+
+
+class IOBudget:
+    """Giới hạn tốc độ đọc (bytes/giây) dùng chung cho mọi worker - token bucket
+
+    Mỗi lần chép tối đa chunk_size bytes rồi mới xin tiếp, để các worker chia đều băng thông.
+    """
+
+    def __init__(self, bytes_per_second: int, chunk_size: int = 8 * 1024 * 1024):
+
+        self.rate = bytes_per_second
+        self.chunk_size = chunk_size
+        self._tokens = float(chunk_size)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def consume(self, size: int) -> None:
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._tokens + (now - self._last) * self.rate, float(self.chunk_size))
+            self._last = now
+            self._tokens -= size
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.waited += delay
+        if delay > 0:
+            time.sleep(delay)
+
+
+class RecoveryState:
+    """File trạng thái để chạy tiếp sau khi bị ngắt: ghi thêm một dòng JSON cho mỗi file xong"""
+
+    def __init__(self, path: str):
+
+        self.path = path
+        self.done: Dict[int, dict] = {}
+        self._lock = threading.Lock()
+        self._file = None
+
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.done[int(entry['inode'])] = entry
+                    except (ValueError, KeyError, TypeError):
+                        # Dòng cuối bị cắt dở khi tiến trình bị kill
+                        continue
+
+    def is_done(self, inode_number: int, output_path: str, size: int) -> bool:
+
+        # Chỉ bỏ qua khi file đích còn đó và đúng kích thước
+        entry = self.done.get(inode_number)
+        if not entry or entry.get('path') != output_path:
+            return False
+        try:
+            return os.path.getsize(output_path) == size
+        except OSError:
+            return False
+
+    def mark_done(self, inode_number: int, output_path: str, size: int) -> None:
+
+        entry = {'inode': inode_number, 'path': output_path, 'size': size}
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            self.done[inode_number] = entry
+
+    def close(self) -> None:
+
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, Iterable, Optional, Tuple
+
+from ext4_structures import DirectoryEntry
+
+
+# Số tên (parent inode, name) giữ lại, kể cả entry âm (tên không tồn tại)
+DENTRY_CACHE_SIZE = 65536
+
+
+class DentryCache:
+    """LRU cache (parent inode, name) -> DirectoryEntry, None = entry âm (đã tra, không có)
+
+    Thư mục đã đọc trọn (quét tuyến tính) được đánh dấu complete: tên không có trong cache
+    coi như không tồn tại, không đọc lại thư mục. fs là khoá của image (device.key, stamp, writes)
+    nên ghi đè image làm mọi entry cũ tự hết hiệu lực.
+    """
+
+    def __init__(self, capacity: int = DENTRY_CACHE_SIZE):
+
+        self.capacity = capacity
+        self._entries: "OrderedDict[Tuple[Hashable, int, str], Optional[DirectoryEntry]]" = OrderedDict()
+        self._complete = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, fs: Hashable, parent: int, name: str) -> Tuple[bool, Optional[DirectoryEntry]]:
+
+        # (có trong cache, entry); (True, None) là entry âm
+        key = (fs, parent, name)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                entry = self._entries[key]
+                if entry is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+                return True, entry
+            if (fs, parent) in self._complete:
+                self.negative_hits += 1
+                return True, None
+            self.misses += 1
+            return False, None
+
+    def put(self, fs: Hashable, parent: int, name: str, entry: Optional[DirectoryEntry]) -> None:
+
+        with self._lock:
+            self._put((fs, parent, name), entry)
+
+    def fill(self, fs: Hashable, parent: int, entries: Iterable[DirectoryEntry]) -> None:
+
+        # Cả thư mục: thư mục quá lớn so với cache thì không đánh dấu complete
+        entries = list(entries)
+        with self._lock:
+            for entry in entries:
+                self._put((fs, parent, entry.name), entry)
+            if len(entries) <= self.capacity // 4:
+                self._complete.add((fs, parent))
+
+    def _put(self, key: Tuple[Hashable, int, str], entry: Optional[DirectoryEntry]) -> None:
+
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            (fs, parent, _), _ = self._entries.popitem(last=False)
+            # Mất một tên thì thư mục không còn đầy đủ trong cache
+            self._complete.discard((fs, parent))
+
+    def clear(self) -> None:
+
+        with self._lock:
+            self._entries.clear()
+            self._complete.clear()
+
+    def stats(self) -> dict:
+
+        with self._lock:
+            return {'entries': len(self._entries), 'complete_dirs': len(self._complete),
+                    'hits': self.hits, 'negative_hits': self.negative_hits, 'misses': self.misses}
@@ -0,0 +1,269 @@
+import struct
+from typing import Iterable, List, Optional, Tuple
+
+# CRC32c (Castagnoli), đa thức 0x1EDC6F41 dạng đảo bit
+CRC32C_POLY = 0x82F63B78
+
+try:
+    # Tùy chọn: bản C / SSE4.2 (pip install crc32c hoặc google-crc32c)
+    import crc32c as _accel
+
+    def _accel_update(crc: int, data) -> int:
+        return _accel.crc32c(data, crc)
+except ImportError:
+    try:
+        import google_crc32c as _accel
+
+        def _accel_update(crc: int, data) -> int:
+            return _accel.extend(crc, bytes(data))
+    except ImportError:
+        _accel = None
+        _accel_update = None
+
+
+HAS_ACCEL = _accel is not None
+ACCEL_NAME = getattr(_accel, '__name__', None)
+
+
+def _make_tables():
+
+    table0 = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ CRC32C_POLY if crc & 1 else crc >> 1
+        table0.append(crc)
+
+    # Slice-by-8: bảng k = CRC của byte i theo sau bởi k byte 0
+    tables = [table0]
+    for _ in range(7):
+        prev = tables[-1]
+        tables.append([(c >> 8) ^ table0[c & 0xFF] for c in prev])
+    return tables
+
+
+_TABLES = _make_tables()
+_QWORDS = struct.Struct('<II')
+
+
+def crc32c_sliced(crc: int, data) -> int:
+
+    # Thuần Python, slice-by-8: mỗi vòng xử lý 8 byte bằng 8 lần tra bảng
+    t0, t1, t2, t3, t4, t5, t6, t7 = _TABLES
+    view = memoryview(data).cast('B')
+    body = len(view) & ~7
+
+    for lo, hi in _QWORDS.iter_unpack(view[:body]):
+        lo ^= crc
+        crc = (t7[lo & 0xFF] ^ t6[(lo >> 8) & 0xFF] ^ t5[(lo >> 16) & 0xFF] ^ t4[lo >> 24] ^
+               t3[hi & 0xFF] ^ t2[(hi >> 8) & 0xFF] ^ t1[(hi >> 16) & 0xFF] ^ t0[hi >> 24])
+
+    for byte in view[body:]:
+        crc = t0[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc
+
+
+def crc32c_raw(crc: int, data) -> int:
+
+    # Như crc32c() trong kernel: không đảo bit đầu/cuối, ext4_chksum() dùng dạng này
+    if _accel_update is not None:
+        return _accel_update(crc ^ 0xFFFFFFFF, data) ^ 0xFFFFFFFF
+    return crc32c_sliced(crc, data)
+
+
+def crc32c(data, value: int = 0) -> int:
+
+    # CRC32c chuẩn (iSCSI): crc32c(b'123456789') == 0xE3069283; value để tính nối tiếp
+    return crc32c_raw(value ^ 0xFFFFFFFF, data) ^ 0xFFFFFFFF
+
+
+EXT4_FEATURE_RO_COMPAT_GDT_CSUM = 0x0010
+EXT4_FEATURE_RO_COMPAT_METADATA_CSUM = 0x0400
+EXT4_FEATURE_INCOMPAT_CSUM_SEED = 0x2000
+
+EXT4_SB_CHECKSUM_OFFSET = 1020
+EXT4_BG_CHECKSUM_OFFSET = 30
+EXT4_INODE_CSUM_LO_OFFSET = 124
+EXT4_INODE_CSUM_HI_OFFSET = 130
+EXT4_GOOD_OLD_INODE_SIZE = 128
+EXT4_DIR_TAIL_SIZE = 12
+EXT4_DIR_TAIL_FT = 0xDE
+
+_ZERO16 = b'\x00\x00'
+_LE32 = struct.Struct('<I')
+_LE16 = struct.Struct('<H')
+
+
+class MetadataChecksum:
+    """Kiểm tra checksum metadata_csum (CRC32c) theo đúng cách kernel tính
+
+    Các hàm verify_* trả về True/False; khi filesystem không bật metadata_csum
+    thì không có gì để kiểm tra và luôn trả về True.
+    """
+
+    def __init__(self, sb):
+
+        self.sb = sb
+        self.enabled = bool(sb.s_feature_ro_compat & EXT4_FEATURE_RO_COMPAT_METADATA_CSUM)
+        self.inode_size = sb.s_inode_size
+        self.block_size = sb.get_block_size()
+        self.desc_size = sb.s_desc_size if sb.s_feature_incompat & 0x80 and sb.s_desc_size >= 64 else 32
+
+        if sb.s_feature_incompat & EXT4_FEATURE_INCOMPAT_CSUM_SEED:
+            self.seed = sb.s_checksum_seed
+        else:
+            self.seed = crc32c_raw(0xFFFFFFFF, sb.s_uuid)
+
+    def inode_seed(self, inode_num: int, generation: int) -> int:
+
+        # Seed riêng của inode: dùng cho inode, extent block, directory block
+        crc = crc32c_raw(self.seed, _LE32.pack(inode_num))
+        return crc32c_raw(crc, _LE32.pack(generation))
+
+    # --- Superblock ---
+
+    @staticmethod
+    def superblock_checksum(data, offset: int = 0) -> int:
+
+        view = memoryview(data)[offset:offset + EXT4_SB_CHECKSUM_OFFSET]
+        return crc32c_raw(0xFFFFFFFF, view)
+
+    def verify_superblock(self, data, offset: int = 0) -> bool:
+
+        if not self.enabled:
+            return True
+        stored = _LE32.unpack_from(data, offset + EXT4_SB_CHECKSUM_OFFSET)[0]
+        return self.superblock_checksum(data, offset) == stored
+
+    # --- Group descriptor ---
+
+    def group_desc_checksum(self, group: int, data, offset: int = 0) -> int:
+
+        view = memoryview(data)
+        crc = crc32c_raw(self.seed, _LE32.pack(group))
+        crc = crc32c_raw(crc, view[offset:offset + EXT4_BG_CHECKSUM_OFFSET])
+        crc = crc32c_raw(crc, _ZERO16)
+        crc = crc32c_raw(crc, view[offset + EXT4_BG_CHECKSUM_OFFSET + 2:offset + self.desc_size])
+        return crc & 0xFFFF
+
+    def verify_group_descriptors(self, table) -> List[int]:
+
+        # table: GroupDescriptorTable; trả về danh sách group có checksum sai
+        if not self.enabled:
+            return []
+        bad = []
+        data = table.data
+        size = table.desc_size
+        for group in range(len(table)):
+            offset = group * size
+            stored = _LE16.unpack_from(data, offset + EXT4_BG_CHECKSUM_OFFSET)[0]
+            if self.group_desc_checksum(group, data, offset) != stored:
+                bad.append(group)
+        return bad
+
+    # --- Inode ---
+
+    def inode_checksum(self, inode_num: int, data, offset: int = 0,
+                       inode_size: Optional[int] = None) -> Tuple[int, bool]:
+
+        # Trả về (checksum, có i_checksum_hi hay không)
+        size = inode_size or self.inode_size
+        view = memoryview(data)[offset:offset + size]
+        generation = _LE32.unpack_from(view, 100)[0]
+
+        crc = crc32c_raw(self.inode_seed(inode_num, generation), view[:EXT4_INODE_CSUM_LO_OFFSET])
+        crc = crc32c_raw(crc, _ZERO16)
+        has_hi = False
+        if size > EXT4_GOOD_OLD_INODE_SIZE:
+            crc = crc32c_raw(crc, view[EXT4_INODE_CSUM_LO_OFFSET + 2:EXT4_INODE_CSUM_HI_OFFSET])
+            extra_isize = _LE16.unpack_from(view, EXT4_GOOD_OLD_INODE_SIZE)[0]
+            rest = EXT4_INODE_CSUM_HI_OFFSET
+            if extra_isize >= 4:
+                crc = crc32c_raw(crc, _ZERO16)
+                rest += 2
+                has_hi = True
+            crc = crc32c_raw(crc, view[rest:])
+        else:
+            crc = crc32c_raw(crc, view[EXT4_INODE_CSUM_LO_OFFSET + 2:])
+        return crc, has_hi
+
+    def verify_inode(self, inode_num: int, data, offset: int = 0,
+                     inode_size: Optional[int] = None) -> bool:
+
+        if not self.enabled:
+            return True
+        crc, has_hi = self.inode_checksum(inode_num, data, offset, inode_size)
+        stored = _LE16.unpack_from(data, offset + EXT4_INODE_CSUM_LO_OFFSET)[0]
+        if has_hi:
+            stored |= _LE16.unpack_from(data, offset + EXT4_INODE_CSUM_HI_OFFSET)[0] << 16
+            return crc == stored
+        return (crc & 0xFFFF) == stored
+
+    def verify_inode_table(self, data, first_inode: int, indexes: Optional[Iterable[int]] = None,
+                           inode_size: Optional[int] = None) -> List[int]:
+
+        # Kiểm tra cả loạt inode trong một bảng; trả về index các inode sai checksum
+        if not self.enabled:
+            return []
+        size = inode_size or self.inode_size
+        if indexes is None:
+            indexes = range(len(data) // size)
+        verify = self.verify_inode
+        return [i for i in indexes if not verify(first_inode + i, data, i * size, size)]
+
+    # --- Extent block / directory block ---
+
+    def verify_extent_block(self, block, inode_num: int, generation: int) -> bool:
+
+        # ext4_extent_tail nằm ngay sau eh_max entry
+        if not self.enabled:
+            return True
+        eh_max = _LE16.unpack_from(block, 4)[0]
+        tail = 12 + 12 * eh_max
+        if tail + 4 > len(block):
+            return False
+        crc = crc32c_raw(self.inode_seed(inode_num, generation), memoryview(block)[:tail])
+        return crc == _LE32.unpack_from(block, tail)[0]
+
+    @staticmethod
+    def has_dirent_tail(block) -> bool:
+
+        # Block thư mục (leaf) của filesystem metadata_csum kết thúc bằng dirent giả 12 bytes
+        end = len(block) - EXT4_DIR_TAIL_SIZE
+        if end < 0:
+            return False
+        inode, rec_len, name_len, file_type = struct.unpack_from('<IHBB', block, end)
+        return (inode == 0 and rec_len == EXT4_DIR_TAIL_SIZE and name_len == 0
+                and file_type == EXT4_DIR_TAIL_FT)
+
+    def verify_dir_block(self, block, inode_num: int, generation: int) -> bool:
+
+        if not self.enabled:
+            return True
+        if not self.has_dirent_tail(block):
+            return False
+        end = len(block) - EXT4_DIR_TAIL_SIZE
+        crc = crc32c_raw(self.inode_seed(inode_num, generation), memoryview(block)[:end])
+        return crc == _LE32.unpack_from(block, end + 8)[0]
+
+    # --- Bitmap ---
+
+    def verify_block_bitmap(self, bitmap, gd) -> bool:
+
+        if not self.enabled:
+            return True
+        size = self.sb.s_clusters_per_group // 8
+        crc = crc32c_raw(self.seed, memoryview(bitmap)[:size])
+        if self.desc_size >= 64:
+            return crc == (gd.bg_block_bitmap_csum_hi << 16 | gd.bg_block_bitmap_csum_lo)
+        return (crc & 0xFFFF) == gd.bg_block_bitmap_csum_lo
+
+    def verify_inode_bitmap(self, bitmap, gd) -> bool:
+
+        if not self.enabled:
+            return True
+        size = self.sb.s_inodes_per_group // 8
+        crc = crc32c_raw(self.seed, memoryview(bitmap)[:size])
+        if self.desc_size >= 64:
+            return crc == (gd.bg_inode_bitmap_csum_hi << 16 | gd.bg_inode_bitmap_csum_lo)
+        return (crc & 0xFFFF) == gd.bg_inode_bitmap_csum_lo
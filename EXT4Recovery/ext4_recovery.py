@@ -1,13 +1,31 @@
 import os
-from typing import List, Optional, Tuple, Dict
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple, Dict, Iterable, Union
 from datetime import datetime
 from ext4_structures import *
 from ext4_utils import EXT4Utils
+from block_device import BlockDevice, open_image
+from inode_table import InodeTable
+from group_descriptors import load_group_descriptors
+from ext4_checksum import MetadataChecksum
+from extent_tree import ExtentTree
+from block_map import InodeBlockMap, BlockMapCache, build_block_map
+from indirect_map import IndirectBlockMapper
+from ext4_xattr import read_inline_data
+from bulk_recovery import IOBudget, RecoveryState, STATE_FILE_NAME
+from inode_scanner import (
+    InodeScanner, INODE_STATES, INODE_LIVE, INODE_DELETED, INODE_ORPHAN, INODE_UNKNOWN, EXT4_ROOT_INO
+)
+from htree import HTreeIndex, is_dx_node, search_leaf
+from dentry_cache import DentryCache
+from journal import JournalIndex
 
 class EXT4Recovery:
     def __init__(self, device_path: str = None):
         
         self.device_path = device_path
+        self.device: Optional[BlockDevice] = None
         self.superblock: Optional[Superblock] = None
         self.backup_superblocks: List[Tuple[int, Superblock]] = []
         self.group_descriptors: List[GroupDescriptor] = []
@@ -15,6 +33,17 @@ class EXT4Recovery:
         self.total_groups = 0
         self.utils = EXT4Utils()
         self.is_64bit = False
+        self.checksum: Optional[MetadataChecksum] = None
+        self.checksum_report: Dict[str, object] = {}
+        self.extent_tree: Optional[ExtentTree] = None
+        self.indirect_mapper: Optional[IndirectBlockMapper] = None
+        self.htree: Optional[HTreeIndex] = None
+        self.block_maps = BlockMapCache()
+        self.dentries = DentryCache()
+        self.journal: Optional[JournalIndex] = None
+        self.bulk_stats: Dict[str, object] = {}
+        self.scanned_inodes: List[Dict] = []
+        self.inode_scan_stats: Dict[str, int] = {}
 
     def open_device(self, device_path: str) -> bool:
         
@@ -23,6 +52,11 @@ class EXT4Recovery:
             return False
 
         self.device_path = device_path
+        try:
+            self.device = open_image(device_path)
+        except OSError as e:
+            print(f" Không thể mở device/file: {e}")
+            return False
 
         # Thử đọc superblock chính
         print(f"\n Đang mở: {device_path}")
@@ -35,9 +69,15 @@ class EXT4Recovery:
             print("  Superblock chính bị hỏng, đang tìm backup...")
             return self.find_backup_superblocks()
 
+    def close(self):
+        
+        if self.device:
+            self.device.close()
+            self.device = None
+
     def read_primary_superblock(self) -> bool:
         
-        data = self.utils.read_bytes(self.device_path,
+        data = self.utils.read_bytes(self.device,
                                      EXT4_SUPERBLOCK_OFFSET,
                                      EXT4_SUPERBLOCK_SIZE)
         if not data:
@@ -47,6 +87,14 @@ class EXT4Recovery:
         if not self.superblock or not self.superblock.is_valid():
             return False
 
+        # metadata_csum: superblock sai checksum thì coi như hỏng, dùng backup
+        if self.superblock.has_metadata_csum() and \
+                self.superblock.calculate_checksum(data) != self.superblock.s_checksum:
+            print(" Superblock chính sai checksum (metadata_csum)")
+            self.superblock = None
+            return False
+        self.checksum = MetadataChecksum(self.superblock)
+
         # Cập nhật các thông tin cơ bản
         self.block_size = self.superblock.get_block_size()
         self.is_64bit = (self.superblock.s_feature_incompat &
@@ -101,22 +149,25 @@ class EXT4Recovery:
 
                 # Đảm bảo không vượt quá kích thước file
                 try:
-                    file_size = os.path.getsize(self.device_path)
+                    file_size = self.device.size()
                     if offset + 1024 > file_size:
                         continue
                 except:
                     pass
 
-                data = self.utils.read_bytes(self.device_path, offset, 1024)
+                data = self.utils.read_bytes(self.device, offset, 1024)
                 if data:
                     sb = self.utils.parse_superblock(data)
                     if sb and sb.is_valid():
+                        if sb.has_metadata_csum() and sb.calculate_checksum(data) != sb.s_checksum:
+                            continue
                         self.backup_superblocks.append((group_num, sb))
                         print(f"   Tìm thấy backup tại group {group_num} (offset: {offset})")
 
             if self.backup_superblocks:
                 # Sử dụng backup đầu tiên làm superblock chính
                 self.superblock = self.backup_superblocks[0][1]
+                self.checksum = MetadataChecksum(self.superblock)
                 self.block_size = self.superblock.get_block_size()
                 self.is_64bit = (self.superblock.s_feature_incompat &
                                 EXT4_FEATURE_INCOMPAT_64BIT) != 0
@@ -138,35 +189,60 @@ class EXT4Recovery:
 
         print(f"\n Đang đọc {self.total_groups} group descriptors...")
 
-        # Group descriptor table bắt đầu sau superblock
-        if self.block_size == 1024:
-            gdt_block = 2  # Block 2 nếu block size = 1024
-        else:
-            gdt_block = 1  # Block 1 nếu block size > 1024
-
-        desc_size = self.superblock.s_desc_size if self.is_64bit else 32
-
-        # Đọc toàn bộ GDT
-        gdt_blocks = (self.total_groups * desc_size + self.block_size - 1) // self.block_size
-
-        for i in range(gdt_blocks):
-            data = self.utils.read_block(self.device_path, gdt_block + i, self.block_size)
-            if not data:
-                continue
-
-            # Parse từng group descriptor
-            for j in range(0, self.block_size, desc_size):
-                if len(self.group_descriptors) >= self.total_groups:
-                    break
-
-                gd_data = data[j:j + desc_size]
-                gd = self.utils.parse_group_descriptor(gd_data, self.is_64bit)
-                if gd:
-                    self.group_descriptors.append(gd)
+        # Đọc toàn bộ GDT trong một lần đọc (32/64-byte descriptor, meta_bg),
+        # bảng đã đọc được cache theo image
+        table = load_group_descriptors(self.device, self.superblock)
+        self.group_descriptors = table if table is not None else []
 
         print(f" Đọc thành công {len(self.group_descriptors)} group descriptors")
         return len(self.group_descriptors) > 0
 
+    def verify_checksums(self, check_inodes: bool = False) -> Dict[str, object]:
+        
+        # Kiểm tra checksum metadata_csum: GDT, bitmap từng group, (tùy chọn) inode đang dùng
+        self.checksum_report = {}
+        if not self.checksum or not self.checksum.enabled or not self.group_descriptors:
+            return self.checksum_report
+
+        print("\n Đang kiểm tra checksum metadata (CRC32c)...")
+        bad_gdt = self.checksum.verify_group_descriptors(self.group_descriptors)
+        bad_bitmaps = []
+        bad_inodes = []
+        inode_size = self.superblock.s_inode_size
+        inodes_per_group = self.superblock.s_inodes_per_group
+
+        for group, gd in enumerate(self.group_descriptors):
+            if group in bad_gdt:
+                continue
+            # Bitmap chưa khởi tạo (BLOCK_UNINIT / INODE_UNINIT) không có checksum
+            if not gd.bg_flags & 0x2:
+                bitmap = self.utils.read_block(self.device, gd.get_block_bitmap(), self.block_size)
+                if bitmap and not self.checksum.verify_block_bitmap(bitmap, gd):
+                    bad_bitmaps.append(('block', group))
+            if not gd.bg_flags & 0x1:
+                bitmap = self.utils.read_block(self.device, gd.get_inode_bitmap(), self.block_size)
+                if bitmap and not self.checksum.verify_inode_bitmap(bitmap, gd):
+                    bad_bitmaps.append(('inode', group))
+
+                if check_inodes:
+                    first_inode = group * inodes_per_group + 1
+                    data = self.utils.read_bytes(self.device, gd.get_inode_table() * self.block_size,
+                                                 inodes_per_group * inode_size)
+                    if data:
+                        table = InodeTable(data, inode_size, first_inode)
+                        bad = self.checksum.verify_inode_table(data, first_inode,
+                                                               table.select(allocated=True))
+                        bad_inodes.extend(first_inode + i for i in bad)
+
+        self.checksum_report = {
+            'bad_group_descriptors': bad_gdt,
+            'bad_bitmaps': bad_bitmaps,
+            'bad_inodes': bad_inodes if check_inodes else None,
+        }
+        print(f" GDT sai checksum: {len(bad_gdt)}, bitmap sai checksum: {len(bad_bitmaps)}"
+              + (f", inode sai checksum: {len(bad_inodes)}" if check_inodes else ""))
+        return self.checksum_report
+
     def print_superblock_info(self):
         
         if not self.superblock:
@@ -248,6 +324,14 @@ class EXT4Recovery:
 
     def read_inode(self, inode_number: int) -> Optional[Inode]:
         
+        raw = self.read_inode_raw(inode_number)
+        if raw is None:
+            return None
+        return self.utils.parse_inode(raw, 0, self.superblock.s_inode_size)
+
+    def read_inode_raw(self, inode_number: int) -> Optional[memoryview]:
+        
+        # Bytes gốc của inode (kể cả vùng extra + xattr trong inode)
         if not self.superblock or not self.group_descriptors:
             return None
 
@@ -263,17 +347,18 @@ class EXT4Recovery:
         inode_table_block = gd.get_inode_table()
 
         # Tính offset của inode
-        inode_offset = inode_table_block * self.block_size + \
-                      local_index * self.superblock.s_inode_size
+        inode_size = self.superblock.s_inode_size
+        inode_offset = local_index * inode_size
 
-        # Đọc dữ liệu inode
-        data = self.utils.read_bytes(self.device_path,
-                                     inode_offset,
-                                     self.superblock.s_inode_size)
+        # Đọc cả block của inode table qua block cache: các inode cùng block
+        # chỉ tốn một lần đọc
+        block_num = inode_table_block + inode_offset // self.block_size
+        data = self.utils.read_block(self.device, block_num, self.block_size)
         if not data:
             return None
 
-        return self.utils.parse_inode(data)
+        start = inode_offset % self.block_size
+        return memoryview(data)[start:start + inode_size]
 
     def list_directory(self, inode_number: int = 2) -> List[DirectoryEntry]:
         
@@ -282,44 +367,179 @@ class EXT4Recovery:
             print(f" Inode {inode_number} không phải directory")
             return []
 
+        return self._read_directory(inode_number, inode)
+
+    def _read_directory(self, inode_number: int, inode: Inode) -> List[DirectoryEntry]:
+        
         entries = []
 
-        # Kiểm tra xem có sử dụng extents không
-        if inode.i_flags & EXT4_EXTENTS_FL:
-            # Sử dụng extent tree
-            entries = self._list_directory_extents(inode)
-        else:
-            # Sử dụng block pointers truyền thống
-            entries = self._list_directory_blocks(inode)
+        # Các block của thư mục theo thứ tự logical (extent tree hoặc block pointer),
+        # đọc gộp thành ít lần đọc. Thư mục có HTree: bỏ qua các block index (dx_node)
+        indexed = bool(inode.i_flags & EXT4_INDEX_FL)
+        block_nums = self.get_block_map(inode_number, inode).physical_blocks()
+        blocks = self.utils.read_blocks(self.device, block_nums, self.block_size)
+        for block_num in block_nums:
+            data = blocks.get(block_num)
+            if not data or (indexed and is_dx_node(data, self.block_size)):
+                continue
+            entries.extend(self._parse_directory_entries(data))
 
+        # Cả thư mục đã đọc: lookup tên sau đó (kể cả tên không có) không cần đọc lại
+        self.dentries.fill(self._fs_key(), inode_number, entries)
         return entries
 
-    def _list_directory_blocks(self, inode: Inode) -> List[DirectoryEntry]:
+    def _fs_key(self) -> tuple:
         
-        entries = []
+        # Khoá của image cho các cache theo nội dung (ghi đè qua device -> khoá mới)
+        return (self.device.key, self.device.stamp, self.device.writes)
 
-        # Đọc các direct blocks
-        for i in range(12):
-            block_num = inode.i_block[i]
-            if block_num == 0:
-                break
+    def lookup_entry(self, dir_inode: int, name: str) -> Optional[DirectoryEntry]:
+        
+        # Tìm một tên trong thư mục, qua dentry cache (cả kết quả âm). Thư mục có index: hash tên
+        # rồi đi theo HTree (root -> dx_node -> một leaf); còn lại đọc cả thư mục một lần
+        fs = self._fs_key()
+        cached, entry = self.dentries.get(fs, dir_inode, name)
+        if cached:
+            return entry
+
+        inode = self.read_inode(dir_inode)
+        if not inode or not inode.is_directory():
+            return None
 
-            data = self.utils.read_block(self.device_path, block_num, self.block_size)
-            if data:
-                entries.extend(self._parse_directory_entries(data))
+        raw_name = name.encode('utf-8', errors='surrogateescape')
+        block_map = self.get_block_map(dir_inode, inode)
+
+        # "." và ".." luôn nằm ở đầu block 0 (kể cả dx_root), không có trong leaf theo hash
+        if name in ('.', '..'):
+            physical = block_map.lookup(0)
+            data = self.utils.read_block(self.device, physical, self.block_size) if physical is not None else None
+            entry = search_leaf(data, raw_name) if data else None
+            self.dentries.put(fs, dir_inode, name, entry)
+            return entry
+
+        if inode.i_flags & EXT4_INDEX_FL:
+            if self.htree is None:
+                self.htree = HTreeIndex(self.device, self.superblock, self.block_size)
+            indexed, entry = self.htree.find(block_map, raw_name)
+            if indexed:
+                self.dentries.put(fs, dir_inode, name, entry)
+                return entry
+
+        # Không có index (hoặc index hỏng): đọc cả thư mục, mọi tên vào cache luôn
+        for entry in self._read_directory(dir_inode, inode):
+            if entry.name == name:
+                return entry
+        self.dentries.put(fs, dir_inode, name, None)
+        return None
+
+    def resolve(self, path: str, start: int = EXT4_ROOT_INO) -> Optional[int]:
+        
+        # Đường dẫn -> inode number, tra từng thành phần qua lookup_entry (dentry cache dùng chung
+        # cho mọi lần gọi, nên nhiều đường dẫn cùng thư mục cha chỉ đọc thư mục đó một lần).
+        # Đường dẫn tương đối tính từ inode start; không đi theo symlink
+        inode_number = EXT4_ROOT_INO if path.startswith('/') else start
+        for component in path.split('/'):
+            if component in ('', '.'):
+                continue
+            entry = self.lookup_entry(inode_number, component)
+            if entry is None:
+                return None
+            inode_number = entry.inode
+        return inode_number
 
-        return entries
+    def lookup(self, path: str) -> Optional[int]:
+        
+        inode_number = self.resolve(path)
+        if inode_number is None:
+            print(f" Không tìm thấy {path}")
+        return inode_number
 
-    def _list_directory_extents(self, inode: Inode) -> List[DirectoryEntry]:
+    def stat(self, path: str) -> Optional[Dict]:
         
-        # i_block chứa extent header và extents
-        # Đây là implementation đơn giản, chỉ xử lý leaf extents
-        entries = []
+        # Thông tin inode của đường dẫn (giống lstat)
+        inode_number = self.resolve(path)
+        if inode_number is None:
+            print(f" Không tìm thấy {path}")
+            return None
+        inode = self.read_inode(inode_number)
+        if not inode:
+            print(f" Không đọc được inode {inode_number}")
+            return None
 
-        # Parse extent header từ i_block
-        # (Implementation chi tiết hơn sẽ cần xử lý extent tree đầy đủ)
+        return {
+            'path': path,
+            'inode_num': inode_number,
+            'inode': inode,
+            'mode': inode.i_mode,
+            'is_dir': inode.is_directory(),
+            'is_file': inode.is_regular_file(),
+            'is_symlink': inode.is_symlink(),
+            'size': inode.get_size(),
+            'links': inode.i_links_count,
+            'uid': inode.i_uid,
+            'gid': inode.i_gid,
+            'atime': inode.i_atime,
+            'mtime': inode.i_mtime,
+            'ctime': inode.i_ctime,
+            'dtime': inode.i_dtime,
+            'flags': inode.i_flags
+        }
+
+    def get_extents(self, inode: Inode, inode_number: int = 0) -> List[Extent]:
+        
+        # Extent tree đầy đủ (mọi độ sâu), các node được đọc gộp theo tầng và cache lại
+        return self._get_extent_tree().extents(inode, inode_number)
 
-        return entries
+    def _get_extent_tree(self) -> ExtentTree:
+        
+        if self.extent_tree is None:
+            self.extent_tree = ExtentTree(self.device, self.block_size, self.checksum,
+                                          self.superblock.get_total_blocks())
+        return self.extent_tree
+
+    def get_block_map(self, inode_number: int, inode: Optional[Inode] = None) -> InodeBlockMap:
+        
+        # Map logical -> physical của inode, cache LRU theo (image, inode)
+        key = (self.device.key, self.device.stamp, self.device.writes, inode_number)
+        block_map = self.block_maps.get(key)
+        if block_map is not None:
+            return block_map
+
+        if inode is None:
+            inode = self.read_inode(inode_number)
+            if not inode:
+                return InodeBlockMap()
+        if self.indirect_mapper is None:
+            self.indirect_mapper = IndirectBlockMapper(self.device, self.block_size,
+                                                       self.superblock.get_total_blocks())
+        block_map = build_block_map(inode, inode_number, self._get_extent_tree(), self.indirect_mapper)
+        self.block_maps.put(key, block_map)
+        return block_map
+
+    def read_file_range(self, inode_number: int, offset: int, size: int) -> Optional[bytes]:
+        
+        # Đọc một đoạn của file theo offset (xem trước / phục hồi một phần), hole trả về 0
+        inode = self.read_inode(inode_number)
+        if not inode:
+            return None
+
+        size = max(0, min(size, inode.get_size() - offset))
+        if size == 0:
+            return b''
+
+        first = offset // self.block_size
+        last = (offset + size - 1) // self.block_size
+        buf = bytearray((last - first + 1) * self.block_size)
+        for logical, physical, length, uninit in self.get_block_map(inode_number, inode).range(
+                first, last - first + 1):
+            if uninit:
+                continue
+            start = (logical - first) * self.block_size
+            data = self.device.pread(length * self.block_size, physical * self.block_size)
+            buf[start:start + len(data)] = data
+
+        skip = offset - first * self.block_size
+        return bytes(buf[skip:skip + size])
 
     def _parse_directory_entries(self, data: bytes) -> List[DirectoryEntry]:
         
@@ -336,11 +556,16 @@ class EXT4Recovery:
             name_len = struct.unpack('<B', data[offset+6:offset+7])[0]
             file_type = struct.unpack('<B', data[offset+7:offset+8])[0]
 
-            if inode_num == 0 or rec_len == 0:
+            if rec_len < 8 or offset + rec_len > len(data):
                 break
 
+            # Entry đã xoá / dirent rỗng (tail checksum, dx_node): bỏ qua nhưng đọc tiếp
+            if inode_num == 0:
+                offset += rec_len
+                continue
+
             # Parse filename
-            name = data[offset+8:offset+8+name_len].decode('utf-8', errors='ignore')
+            name = bytes(data[offset+8:offset+8+name_len]).decode('utf-8', errors='ignore')
 
             entry = DirectoryEntry(
                 inode=inode_num,
@@ -355,28 +580,89 @@ class EXT4Recovery:
 
         return entries
 
-    def scan_for_inodes(self, start_block: int = 0, num_blocks: int = 100) -> List[int]:
+    def load_journal(self) -> Optional[JournalIndex]:
         
-        print(f"\n Đang quét tìm inodes từ block {start_block}...")
-        found_inodes = []
+        # Quét journal jbd2 một lần, lập chỉ mục block filesystem -> các bản cũ trong journal
+        print("\n Đang đọc journal (jbd2)...")
+        if not self.superblock or not self.superblock.has_journal():
+            print(" Filesystem không có journal")
+            return None
+        if self.superblock.s_journal_dev or not self.superblock.s_journal_inum:
+            print(" Journal nằm trên thiết bị ngoài, không hỗ trợ")
+            return None
 
-        for block_num in range(start_block, start_block + num_blocks):
-            data = self.utils.read_block(self.device_path, block_num, self.block_size)
-            if not data:
-                continue
+        journal_inum = self.superblock.s_journal_inum
+        journal_map = self.get_block_map(journal_inum)
+        if not len(journal_map):
+            print(f" Không đọc được inode journal {journal_inum}")
+            return None
+
+        journal = JournalIndex(self.device, journal_map, self.block_size)
+        if not journal.load():
+            print(" Journal superblock không hợp lệ")
+            return None
+
+        self.journal = journal
+        stats = journal.stats
+        print(f" Journal: {len(journal.transactions):,} transactions, {stats['tags']:,} block ghi "
+              f"({len(journal.index):,} block filesystem khác nhau), {stats['revoke_blocks']} revoke blocks")
+        if stats['uncommitted']:
+            print(f"   {stats['uncommitted']} transaction chưa commit")
+        return journal
+
+    def journal_inode_versions(self, inode_number: int) -> List[Tuple[int, Inode]]:
+        
+        # Các bản cũ của inode trong journal [(tid, Inode)], cũ -> mới. Inode đã xoá bị ext4
+        # xoá extent, nhưng bản trong journal trước lúc xoá vẫn còn block map đầy đủ
+        if self.journal is None and self.load_journal() is None:
+            return []
+        if not self.superblock or not self.group_descriptors:
+            return []
+
+        group_num = (inode_number - 1) // self.superblock.s_inodes_per_group
+        local_index = (inode_number - 1) % self.superblock.s_inodes_per_group
+        if group_num >= len(self.group_descriptors):
+            return []
+
+        inode_size = self.superblock.s_inode_size
+        inode_offset = local_index * inode_size
+        block_num = self.group_descriptors[group_num].get_inode_table() + inode_offset // self.block_size
+        start = inode_offset % self.block_size
 
-            # Quét từng offset có thể là inode
-            for offset in range(0, self.block_size, 256):
-                inode_data = data[offset:offset+256]
-                inode = self.utils.parse_inode(inode_data)
+        versions = []
+        for tid, data in self.journal.block_history(block_num):
+            inode = self.utils.parse_inode(data, start, inode_size)
+            if inode:
+                versions.append((tid, inode))
+        return versions
 
-                if inode and inode.i_links_count > 0:
-                    # Tính inode number từ vị trí
-                    inode_num = (block_num * self.block_size + offset) // 256
-                    found_inodes.append(inode_num)
+    def scan_for_inodes(self, states: Iterable[str] = INODE_STATES,
+                        groups: Optional[Iterable[int]] = None) -> List[int]:
+        
+        # Quét inode table của từng group (theo GDT), mỗi group một lần đọc; bỏ qua group
+        # INODE_UNINIT và phần đuôi itable_unused. Kết quả chi tiết (live / deleted / orphan)
+        # nằm trong self.scanned_inodes
+        print("\n Đang quét inode theo group descriptor...")
+        if not self.superblock or not self.group_descriptors:
+            return []
 
-        print(f" Tìm thấy {len(found_inodes)} inodes")
-        return found_inodes
+        scanner = InodeScanner(self.device, self.superblock, self.group_descriptors, self.checksum)
+        self.scanned_inodes = scanner.scan(groups, states)
+        self.inode_scan_stats = scanner.stats
+
+        stats = scanner.stats
+        print(f" Tìm thấy {len(self.scanned_inodes)} inodes "
+              f"(live: {stats[INODE_LIVE]}, deleted: {stats[INODE_DELETED]}, orphan: {stats[INODE_ORPHAN]})")
+        print(f"   Đã đọc {stats['inodes_read']:,} inodes ở {stats['groups_scanned']} groups, "
+              f"bỏ qua {stats['inodes_skipped']:,} inodes chưa dùng ({stats['groups_skipped']} groups)")
+        if stats['checksum_rejected']:
+            print(f"   Bỏ qua {stats['checksum_rejected']} inodes sai checksum")
+        if stats['bad_descriptors']:
+            print(f"   {stats['bad_descriptors']} group descriptors sai checksum: quét toàn bộ inode table")
+        if stats['bitmap_missing']:
+            print(f"   {stats['bitmap_missing']} groups không đọc được inode bitmap: "
+                  f"{stats[INODE_UNKNOWN]} inodes trạng thái không xác định")
+        return [entry['inode_num'] for entry in self.scanned_inodes]
 
     def recover_file(self, inode_number: int, output_path: str) -> bool:
         
@@ -395,40 +681,169 @@ class EXT4Recovery:
         print(f"  Kích thước: {self.utils.format_bytes(file_size)}")
 
         try:
-            with open(output_path, 'wb') as f:
-                bytes_written = 0
-
-                # Đọc data từ blocks
-                if inode.i_flags & EXT4_EXTENTS_FL:
-                    # Sử dụng extents (cần implementation đầy đủ)
-                    print("  File sử dụng extents (chưa hỗ trợ đầy đủ)")
-                    return False
-                else:
-                    # Sử dụng block pointers
-                    for i in range(12):
-                        if bytes_written >= file_size:
-                            break
-
-                        block_num = inode.i_block[i]
-                        if block_num == 0:
-                            break
-
-                        data = self.utils.read_block(self.device_path,
-                                                     block_num,
-                                                     self.block_size)
-                        if data:
-                            # Chỉ ghi số bytes còn lại
-                            to_write = min(len(data), file_size - bytes_written)
-                            f.write(data[:to_write])
-                            bytes_written += to_write
-
-            print(f" Đã phục hồi {self.utils.format_bytes(bytes_written)} vào {output_path}")
+            bytes_written, bytes_skipped = self._write_inode(inode_number, inode, output_path)
+
+            print(f" Đã phục hồi {self.utils.format_bytes(bytes_written)} vào {output_path}"
+                  f" ({self.device.copy_method or 'không có dữ liệu'})")
+            if bytes_skipped:
+                print(f"  Giữ sparse: bỏ qua {self.utils.format_bytes(bytes_skipped)} (hole / extent uninit)")
             return True
 
         except Exception as e:
             print(f" Lỗi khi phục hồi file: {e}")
             return False
 
+    def _write_inode(self, inode_number: int, inode: Inode, output_path: str,
+                     budget: Optional[IOBudget] = None,
+                     block_map: Optional[InodeBlockMap] = None) -> Tuple[int, int]:
+        
+        file_size = inode.get_size()
+        with open(output_path, 'wb') as f:
+            if inode.i_flags & EXT4_INLINE_DATA_FL:
+                # Inline data: nội dung nằm trong i_block + xattr system.data, không đọc block nào
+                raw = self.read_inode_raw(inode_number)
+                data = read_inline_data(raw, self.superblock.s_inode_size, file_size)
+                f.write(data)
+                result = (len(data), 0)
+            else:
+                result = self._copy_runs(f.fileno(), inode_number, inode, file_size, budget, block_map)
+
+            # Phần còn lại (hole ở cuối file) cũng chỉ là kích thước, không ghi zero
+            f.truncate(file_size)
+        return result
+
+    def _copy_runs(self, out_fd: int, inode_number: int, inode: Inode, file_size: int,
+                   budget: Optional[IOBudget] = None,
+                   block_map: Optional[InodeBlockMap] = None) -> Tuple[int, int]:
+        
+        # Chép từng run (extent hoặc dãy block pointer liên tiếp) thẳng từ image sang file đích
+        # tại đúng vị trí logical. Logical chưa map, extent uninit và hole của chính image
+        # (image sparse) đều được nhảy qua: file đích giữ nguyên hole thay vì ghi zero.
+        # Trả về (bytes đã chép, bytes bỏ qua). block_map đã dựng sẵn thì dùng luôn, không đọc lại cây extent
+        if block_map is None:
+            block_map = self.get_block_map(inode_number, inode)
+        bytes_written = 0
+        bytes_skipped = 0
+        position = 0
+        for logical, physical, length, uninit in block_map:
+            logical_offset = logical * self.block_size
+            if logical_offset >= file_size:
+                break
+            bytes_skipped += logical_offset - position
+
+            # Run cuối cắt theo i_size
+            length = min(length * self.block_size, file_size - logical_offset)
+            position = logical_offset + length
+            if uninit:
+                bytes_skipped += length
+                continue
+
+            start = physical * self.block_size
+            copied = 0
+            for data_start, data_length in self.device.data_ranges(start, start + length):
+                if budget is None:
+                    copied += self.device.copy_to(out_fd, data_start, data_length,
+                                                  logical_offset + data_start - start)
+                    continue
+                # Có giới hạn I/O: chép từng đoạn nhỏ, xin budget trước mỗi đoạn
+                for chunk in range(0, data_length, budget.chunk_size):
+                    size = min(budget.chunk_size, data_length - chunk)
+                    budget.consume(size)
+                    copied += self.device.copy_to(out_fd, data_start + chunk, size,
+                                                  logical_offset + data_start + chunk - start)
+            bytes_written += copied
+            bytes_skipped += length - copied
+        bytes_skipped += max(0, file_size - position)
+        return bytes_written, bytes_skipped
+
+    def recover_many(self, inodes: Union[Iterable[int], Dict[int, str]], output_dir: str,
+                     workers: int = 4, io_budget: Optional[int] = None,
+                     resume: bool = True) -> Dict[str, object]:
+        
+        # Phục hồi nhiều inode một lượt:
+        #   1. đọc inode + dựng block map cho tất cả trước
+        #   2. sắp xếp theo vị trí vật lý (block đầu tiên) để đầu đọc HDD đi một chiều
+        #   3. chép song song bằng thread pool (copy_file_range / sendfile / pread đều nhả GIL)
+        # inodes: danh sách inode, hoặc dict {inode: tên file trong output_dir}
+        # io_budget: giới hạn tổng tốc độ đọc (bytes/giây), None = không giới hạn
+        # resume: bỏ qua các file đã xong theo file trạng thái trong output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        names = inodes if isinstance(inodes, dict) else {n: f"inode_{n}" for n in inodes}
+        state = RecoveryState(os.path.join(output_dir, STATE_FILE_NAME))
+        budget = IOBudget(io_budget) if io_budget else None
+
+        print(f"\n Đang chuẩn bị phục hồi {len(names):,} inodes vào {output_dir}...")
+        jobs = []
+        results = []
+        for inode_number, name in names.items():
+            output_path = os.path.join(output_dir, name)
+            inode = self.read_inode(inode_number)
+            if not inode or not inode.is_regular_file():
+                results.append({'inode': inode_number, 'path': output_path, 'status': 'skipped'})
+                continue
+            if resume and state.is_done(inode_number, output_path, inode.get_size()):
+                results.append({'inode': inode_number, 'path': output_path, 'status': 'done_before'})
+                continue
+
+            # Giữ block map trong job: batch lớn hơn BlockMapCache thì không phải dựng lại lần hai
+            if inode.i_flags & EXT4_INLINE_DATA_FL:
+                location = 0
+                block_map = None
+            else:
+                block_map = self.get_block_map(inode_number, inode)
+                location = block_map.physical[0] if len(block_map) else 0
+            jobs.append((location, inode_number, inode, block_map, output_path))
+
+        jobs.sort(key=lambda job: (job[0], job[1]))
+
+        def run(job):
+            _, inode_number, inode, block_map, output_path = job
+            start = time.monotonic()
+            try:
+                written, skipped = self._write_inode(inode_number, inode, output_path, budget, block_map)
+                elapsed = time.monotonic() - start
+                # Lỗi ghi file trạng thái chỉ tính cho file này, không làm hỏng cả lượt
+                state.mark_done(inode_number, output_path, inode.get_size())
+            except Exception as e:
+                return {'inode': inode_number, 'path': output_path, 'status': 'error', 'error': str(e)}
+            return {'inode': inode_number, 'path': output_path, 'status': 'ok',
+                    'bytes': written, 'skipped': skipped, 'seconds': elapsed,
+                    'mb_per_s': written / elapsed / (1024 * 1024) if elapsed > 0 else 0.0}
+
+        start = time.monotonic()
+        try:
+            # Pool lấy việc theo thứ tự submit, nên vẫn đi theo thứ tự vị trí vật lý
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                for done, result in enumerate(pool.map(run, jobs), 1):
+                    results.append(result)
+                    if result['status'] == 'error':
+                        print(f"   Lỗi inode {result['inode']}: {result['error']}")
+                    if done % 100 == 0 or done == len(jobs):
+                        print(f"   Tiến độ: {done:,}/{len(jobs):,} files", end='\r')
+        finally:
+            state.close()
+        elapsed = time.monotonic() - start
+
+        ok = [r for r in results if r['status'] == 'ok']
+        total_bytes = sum(r['bytes'] for r in ok)
+        self.bulk_stats = {
+            'files': len(names),
+            'recovered': len(ok),
+            'resumed': sum(1 for r in results if r['status'] == 'done_before'),
+            'skipped': sum(1 for r in results if r['status'] == 'skipped'),
+            'errors': sum(1 for r in results if r['status'] == 'error'),
+            'bytes': total_bytes,
+            'seconds': elapsed,
+            'mb_per_s': total_bytes / elapsed / (1024 * 1024) if elapsed > 0 else 0.0,
+            'budget_wait': budget.waited if budget else 0.0,
+            'results': results,
+        }
+        print(f"\n Đã phục hồi {len(ok):,} files, {self.utils.format_bytes(total_bytes)} "
+              f"trong {elapsed:.2f}s ({self.bulk_stats['mb_per_s']:.1f} MB/s)")
+        if self.bulk_stats['resumed']:
+            print(f"   Đã xong từ lần chạy trước: {self.bulk_stats['resumed']:,} files")
+        return self.bulk_stats
+
     def generate_recovery_report(self) -> str:
         
         report = []
@@ -455,6 +870,38 @@ class EXT4Recovery:
         if self.group_descriptors:
             report.append(f"\n Group Descriptors: {len(self.group_descriptors)}/{self.total_groups}")
 
+        if self.checksum_report:
+            report.append("\n Checksum metadata (CRC32c):")
+            report.append(f"   Group descriptor sai: {len(self.checksum_report['bad_group_descriptors'])}")
+            report.append(f"   Bitmap sai: {len(self.checksum_report['bad_bitmaps'])}")
+            if self.checksum_report['bad_inodes'] is not None:
+                report.append(f"   Inode sai: {len(self.checksum_report['bad_inodes'])}")
+
+        if self.bulk_stats:
+            report.append(f"\n Phục hồi hàng loạt: {self.bulk_stats['recovered']:,}/"
+                          f"{self.bulk_stats['files']:,} files, "
+                          f"{self.utils.format_bytes(self.bulk_stats['bytes'])} "
+                          f"({self.bulk_stats['mb_per_s']:.1f} MB/s)")
+            report.append(f"   Lỗi: {self.bulk_stats['errors']:,}, "
+                          f"chạy tiếp: {self.bulk_stats['resumed']:,}")
+
+        if self.journal:
+            report.append(f"\n Journal (jbd2): {len(self.journal.transactions):,} transactions, "
+                          f"{len(self.journal.index):,} blocks có bản cũ")
+
+        dentry_stats = self.dentries.stats()
+        if dentry_stats['entries']:
+            report.append(f"\n Dentry Cache: {dentry_stats['entries']:,} tên, "
+                          f"{dentry_stats['hits']:,} hits / {dentry_stats['negative_hits']:,} hits âm / "
+                          f"{dentry_stats['misses']:,} misses")
+
+        if self.device and self.device.cache:
+            stats = self.device.cache.stats()
+            report.append(f"\n Block Cache: {stats['hits']:,} hits / {stats['misses']:,} misses "
+                          f"({stats['hit_ratio'] * 100:.1f}%)")
+            report.append(f"   Evictions: {stats['evictions']:,}, "
+                          f"tiết kiệm: {self.utils.format_bytes(stats['bytes_saved'])}")
+
         report.append("\n" + "=" * 60)
 
         return "\n".join(report)
@@ -5,6 +5,8 @@ from typing import Optional
 from dataclasses import dataclass
 import hashlib
 
+from ext4_checksum import crc32c_raw
+
 
 @dataclass
 class Superblock:
@@ -132,9 +134,12 @@ class Superblock:
     
     def calculate_checksum(self, data: bytes) -> int:
         
-        # CRC32c checksum
-        import binascii
-        return binascii.crc32(data) & 0xffffffff
+        # metadata_csum: CRC32c (seed ~0, không đảo bit cuối) trên 1020 bytes trước s_checksum
+        return crc32c_raw(0xFFFFFFFF, memoryview(data)[:1020])
+    
+    def has_metadata_csum(self) -> bool:
+        
+        return (self.s_feature_ro_compat & 0x400) != 0
     
     def has_journal(self) -> bool:
         """Check if filesystem has journal feature"""
@@ -182,6 +187,10 @@ class GroupDescriptor:
     def get_inode_table(self) -> int:
         
         return (self.bg_inode_table_hi << 32) | self.bg_inode_table_lo
+    
+    def get_itable_unused(self) -> int:
+        
+        return (self.bg_itable_unused_hi << 16) | self.bg_itable_unused_lo
 
 
 @dataclass
@@ -294,15 +303,29 @@ class Extent:
     
     def is_uninitialized(self) -> bool:
         
-        return self.ee_len > 32768  # Bit cao được set
+        # ee_len == 32768 vẫn là extent đã khởi tạo (độ dài tối đa)
+        return self.ee_len > EXT_INIT_MAX_LEN  # Bit cao được set
     
     def get_length(self) -> int:
         
         if self.is_uninitialized():
-            return self.ee_len - 32768
+            return self.ee_len - EXT_INIT_MAX_LEN
         return self.ee_len
 
 
+@dataclass
+class ExtentIndex:
+    
+    ei_block: int = 0                # Logical block đầu tiên mà node con quản lý
+    ei_leaf_lo: int = 0              # Block của node con (32 bit thấp)
+    ei_leaf_hi: int = 0              # Block của node con (16 bit cao)
+    ei_unused: int = 0
+    
+    def get_leaf_block(self) -> int:
+        
+        return (self.ei_leaf_hi << 32) | self.ei_leaf_lo
+
+
 # Constants
 EXT4_SUPER_MAGIC = 0xEF53
 EXT4_SUPERBLOCK_OFFSET = 1024
@@ -317,4 +340,213 @@ EXT4_FEATURE_INCOMPAT_64BIT = 0x0080
 EXT4_FEATURE_INCOMPAT_FLEX_BG = 0x0200
 
 # Inode flags
+EXT4_INDEX_FL = 0x00001000  # Thư mục có HTree index (dir_index)
 EXT4_EXTENTS_FL = 0x00080000  # Inode sử dụng extents
+EXT4_INLINE_DATA_FL = 0x10000000  # Dữ liệu nằm ngay trong inode (i_block + xattr system.data)
+
+EXT4_GOOD_OLD_INODE_SIZE = 128
+
+# Group descriptor flags (chỉ đáng tin khi có GDT_CSUM / METADATA_CSUM)
+EXT4_BG_INODE_UNINIT = 0x0001  # Inode table / bitmap chưa khởi tạo
+EXT4_BG_BLOCK_UNINIT = 0x0002  # Block bitmap chưa khởi tạo
+EXT4_BG_INODE_ZEROED = 0x0004  # Inode table đã được ghi zero
+
+# Extent tree
+EXT4_EXT_MAGIC = 0xF30A
+EXT4_EXT_MAX_DEPTH = 5         # Độ sâu tối đa kernel cho phép
+EXT_INIT_MAX_LEN = 32768       # ee_len > giá trị này: extent chưa khởi tạo (uninit)
+
+
+# Layout on-disk biên dịch sẵn: mỗi cấu trúc decode bằng một lần unpack_from(buf, offset)
+
+# Superblock: (tên field, format); format có số đếm > 1 là tuple (s_hash_seed, s_jnl_blocks...)
+SUPERBLOCK_LAYOUT = [
+    ('s_inodes_count', 'I'), ('s_blocks_count_lo', 'I'), ('s_r_blocks_count_lo', 'I'),
+    ('s_free_blocks_count_lo', 'I'), ('s_free_inodes_count', 'I'), ('s_first_data_block', 'I'),
+    ('s_log_block_size', 'I'), ('s_log_cluster_size', 'I'), ('s_blocks_per_group', 'I'),
+    ('s_clusters_per_group', 'I'), ('s_inodes_per_group', 'I'), ('s_mtime', 'I'), ('s_wtime', 'I'),
+    ('s_mnt_count', 'H'), ('s_max_mnt_count', 'H'), ('s_magic', 'H'), ('s_state', 'H'),
+    ('s_errors', 'H'), ('s_minor_rev_level', 'H'), ('s_lastcheck', 'I'), ('s_checkinterval', 'I'),
+    ('s_creator_os', 'I'), ('s_rev_level', 'I'), ('s_def_resuid', 'H'), ('s_def_resgid', 'H'),
+    ('s_first_ino', 'I'), ('s_inode_size', 'H'), ('s_block_group_nr', 'H'),
+    ('s_feature_compat', 'I'), ('s_feature_incompat', 'I'), ('s_feature_ro_compat', 'I'),
+    ('s_uuid', '16s'), ('s_volume_name', '16s'), ('s_last_mounted', '64s'),
+    ('s_algorithm_usage_bitmap', 'I'), ('s_prealloc_blocks', 'B'), ('s_prealloc_dir_blocks', 'B'),
+    ('s_reserved_gdt_blocks', 'H'), ('s_journal_uuid', '16s'), ('s_journal_inum', 'I'),
+    ('s_journal_dev', 'I'), ('s_last_orphan', 'I'), ('s_hash_seed', '4I'),
+    ('s_def_hash_version', 'B'), ('s_jnl_backup_type', 'B'), ('s_desc_size', 'H'),
+    ('s_default_mount_opts', 'I'), ('s_first_meta_bg', 'I'), ('s_mkfs_time', 'I'),
+    ('s_jnl_blocks', '17I'), ('s_blocks_count_hi', 'I'), ('s_r_blocks_count_hi', 'I'),
+    ('s_free_blocks_count_hi', 'I'), ('s_min_extra_isize', 'H'), ('s_want_extra_isize', 'H'),
+    ('s_flags', 'I'), ('s_raid_stride', 'H'), ('s_mmp_interval', 'H'), ('s_mmp_block', 'Q'),
+    ('s_raid_stripe_width', 'I'), ('s_log_groups_per_flex', 'B'), ('s_checksum_type', 'B'),
+    ('s_reserved_pad', 'H'), ('s_kbytes_written', 'Q'), ('s_snapshot_inum', 'I'),
+    ('s_snapshot_id', 'I'), ('s_snapshot_r_blocks_count', 'Q'), ('s_snapshot_list', 'I'),
+    ('s_error_count', 'I'), ('s_first_error_time', 'I'), ('s_first_error_ino', 'I'),
+    ('s_first_error_block', 'Q'), ('s_first_error_func', '32s'), ('s_first_error_line', 'I'),
+    ('s_last_error_time', 'I'), ('s_last_error_ino', 'I'), ('s_last_error_line', 'I'),
+    ('s_last_error_block', 'Q'), ('s_last_error_func', '32s'), ('s_mount_opts', '64s'),
+    ('s_usr_quota_inum', 'I'), ('s_grp_quota_inum', 'I'), ('s_overhead_blocks', 'I'),
+    ('s_backup_bgs', '2I'), ('s_encrypt_algos', '4s'), ('s_encrypt_pw_salt', '16s'),
+    ('s_lpf_ino', 'I'), ('s_prj_quota_inum', 'I'), ('s_checksum_seed', 'I'),
+    ('s_reserved', '98I'), ('s_checksum', 'I'),
+]
+
+SUPERBLOCK_STRUCT = struct.Struct('<' + ''.join(fmt for _, fmt in SUPERBLOCK_LAYOUT))
+
+# (tên field, vị trí trong tuple unpack, số phần tử hoặc 0 nếu là giá trị đơn)
+SUPERBLOCK_FIELDS = []
+_index = 0
+for _name, _fmt in SUPERBLOCK_LAYOUT:
+    _count = int(_fmt[:-1]) if _fmt[-1] != 's' and len(_fmt) > 1 else 0
+    SUPERBLOCK_FIELDS.append((_name, _index, _count))
+    _index += _count or 1
+del _index, _name, _fmt, _count
+
+# Group descriptor: 32 bytes (không 64bit) và 64 bytes (INCOMPAT_64BIT)
+GROUP_DESC_STRUCT = struct.Struct('<3I4HI4H')
+GROUP_DESC_64_STRUCT = struct.Struct('<3I4HI4H3I4HI2HI')
+
+# Inode: 128 bytes gốc (i_block là 15I ở vị trí 12..26) + phần extra đến i_projid
+INODE_STRUCT = struct.Struct('<2H5I2H3I15I4I12s')
+INODE_EXTRA_STRUCT = struct.Struct('<2H7I')
+INODE_FULL_STRUCT = struct.Struct(INODE_STRUCT.format + INODE_EXTRA_STRUCT.format[1:])
+
+# Extent tree: header, extent (leaf) và index đều 12 bytes
+EXTENT_HEADER_STRUCT = struct.Struct('<4HI')
+EXTENT_STRUCT = struct.Struct('<I2HI')
+EXTENT_INDEX_STRUCT = struct.Struct('<2I2H')
+
+
+# View lười (lazy) trên buffer: chỉ giữ (buffer, offset, size), field nào được truy cập
+# mới decode field đó. Buffer phải còn nguyên dữ liệu trong suốt thời gian dùng view.
+
+class _Field:
+
+    __slots__ = ('offset', 'end', 'unpack', 'single', 'default')
+
+    def __init__(self, offset: int, fmt: str):
+
+        layout = struct.Struct('<' + fmt)
+        self.offset = offset
+        self.end = offset + layout.size
+        self.unpack = layout.unpack_from
+        self.single = len(fmt) == 1 or fmt[-1] == 's'
+        self.default = 0 if self.single else ()
+
+    def __get__(self, view, owner):
+
+        if view is None:
+            return self
+        if self.end > view._size:
+            # Field nằm ngoài vùng của cấu trúc (inode 128 bytes, descriptor 32 bytes)
+            return self.default
+        value = self.unpack(view._buf, view._offset + self.offset)
+        return value[0] if self.single else value
+
+
+def _add_fields(cls, layout):
+
+    offset = 0
+    for name, fmt in layout:
+        setattr(cls, name, _Field(offset, fmt))
+        offset += struct.calcsize('<' + fmt)
+    return cls
+
+
+class _StructView:
+
+    __slots__ = ('_buf', '_offset', '_size')
+
+    def __init__(self, buf, offset: int = 0, size: Optional[int] = None):
+
+        self._buf = buf
+        self._offset = offset
+        self._size = size if size is not None else len(buf) - offset
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(offset={self._offset}, size={self._size})"
+
+
+class SuperblockView(_StructView):
+
+    __slots__ = ()
+
+    get_block_size = Superblock.get_block_size
+    get_total_blocks = Superblock.get_total_blocks
+    is_valid = Superblock.is_valid
+    get_volume_name = Superblock.get_volume_name
+    has_journal = Superblock.has_journal
+
+
+class GroupDescriptorView(_StructView):
+
+    __slots__ = ()
+
+    get_block_bitmap = GroupDescriptor.get_block_bitmap
+    get_inode_bitmap = GroupDescriptor.get_inode_bitmap
+    get_inode_table = GroupDescriptor.get_inode_table
+    get_itable_unused = GroupDescriptor.get_itable_unused
+
+
+class InodeView(_StructView):
+    """Inode decode theo field: scan chỉ xem i_mode/i_links_count/i_dtime không decode phần còn lại"""
+
+    __slots__ = ()
+
+    get_size = Inode.get_size
+    is_directory = Inode.is_directory
+    is_regular_file = Inode.is_regular_file
+    is_symlink = Inode.is_symlink
+
+    def to_inode(self) -> Inode:
+
+        # Decode đầy đủ thành dataclass Inode (khi cần giữ lại sau khi buffer bị tái sử dụng)
+        values = (INODE_FULL_STRUCT if self._size >= INODE_FULL_STRUCT.size else INODE_STRUCT) \
+            .unpack_from(self._buf, self._offset)
+        return Inode(*values[:12], values[12:27], *values[27:])
+
+
+class DirectoryEntryView(_StructView):
+
+    __slots__ = ()
+
+    get_type_name = DirectoryEntry.get_type_name
+
+    @property
+    def name(self) -> str:
+
+        start = self._offset + 8
+        return bytes(self._buf[start:start + self.name_len]).decode('utf-8', errors='ignore')
+
+
+INODE_LAYOUT = [
+    ('i_mode', 'H'), ('i_uid', 'H'), ('i_size_lo', 'I'), ('i_atime', 'I'), ('i_ctime', 'I'),
+    ('i_mtime', 'I'), ('i_dtime', 'I'), ('i_gid', 'H'), ('i_links_count', 'H'),
+    ('i_blocks_lo', 'I'), ('i_flags', 'I'), ('i_osd1', 'I'), ('i_block', '15I'),
+    ('i_generation', 'I'), ('i_file_acl_lo', 'I'), ('i_size_high', 'I'), ('i_obso_faddr', 'I'),
+    ('i_osd2', '12s'), ('i_extra_isize', 'H'), ('i_checksum_hi', 'H'), ('i_ctime_extra', 'I'),
+    ('i_mtime_extra', 'I'), ('i_atime_extra', 'I'), ('i_crtime', 'I'), ('i_crtime_extra', 'I'),
+    ('i_version_hi', 'I'), ('i_projid', 'I'),
+]
+
+GROUP_DESC_LAYOUT = [
+    ('bg_block_bitmap_lo', 'I'), ('bg_inode_bitmap_lo', 'I'), ('bg_inode_table_lo', 'I'),
+    ('bg_free_blocks_count_lo', 'H'), ('bg_free_inodes_count_lo', 'H'),
+    ('bg_used_dirs_count_lo', 'H'), ('bg_flags', 'H'), ('bg_exclude_bitmap_lo', 'I'),
+    ('bg_block_bitmap_csum_lo', 'H'), ('bg_inode_bitmap_csum_lo', 'H'),
+    ('bg_itable_unused_lo', 'H'), ('bg_checksum', 'H'),
+    ('bg_block_bitmap_hi', 'I'), ('bg_inode_bitmap_hi', 'I'), ('bg_inode_table_hi', 'I'),
+    ('bg_free_blocks_count_hi', 'H'), ('bg_free_inodes_count_hi', 'H'),
+    ('bg_used_dirs_count_hi', 'H'), ('bg_itable_unused_hi', 'H'), ('bg_exclude_bitmap_hi', 'I'),
+    ('bg_block_bitmap_csum_hi', 'H'), ('bg_inode_bitmap_csum_hi', 'H'), ('bg_reserved', 'I'),
+]
+
+DIRECTORY_ENTRY_LAYOUT = [
+    ('inode', 'I'), ('rec_len', 'H'), ('name_len', 'B'), ('file_type', 'B'),
+]
+
+_add_fields(SuperblockView, SUPERBLOCK_LAYOUT)
+_add_fields(GroupDescriptorView, GROUP_DESC_LAYOUT)
+_add_fields(InodeView, INODE_LAYOUT)
+_add_fields(DirectoryEntryView, DIRECTORY_ENTRY_LAYOUT)
@@ -2,68 +2,135 @@
 
 import struct
 import os
-from typing import Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 import hashlib
-import binascii
 from ext4_structures import *
+from block_device import BlockDevice, open_image
+from ext4_checksum import crc32c
 
 
 class EXT4Utils:
     
     
     @staticmethod
-    def read_block(file_path: str, block_number: int, block_size: int) -> Optional[bytes]:
+    def open_device(device: Union[str, BlockDevice], writable: bool = False,
+                    direct: bool = False) -> Tuple[BlockDevice, bool]:
+        
+        # Trả về (device, owned): owned = True nếu handle được mở tạm từ path
+        # direct=True: đọc bỏ qua page cache (O_DIRECT / posix_fadvise)
+        if isinstance(device, BlockDevice):
+            return device, False
+        if direct:
+            return open_image(device, writable=writable, direct=True), True
+        return BlockDevice(device, writable=writable), True
+    
+    @staticmethod
+    def read_block(device: Union[str, BlockDevice], block_number: int, block_size: int) -> Optional[bytes]:
         
         try:
-            with open(file_path, 'rb') as f:
-                offset = block_number * block_size
-                f.seek(offset)
-                data = f.read(block_size)
-                if len(data) < block_size:
-                    # Pad với zeros nếu đọc không đủ
-                    data += b'\x00' * (block_size - len(data))
-                return data
+            dev, owned = EXT4Utils.open_device(device)
+            try:
+                return dev.read_block(block_number, block_size)
+            finally:
+                if owned:
+                    dev.close()
         except Exception as e:
             print(f"Lỗi khi đọc block {block_number}: {e}")
             return None
     
     @staticmethod
-    def write_block(file_path: str, block_number: int, data: bytes, block_size: int) -> bool:
+    def write_block(device: Union[str, BlockDevice], block_number: int, data: bytes, block_size: int) -> bool:
         
         try:
-            with open(file_path, 'r+b') as f:
-                offset = block_number * block_size
-                f.seek(offset)
-                # Đảm bảo data có đúng kích thước
-                if len(data) < block_size:
-                    data += b'\x00' * (block_size - len(data))
-                elif len(data) > block_size:
-                    data = data[:block_size]
-                f.write(data)
+            # Đảm bảo data có đúng kích thước
+            if len(data) < block_size:
+                data += b'\x00' * (block_size - len(data))
+            elif len(data) > block_size:
+                data = data[:block_size]
+            
+            dev, owned = EXT4Utils.open_device(device, writable=True)
+            try:
+                dev.write_block(block_number, data, block_size)
                 return True
+            finally:
+                if owned:
+                    dev.close()
         except Exception as e:
             print(f"Lỗi khi ghi block {block_number}: {e}")
             return False
     
     @staticmethod
-    def read_bytes(file_path: str, offset: int, size: int) -> Optional[bytes]:
+    def read_blocks(device: Union[str, BlockDevice], block_list: Iterable[int], block_size: int,
+                    use_cache: bool = True) -> Dict[int, memoryview]:
+        
+        # Gộp các block liền kề / gần nhau thành ít lần đọc lớn (preadv)
+        try:
+            dev, owned = EXT4Utils.open_device(device)
+            try:
+                return dev.read_blocks(block_list, block_size, use_cache=use_cache)
+            finally:
+                if owned:
+                    dev.close()
+        except Exception as e:
+            print(f"Lỗi khi đọc nhiều block: {e}")
+            return {}
+    
+    @staticmethod
+    def read_range(device: Union[str, BlockDevice], start_block: int, count: int, block_size: int,
+                   use_cache: bool = True) -> List[memoryview]:
+        
+        try:
+            dev, owned = EXT4Utils.open_device(device)
+            try:
+                return dev.read_range(start_block, count, block_size, use_cache=use_cache)
+            finally:
+                if owned:
+                    dev.close()
+        except Exception as e:
+            print(f"Lỗi khi đọc block {start_block}..{start_block + count - 1}: {e}")
+            return []
+    
+    @staticmethod
+    def read_bytes(device: Union[str, BlockDevice], offset: int, size: int) -> Optional[bytes]:
         
         try:
-            with open(file_path, 'rb') as f:
-                f.seek(offset)
-                return f.read(size)
+            dev, owned = EXT4Utils.open_device(device)
+            try:
+                return dev.pread(size, offset)
+            finally:
+                if owned:
+                    dev.close()
         except Exception as e:
             print(f"Lỗi khi đọc tại offset {offset}: {e}")
             return None
     
     @staticmethod
-    def write_bytes(file_path: str, offset: int, data: bytes) -> bool:
+    def read_view(device: Union[str, BlockDevice], offset: int, size: int) -> Optional[memoryview]:
         
+        # Với MappedBlockDevice: memoryview trỏ thẳng vào mapping, không copy
         try:
-            with open(file_path, 'r+b') as f:
-                f.seek(offset)
-                f.write(data)
+            dev, owned = EXT4Utils.open_device(device)
+            try:
+                view = dev.read_view(offset, size)
+                return memoryview(bytes(view)) if owned else view
+            finally:
+                if owned:
+                    dev.close()
+        except Exception as e:
+            print(f"Lỗi khi đọc tại offset {offset}: {e}")
+            return None
+    
+    @staticmethod
+    def write_bytes(device: Union[str, BlockDevice], offset: int, data: bytes) -> bool:
+        
+        try:
+            dev, owned = EXT4Utils.open_device(device, writable=True)
+            try:
+                dev.pwrite(data, offset)
                 return True
+            finally:
+                if owned:
+                    dev.close()
         except Exception as e:
             print(f"Lỗi khi ghi tại offset {offset}: {e}")
             return False
@@ -84,9 +151,10 @@ class EXT4Utils:
         return all(b == 0 for b in data)
     
     @staticmethod
-    def calculate_crc32c(data: bytes) -> int:
+    def calculate_crc32c(data: bytes, value: int = 0) -> int:
         
-        return binascii.crc32(data) & 0xffffffff
+        # CRC32c (Castagnoli) thật, không phải zlib CRC32
+        return crc32c(data, value)
     
     @staticmethod
     def calculate_md5(data: str) -> str:
@@ -94,87 +162,16 @@ class EXT4Utils:
         return hashlib.md5(data.encode()).hexdigest()
     
     @staticmethod
-    def parse_superblock(data: bytes) -> Optional[Superblock]:
+    def parse_superblock(data: bytes, offset: int = 0) -> Optional[Superblock]:
         
-        if len(data) < 1024:
+        if len(data) - offset < SUPERBLOCK_STRUCT.size:
             return None
         
-        sb = Superblock()
-        
         try:
-            # Parse các trường cơ bản
-            sb.s_inodes_count = struct.unpack('<I', data[0:4])[0]
-            sb.s_blocks_count_lo = struct.unpack('<I', data[4:8])[0]
-            sb.s_r_blocks_count_lo = struct.unpack('<I', data[8:12])[0]
-            sb.s_free_blocks_count_lo = struct.unpack('<I', data[12:16])[0]
-            sb.s_free_inodes_count = struct.unpack('<I', data[16:20])[0]
-            sb.s_first_data_block = struct.unpack('<I', data[20:24])[0]
-            sb.s_log_block_size = struct.unpack('<I', data[24:28])[0]
-            sb.s_log_cluster_size = struct.unpack('<I', data[28:32])[0]
-            sb.s_blocks_per_group = struct.unpack('<I', data[32:36])[0]
-            sb.s_clusters_per_group = struct.unpack('<I', data[36:40])[0]
-            sb.s_inodes_per_group = struct.unpack('<I', data[40:44])[0]
-            sb.s_mtime = struct.unpack('<I', data[44:48])[0]
-            sb.s_wtime = struct.unpack('<I', data[48:52])[0]
-            sb.s_mnt_count = struct.unpack('<H', data[52:54])[0]
-            sb.s_max_mnt_count = struct.unpack('<H', data[54:56])[0]
-            sb.s_magic = struct.unpack('<H', data[56:58])[0]
-            sb.s_state = struct.unpack('<H', data[58:60])[0]
-            sb.s_errors = struct.unpack('<H', data[60:62])[0]
-            sb.s_minor_rev_level = struct.unpack('<H', data[62:64])[0]
-            sb.s_lastcheck = struct.unpack('<I', data[64:68])[0]
-            sb.s_checkinterval = struct.unpack('<I', data[68:72])[0]
-            sb.s_creator_os = struct.unpack('<I', data[72:76])[0]
-            sb.s_rev_level = struct.unpack('<I', data[76:80])[0]
-            sb.s_def_resuid = struct.unpack('<H', data[80:82])[0]
-            sb.s_def_resgid = struct.unpack('<H', data[82:84])[0]
-            
-            # Dynamic revision fields
-            sb.s_first_ino = struct.unpack('<I', data[84:88])[0]
-            sb.s_inode_size = struct.unpack('<H', data[88:90])[0]
-            sb.s_block_group_nr = struct.unpack('<H', data[90:92])[0]
-            sb.s_feature_compat = struct.unpack('<I', data[92:96])[0]
-            sb.s_feature_incompat = struct.unpack('<I', data[96:100])[0]
-            sb.s_feature_ro_compat = struct.unpack('<I', data[100:104])[0]
-            sb.s_uuid = data[104:120]
-            sb.s_volume_name = data[120:136]
-            sb.s_last_mounted = data[136:200]
-            sb.s_algorithm_usage_bitmap = struct.unpack('<I', data[200:204])[0]
-            
-            # More fields...
-            sb.s_prealloc_blocks = struct.unpack('<B', data[204:205])[0]
-            sb.s_prealloc_dir_blocks = struct.unpack('<B', data[205:206])[0]
-            sb.s_reserved_gdt_blocks = struct.unpack('<H', data[206:208])[0]
-            
-            # Journal
-            sb.s_journal_uuid = data[208:224]
-            sb.s_journal_inum = struct.unpack('<I', data[224:228])[0]
-            sb.s_journal_dev = struct.unpack('<I', data[228:232])[0]
-            sb.s_last_orphan = struct.unpack('<I', data[232:236])[0]
-            
-            # Hash seed
-            hash_seed = struct.unpack('<IIII', data[236:252])
-            sb.s_hash_seed = hash_seed
-            sb.s_def_hash_version = struct.unpack('<B', data[252:253])[0]
-            sb.s_jnl_backup_type = struct.unpack('<B', data[253:254])[0]
-            sb.s_desc_size = struct.unpack('<H', data[254:256])[0]
-            
-            sb.s_default_mount_opts = struct.unpack('<I', data[256:260])[0]
-            sb.s_first_meta_bg = struct.unpack('<I', data[260:264])[0]
-            sb.s_mkfs_time = struct.unpack('<I', data[264:268])[0]
-            
-            # 64-bit support
-            if len(data) >= 336:
-                sb.s_blocks_count_hi = struct.unpack('<I', data[336:340])[0]
-                sb.s_r_blocks_count_hi = struct.unpack('<I', data[340:344])[0]
-                sb.s_free_blocks_count_hi = struct.unpack('<I', data[344:348])[0]
-                sb.s_min_extra_isize = struct.unpack('<H', data[348:350])[0]
-                sb.s_want_extra_isize = struct.unpack('<H', data[350:352])[0]
-                sb.s_flags = struct.unpack('<I', data[352:356])[0]
-            
-            # Checksum (ở cuối)
-            if len(data) >= 1024:
-                sb.s_checksum = struct.unpack('<I', data[1020:1024])[0]
+            # Decode cả superblock trong một lần unpack_from, gom lại các field dạng mảng
+            values = SUPERBLOCK_STRUCT.unpack_from(data, offset)
+            sb = Superblock(*[values[index] if not count else values[index:index + count]
+                              for _, index, count in SUPERBLOCK_FIELDS])
             
             return sb if sb.is_valid() else None
             
@@ -183,90 +180,40 @@ class EXT4Utils:
             return None
     
     @staticmethod
-    def parse_group_descriptor(data: bytes, use_64bit: bool = False) -> Optional[GroupDescriptor]:
+    def parse_group_descriptor(data: bytes, use_64bit: bool = False, offset: int = 0) -> Optional[GroupDescriptor]:
         
-        if len(data) < 32:
+        available = len(data) - offset
+        if available < GROUP_DESC_STRUCT.size:
             return None
         
-        gd = GroupDescriptor()
-        
         try:
-            gd.bg_block_bitmap_lo = struct.unpack('<I', data[0:4])[0]
-            gd.bg_inode_bitmap_lo = struct.unpack('<I', data[4:8])[0]
-            gd.bg_inode_table_lo = struct.unpack('<I', data[8:12])[0]
-            gd.bg_free_blocks_count_lo = struct.unpack('<H', data[12:14])[0]
-            gd.bg_free_inodes_count_lo = struct.unpack('<H', data[14:16])[0]
-            gd.bg_used_dirs_count_lo = struct.unpack('<H', data[16:18])[0]
-            gd.bg_flags = struct.unpack('<H', data[18:20])[0]
-            gd.bg_exclude_bitmap_lo = struct.unpack('<I', data[20:24])[0]
-            gd.bg_block_bitmap_csum_lo = struct.unpack('<H', data[24:26])[0]
-            gd.bg_inode_bitmap_csum_lo = struct.unpack('<H', data[26:28])[0]
-            gd.bg_itable_unused_lo = struct.unpack('<H', data[28:30])[0]
-            gd.bg_checksum = struct.unpack('<H', data[30:32])[0]
-            
-            # 64-bit fields
-            if use_64bit and len(data) >= 64:
-                gd.bg_block_bitmap_hi = struct.unpack('<I', data[32:36])[0]
-                gd.bg_inode_bitmap_hi = struct.unpack('<I', data[36:40])[0]
-                gd.bg_inode_table_hi = struct.unpack('<I', data[40:44])[0]
-                gd.bg_free_blocks_count_hi = struct.unpack('<H', data[44:46])[0]
-                gd.bg_free_inodes_count_hi = struct.unpack('<H', data[46:48])[0]
-                gd.bg_used_dirs_count_hi = struct.unpack('<H', data[48:50])[0]
-                gd.bg_itable_unused_hi = struct.unpack('<H', data[50:52])[0]
-                gd.bg_exclude_bitmap_hi = struct.unpack('<I', data[52:56])[0]
-                gd.bg_block_bitmap_csum_hi = struct.unpack('<H', data[56:58])[0]
-                gd.bg_inode_bitmap_csum_hi = struct.unpack('<H', data[58:60])[0]
-            
-            return gd
+            # 64-bit fields chỉ đọc khi có INCOMPAT_64BIT và descriptor đủ 64 bytes
+            if use_64bit and available >= GROUP_DESC_64_STRUCT.size:
+                return GroupDescriptor(*GROUP_DESC_64_STRUCT.unpack_from(data, offset))
+            return GroupDescriptor(*GROUP_DESC_STRUCT.unpack_from(data, offset))
             
         except Exception as e:
             print(f"Lỗi khi parse group descriptor: {e}")
             return None
     
     @staticmethod
-    def parse_inode(data: bytes) -> Optional[Inode]:
+    def parse_inode(data: bytes, offset: int = 0, inode_size: Optional[int] = None) -> Optional[Inode]:
         
-        if len(data) < 128:
+        # inode_size: giới hạn vùng decode khi data là cả block inode table
+        available = len(data) - offset
+        if inode_size is not None:
+            available = min(available, inode_size)
+        if available < INODE_STRUCT.size:
             return None
         
-        inode = Inode()
-        
         try:
-            inode.i_mode = struct.unpack('<H', data[0:2])[0]
-            inode.i_uid = struct.unpack('<H', data[2:4])[0]
-            inode.i_size_lo = struct.unpack('<I', data[4:8])[0]
-            inode.i_atime = struct.unpack('<I', data[8:12])[0]
-            inode.i_ctime = struct.unpack('<I', data[12:16])[0]
-            inode.i_mtime = struct.unpack('<I', data[16:20])[0]
-            inode.i_dtime = struct.unpack('<I', data[20:24])[0]
-            inode.i_gid = struct.unpack('<H', data[24:26])[0]
-            inode.i_links_count = struct.unpack('<H', data[26:28])[0]
-            inode.i_blocks_lo = struct.unpack('<I', data[28:32])[0]
-            inode.i_flags = struct.unpack('<I', data[32:36])[0]
-            inode.i_osd1 = struct.unpack('<I', data[36:40])[0]
-            
-            # i_block[15] - 60 bytes
-            i_block = struct.unpack('<15I', data[40:100])
-            inode.i_block = i_block
-            
-            inode.i_generation = struct.unpack('<I', data[100:104])[0]
-            inode.i_file_acl_lo = struct.unpack('<I', data[104:108])[0]
-            inode.i_size_high = struct.unpack('<I', data[108:112])[0]
-            inode.i_obso_faddr = struct.unpack('<I', data[112:116])[0]
-            inode.i_osd2 = data[116:128]
-            
-            # Extra inode fields (nếu inode > 128 bytes)
-            if len(data) >= 256:
-                inode.i_extra_isize = struct.unpack('<H', data[128:130])[0]
-                inode.i_checksum_hi = struct.unpack('<H', data[130:132])[0]
-                inode.i_ctime_extra = struct.unpack('<I', data[132:136])[0]
-                inode.i_mtime_extra = struct.unpack('<I', data[136:140])[0]
-                inode.i_atime_extra = struct.unpack('<I', data[140:144])[0]
-                inode.i_crtime = struct.unpack('<I', data[144:148])[0]
-                inode.i_crtime_extra = struct.unpack('<I', data[148:152])[0]
-                inode.i_version_hi = struct.unpack('<I', data[152:156])[0]
-            
-            return inode
+            # i_block[15] nằm ở vị trí 12..26 của tuple
+            if available >= INODE_FULL_STRUCT.size:
+                # Extra inode fields (inode > 128 bytes)
+                v = INODE_FULL_STRUCT.unpack_from(data, offset)
+            else:
+                v = INODE_STRUCT.unpack_from(data, offset)
+            return Inode(*v[:12], v[12:27], *v[27:])
             
         except Exception as e:
             print(f"Lỗi khi parse inode: {e}")
@@ -0,0 +1,66 @@
+import struct
+from typing import Dict, Optional, Tuple
+
+from ext4_structures import EXT4_GOOD_OLD_INODE_SIZE
+
+
+EXT4_XATTR_MAGIC = 0xEA020000
+
+# name_index của các namespace xattr
+EXT4_XATTR_INDEX_USER = 1
+EXT4_XATTR_INDEX_SECURITY = 6
+EXT4_XATTR_INDEX_SYSTEM = 7
+
+# Entry: e_name_len, e_name_index, e_value_offs, e_value_inum, e_value_size, e_hash
+XATTR_ENTRY_STRUCT = struct.Struct('<BBHIII')
+
+# Inline data: 60 bytes đầu nằm trong i_block, phần còn lại trong xattr system.data
+EXT4_MIN_INLINE_DATA_SIZE = 60
+
+
+def parse_ibody_xattrs(raw_inode, inode_size: int) -> Dict[Tuple[int, bytes], bytes]:
+
+    # Xattr lưu ngay trong inode (sau 128 + i_extra_isize); trả về {(name_index, name): value}
+    # Value nằm ở inode khác (ea_inode) bị bỏ qua
+    xattrs: Dict[Tuple[int, bytes], bytes] = {}
+    if inode_size <= EXT4_GOOD_OLD_INODE_SIZE or len(raw_inode) < inode_size:
+        return xattrs
+
+    extra_isize = struct.unpack_from('<H', raw_inode, EXT4_GOOD_OLD_INODE_SIZE)[0]
+    header = EXT4_GOOD_OLD_INODE_SIZE + extra_isize
+    if extra_isize % 4 or header + 4 > inode_size:
+        return xattrs
+    if struct.unpack_from('<I', raw_inode, header)[0] != EXT4_XATTR_MAGIC:
+        return xattrs
+
+    # Offset của value tính từ entry đầu tiên
+    first = header + 4
+    offset = first
+    while offset + XATTR_ENTRY_STRUCT.size <= inode_size:
+        name_len, name_index, value_offs, value_inum, value_size, _ = \
+            XATTR_ENTRY_STRUCT.unpack_from(raw_inode, offset)
+        if name_len == 0 and name_index == 0 and value_offs == 0 and value_inum == 0:
+            break
+
+        name_start = offset + XATTR_ENTRY_STRUCT.size
+        name = bytes(raw_inode[name_start:name_start + name_len])
+        value_start = first + value_offs
+        if not value_inum and value_start + value_size <= inode_size:
+            xattrs[(name_index, name)] = bytes(raw_inode[value_start:value_start + value_size])
+
+        # Entry căn theo 4 bytes
+        offset = (name_start + name_len + 3) & ~3
+    return xattrs
+
+
+def read_inline_data(raw_inode, inode_size: int, file_size: Optional[int] = None) -> bytes:
+
+    # Nội dung file inline: i_block (60 bytes) + system.data, cắt theo i_size
+    i_block = bytes(raw_inode[40:40 + EXT4_MIN_INLINE_DATA_SIZE])
+    data = i_block
+    if file_size is None or file_size > EXT4_MIN_INLINE_DATA_SIZE:
+        extra = parse_ibody_xattrs(raw_inode, inode_size).get((EXT4_XATTR_INDEX_SYSTEM, b'data'), b'')
+        data += extra
+    if file_size is not None:
+        data = data[:file_size]
+    return data
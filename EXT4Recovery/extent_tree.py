@@ -0,0 +1,184 @@
+import struct
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from ext4_structures import (
+    Extent, ExtentHeader, ExtentIndex,
+    EXTENT_HEADER_STRUCT, EXTENT_STRUCT, EXTENT_INDEX_STRUCT,
+    EXT4_EXT_MAX_DEPTH
+)
+from block_device import BlockDevice
+
+
+# Số node (index / leaf) đã parse giữ lại, dùng chung cho mọi ExtentTree
+NODE_CACHE_SIZE = 4096
+
+ExtentNode = Tuple[ExtentHeader, Tuple[Union[Extent, ExtentIndex], ...]]
+
+
+def parse_extent_node(data, offset: int = 0) -> Optional[ExtentNode]:
+
+    # Parse một node (header + entries); None nếu magic sai hoặc số entry vượt quá vùng dữ liệu
+    available = len(data) - offset - EXTENT_HEADER_STRUCT.size
+    if available < 0:
+        return None
+
+    header = ExtentHeader(*EXTENT_HEADER_STRUCT.unpack_from(data, offset))
+    if not header.is_valid() or header.eh_depth > EXT4_EXT_MAX_DEPTH:
+        return None
+    if header.eh_entries > header.eh_max or header.eh_entries * 12 > available:
+        return None
+
+    start = offset + EXTENT_HEADER_STRUCT.size
+    body = memoryview(data)[start:start + header.eh_entries * 12]
+    if header.eh_depth == 0:
+        entries = tuple(Extent(*v) for v in EXTENT_STRUCT.iter_unpack(body))
+    else:
+        entries = tuple(ExtentIndex(*v) for v in EXTENT_INDEX_STRUCT.iter_unpack(body))
+    return header, entries
+
+
+def i_block_bytes(i_block: Union[bytes, memoryview, Sequence[int]]) -> bytes:
+
+    # i_block của Inode là tuple 15 số nguyên -> 60 bytes gốc
+    if isinstance(i_block, (bytes, bytearray, memoryview)):
+        return i_block
+    return struct.pack('<15I', *i_block)
+
+
+_node_cache: "OrderedDict[tuple, ExtentNode]" = OrderedDict()
+_node_lock = threading.Lock()
+
+
+def clear_extent_cache() -> None:
+
+    with _node_lock:
+        _node_cache.clear()
+
+
+class ExtentTree:
+    """Duyệt extent tree với độ sâu bất kỳ
+
+    Duyệt theo từng tầng: mọi node con của một tầng được đọc gộp bằng một lần read_blocks,
+    nên số lần đọc bị chặn bởi độ sâu của tree chứ không phải số extent.
+    Node đã parse được cache theo (image, block).
+    """
+
+    def __init__(self, device: BlockDevice, block_size: int, checksum=None,
+                 max_block: Optional[int] = None, use_cache: bool = True):
+
+        self.device = device
+        self.block_size = block_size
+        self.checksum = checksum if checksum is not None and checksum.enabled else None
+        self.max_block = max_block
+        self.use_cache = use_cache
+        self.stats = {'walks': 0, 'reads': 0, 'nodes_read': 0, 'cache_hits': 0,
+                      'bad_nodes': 0, 'checksum_errors': 0}
+
+    def walk(self, i_block, inode_num: int = 0,
+             generation: int = 0) -> Tuple[List[Extent], List[int]]:
+
+        # Trả về (extents theo thứ tự logical, các block index/leaf của tree)
+        self.stats['walks'] += 1
+        root = parse_extent_node(i_block_bytes(i_block))
+        if root is None:
+            return [], []
+
+        header, level = root
+        depth = header.eh_depth
+        tree_blocks: List[int] = []
+        seen = set()
+
+        while depth > 0:
+            children = []
+            for index in level:
+                block = index.get_leaf_block()
+                if block == 0 or block in seen:
+                    continue
+                if self.max_block is not None and block >= self.max_block:
+                    self.stats['bad_nodes'] += 1
+                    continue
+                seen.add(block)
+                children.append(block)
+
+            depth -= 1
+            nodes = self._load_nodes(children, depth, inode_num, generation)
+            tree_blocks.extend(children)
+            level = []
+            for block in children:
+                node = nodes.get(block)
+                if node is not None:
+                    level.extend(node[1])
+
+        extents = [extent for extent in level if extent.get_length() > 0]
+        extents.sort(key=lambda extent: extent.ee_block)
+        return extents, tree_blocks
+
+    def walk_inode(self, inode, inode_num: int = 0) -> Tuple[List[Extent], List[int]]:
+
+        return self.walk(inode.i_block, inode_num, inode.i_generation)
+
+    def extents(self, inode, inode_num: int = 0) -> List[Extent]:
+
+        return self.walk_inode(inode, inode_num)[0]
+
+    @staticmethod
+    def physical_blocks(extents: List[Extent], include_uninit: bool = False) -> List[int]:
+
+        # Block vật lý theo thứ tự logical; extent uninit đọc ra toàn 0 nên mặc định bỏ qua
+        blocks = []
+        for extent in extents:
+            if extent.is_uninitialized() and not include_uninit:
+                continue
+            start = extent.get_start_block()
+            blocks.extend(range(start, start + extent.get_length()))
+        return blocks
+
+    def _load_nodes(self, blocks: List[int], depth: int, inode_num: int,
+                    generation: int) -> Dict[int, ExtentNode]:
+
+        nodes: Dict[int, ExtentNode] = {}
+        missing = []
+        base_key = (self.device.key, self.device.stamp, self.device.writes, self.block_size)
+
+        if self.use_cache:
+            with _node_lock:
+                for block in blocks:
+                    node = _node_cache.get(base_key + (block,))
+                    if node is not None:
+                        _node_cache.move_to_end(base_key + (block,))
+                        nodes[block] = node
+                    else:
+                        missing.append(block)
+            self.stats['cache_hits'] += len(nodes)
+        else:
+            missing = blocks
+
+        if missing:
+            # Node đã được cache sau khi parse nên không cần giữ block thô trong block cache
+            data = self.device.read_blocks(missing, self.block_size, use_cache=False)
+            self.stats['reads'] += 1
+            self.stats['nodes_read'] += len(missing)
+
+            parsed = {}
+            for block in missing:
+                raw = data.get(block)
+                node = parse_extent_node(raw) if raw is not None else None
+                if node is None or node[0].eh_depth != depth:
+                    self.stats['bad_nodes'] += 1
+                    continue
+                if self.checksum and inode_num and \
+                        not self.checksum.verify_extent_block(raw, inode_num, generation):
+                    # Vẫn dùng node (phục hồi best-effort), chỉ ghi nhận
+                    self.stats['checksum_errors'] += 1
+                parsed[block] = node
+            nodes.update(parsed)
+
+            if self.use_cache and parsed:
+                with _node_lock:
+                    for block, node in parsed.items():
+                        _node_cache[base_key + (block,)] = node
+                    while len(_node_cache) > NODE_CACHE_SIZE:
+                        _node_cache.popitem(last=False)
+        return nodes
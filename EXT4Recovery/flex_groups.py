@@ -0,0 +1,112 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ext4_structures import Superblock, EXT4_FEATURE_INCOMPAT_FLEX_BG
+from block_device import BlockDevice
+
+
+# Một lần đọc inode table gộp tối đa chừng này bytes
+MAX_FLEX_READ = 64 * 1024 * 1024
+# Khoảng hở tối đa (bytes) giữa hai vùng vẫn gộp chung một lần đọc (đuôi itable_unused nhỏ)
+MAX_FLEX_GAP = 64 * 1024
+
+
+def groups_per_flex(sb: Superblock) -> int:
+
+    if not sb.s_feature_incompat & EXT4_FEATURE_INCOMPAT_FLEX_BG:
+        return 1
+    return 1 << sb.s_log_groups_per_flex
+
+
+class FlexGroupReader:
+    """Đọc metadata theo flex group: bitmap / inode table của các group trong cùng flex group
+    nằm liền nhau trên đĩa, nên đọc cả dải một lần rồi cắt ra view cho từng group
+    """
+
+    def __init__(self, device: BlockDevice, sb: Superblock, group_descriptors,
+                 max_read: int = MAX_FLEX_READ, max_gap: int = MAX_FLEX_GAP):
+
+        self.device = device
+        self.superblock = sb
+        self.group_descriptors = group_descriptors
+        self.block_size = sb.get_block_size()
+        self.groups_per_flex = groups_per_flex(sb)
+        self.max_read = max_read
+        self.max_gap = max_gap
+        self.stats = {'reads': 0, 'bytes_read': 0, 'groups': 0}
+
+    def flex_group(self, group: int) -> range:
+
+        first = group - group % self.groups_per_flex
+        return range(first, min(first + self.groups_per_flex, len(self.group_descriptors)))
+
+    def flex_groups(self, groups: Optional[Iterable[int]] = None) -> List[List[int]]:
+
+        # Chia danh sách group theo flex group (giữ thứ tự)
+        if groups is None:
+            groups = range(len(self.group_descriptors))
+        result: List[List[int]] = []
+        current_flex = None
+        for group in groups:
+            flex = group // self.groups_per_flex
+            if flex != current_flex:
+                result.append([])
+                current_flex = flex
+            result[-1].append(group)
+        return result
+
+    def valid_block(self, block: int) -> bool:
+
+        # Con trỏ trong descriptor hỏng có thể trỏ ra ngoài filesystem / image: đọc ra sẽ là zeros
+        total = self.superblock.get_total_blocks()
+        return 0 < block and (not total or block < total) and \
+            block * self.block_size < self.device.size()
+
+    def bitmaps(self, kind: str, groups: Iterable[int]) -> Dict[int, memoryview]:
+
+        # kind: 'block' hoặc 'inode'. Các block bitmap liền nhau được read_blocks gộp
+        # thành một preadv và giữ trong block cache (ghi đè qua device sẽ tự invalidate).
+        # Group có con trỏ bitmap không hợp lệ không có trong kết quả
+        locate = 'get_block_bitmap' if kind == 'block' else 'get_inode_bitmap'
+        locations = {group: getattr(self.group_descriptors[group], locate)() for group in groups}
+        locations = {group: block for group, block in locations.items() if self.valid_block(block)}
+        blocks = self.device.read_blocks(locations.values(), self.block_size)
+        return {group: blocks[block] for group, block in locations.items() if block in blocks}
+
+    def bitmap(self, kind: str, group: int) -> Optional[memoryview]:
+
+        # Bitmap của một group: nạp luôn cả flex group, các group sau lấy từ block cache
+        return self.bitmaps(kind, self.flex_group(group)).get(group)
+
+    def inode_tables(self, groups: Iterable[int],
+                     counts: Optional[Dict[int, int]] = None) -> Iterator[Tuple[int, memoryview]]:
+
+        # (group, bytes inode table) theo thứ tự; counts[group] = số inode cần đọc ở đầu bảng
+        # (mặc định cả bảng). Các bảng liền nhau (flex_bg) được gộp thành một lần pread.
+        inode_size = self.superblock.s_inode_size
+        ipg = self.superblock.s_inodes_per_group
+        for flex in self.flex_groups(groups):
+            spans: List[Tuple[int, int, List[Tuple[int, int, int]]]] = []
+            for group in flex:
+                count = ipg if counts is None else counts.get(group, ipg)
+                if count <= 0:
+                    continue
+                start = self.group_descriptors[group].get_inode_table() * self.block_size
+                length = count * inode_size
+                if spans:
+                    span_start, span_end, members = spans[-1]
+                    if 0 <= start - span_end <= self.max_gap and \
+                            start + length - span_start <= self.max_read:
+                        members.append((group, start, length))
+                        spans[-1] = (span_start, start + length, members)
+                        continue
+                spans.append((start, start + length, [(group, start, length)]))
+
+            for span_start, span_end, members in spans:
+                data = self.device.pread(span_end - span_start, span_start)
+                self.stats['reads'] += 1
+                self.stats['bytes_read'] += len(data)
+                view = memoryview(data)
+                for group, start, length in members:
+                    self.stats['groups'] += 1
+                    offset = start - span_start
+                    yield group, view[offset:offset + length]
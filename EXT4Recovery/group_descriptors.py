@@ -0,0 +1,178 @@
+import threading
+from collections import OrderedDict
+from typing import Iterator, List, Optional, Union
+
+from ext4_structures import (
+    Superblock, GroupDescriptor, GROUP_DESC_STRUCT, GROUP_DESC_64_STRUCT,
+    EXT4_FEATURE_INCOMPAT_64BIT
+)
+from block_device import BlockDevice
+
+
+EXT4_FEATURE_COMPAT_SPARSE_SUPER2 = 0x0200
+EXT4_FEATURE_INCOMPAT_META_BG = 0x0010
+EXT4_FEATURE_RO_COMPAT_SPARSE_SUPER = 0x0001
+
+EXT4_MIN_DESC_SIZE = 32
+EXT4_MIN_DESC_SIZE_64BIT = 64
+
+# Số bảng GDT giữ lại (mỗi image một bảng)
+GDT_CACHE_SIZE = 8
+
+
+def group_count(sb: Superblock) -> int:
+
+    blocks = sb.get_total_blocks() - sb.s_first_data_block
+    return (blocks + sb.s_blocks_per_group - 1) // sb.s_blocks_per_group
+
+
+def descriptor_size(sb: Superblock) -> int:
+
+    if not sb.s_feature_incompat & EXT4_FEATURE_INCOMPAT_64BIT:
+        return EXT4_MIN_DESC_SIZE
+    if sb.s_desc_size >= EXT4_MIN_DESC_SIZE_64BIT and sb.s_desc_size & (sb.s_desc_size - 1) == 0:
+        return sb.s_desc_size
+    return EXT4_MIN_DESC_SIZE_64BIT
+
+
+def _is_power_of(n: int, base: int) -> bool:
+
+    while n > 1 and n % base == 0:
+        n //= base
+    return n == 1
+
+
+def group_has_super(sb: Superblock, group: int) -> bool:
+
+    # Group có bản sao superblock (+ GDT) hay không
+    if group == 0:
+        return True
+    if sb.s_feature_compat & EXT4_FEATURE_COMPAT_SPARSE_SUPER2:
+        return group in sb.s_backup_bgs
+    if not sb.s_feature_ro_compat & EXT4_FEATURE_RO_COMPAT_SPARSE_SUPER:
+        return True
+    return _is_power_of(group, 3) or _is_power_of(group, 5) or _is_power_of(group, 7)
+
+
+def gdt_block_locations(sb: Superblock) -> List[int]:
+
+    # Block chứa từng block của GDT (theo descriptor_loc() của kernel)
+    block_size = sb.get_block_size()
+    descs_per_block = block_size // descriptor_size(sb)
+    gdt_blocks = (group_count(sb) + descs_per_block - 1) // descs_per_block
+    first_data_block = sb.s_first_data_block
+
+    meta_bg = sb.s_feature_incompat & EXT4_FEATURE_INCOMPAT_META_BG
+    locations = []
+    for nr in range(gdt_blocks):
+        if not meta_bg or nr < sb.s_first_meta_bg:
+            locations.append(first_data_block + 1 + nr)
+            continue
+
+        # meta_bg: block GDT thứ nr nằm ở đầu group đầu tiên của meta group nr
+        group = descs_per_block * nr
+        has_super = 1 if group_has_super(sb, group) else 0
+        if block_size == 1024 and nr == 0 and first_data_block == 0:
+            has_super += 1
+        locations.append(group * sb.s_blocks_per_group + first_data_block + has_super)
+    return locations
+
+
+class GroupDescriptorTable:
+    """Bảng group descriptor đọc một lần; descriptor được parse khi truy cập lần đầu
+
+    Dùng như list: len(), [i], [a:b], for ... in ...
+    """
+
+    def __init__(self, data: bytes, count: int, desc_size: int, use_64bit: bool):
+
+        self.data = data
+        self.count = count
+        self.desc_size = desc_size
+        self.use_64bit = use_64bit
+        self._unpack = (GROUP_DESC_64_STRUCT if use_64bit else GROUP_DESC_STRUCT).unpack_from
+        self._parsed: List[Optional[GroupDescriptor]] = [None] * count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __bool__(self) -> bool:
+        return self.count > 0
+
+    def __getitem__(self, index: Union[int, slice]):
+
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("group descriptor index out of range")
+
+        gd = self._parsed[index]
+        if gd is None:
+            gd = GroupDescriptor(*self._unpack(self.data, index * self.desc_size))
+            self._parsed[index] = gd
+        return gd
+
+    def __iter__(self) -> Iterator[GroupDescriptor]:
+
+        for i in range(self.count):
+            yield self[i]
+
+    def raw(self, index: int) -> memoryview:
+
+        # Bytes gốc của descriptor (để kiểm tra checksum)
+        start = index * self.desc_size
+        return memoryview(self.data)[start:start + self.desc_size]
+
+
+_gdt_cache: "OrderedDict[tuple, GroupDescriptorTable]" = OrderedDict()
+_gdt_lock = threading.Lock()
+
+
+def load_group_descriptors(device: BlockDevice, sb: Superblock,
+                           use_cache: bool = True) -> Optional[GroupDescriptorTable]:
+
+    count = group_count(sb)
+    desc_size = descriptor_size(sb)
+    use_64bit = bool(sb.s_feature_incompat & EXT4_FEATURE_INCOMPAT_64BIT)
+    block_size = sb.get_block_size()
+
+    # Cache theo image (device key + mtime/size lúc mở) và các tham số định vị GDT
+    key = (device.key, device.stamp, device.writes, block_size, count, desc_size,
+           sb.s_first_data_block, sb.s_feature_incompat & EXT4_FEATURE_INCOMPAT_META_BG,
+           sb.s_first_meta_bg)
+    if use_cache:
+        with _gdt_lock:
+            table = _gdt_cache.get(key)
+            if table is not None:
+                _gdt_cache.move_to_end(key)
+                return table
+
+    locations = gdt_block_locations(sb)
+    if not locations:
+        return None
+
+    if locations == list(range(locations[0], locations[0] + len(locations))):
+        # Layout thường: cả GDT liền nhau, đọc một lần
+        data = device.pread(len(locations) * block_size, locations[0] * block_size)
+    else:
+        # meta_bg: các block GDT rải rác, đọc gộp qua read_blocks
+        blocks = device.read_blocks(locations, block_size, use_cache=False)
+        data = b''.join(blocks[block] for block in locations)
+
+    data = data[:count * desc_size]
+    table = GroupDescriptorTable(data, len(data) // desc_size, desc_size, use_64bit)
+
+    if use_cache:
+        with _gdt_lock:
+            _gdt_cache[key] = table
+            while len(_gdt_cache) > GDT_CACHE_SIZE:
+                _gdt_cache.popitem(last=False)
+    return table
+
+
+def clear_gdt_cache() -> None:
+
+    with _gdt_lock:
+        _gdt_cache.clear()
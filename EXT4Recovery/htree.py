@@ -0,0 +1,334 @@
+import struct
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from ext4_structures import Superblock, DirectoryEntry
+from block_device import BlockDevice
+
+
+# Thuật toán hash của dx_root_info.hash_version / s_def_hash_version
+DX_HASH_LEGACY = 0
+DX_HASH_HALF_MD4 = 1
+DX_HASH_TEA = 2
+DX_HASH_LEGACY_UNSIGNED = 3
+DX_HASH_HALF_MD4_UNSIGNED = 4
+DX_HASH_TEA_UNSIGNED = 5
+DX_HASH_SIPHASH = 6
+
+# s_flags: char là signed / unsigned trên máy đã tạo filesystem
+EXT2_FLAGS_SIGNED_HASH = 0x0001
+EXT2_FLAGS_UNSIGNED_HASH = 0x0002
+
+EXT4_HTREE_EOF_32BIT = 0x7FFFFFFF
+
+# dx_root: dirent "." (12 bytes) + header ".." (12 bytes) + dx_root_info (8 bytes)
+DX_ROOT_INFO_STRUCT = struct.Struct('<IBBBB')
+DX_ROOT_INFO_OFFSET = 24
+# dx_node: dirent giả (inode 0, rec_len = block size) rồi tới count/limit
+DX_NODE_OFFSET = 8
+DX_COUNTLIMIT_STRUCT = struct.Struct('<HHI')
+DX_ENTRY_STRUCT = struct.Struct('<II')
+# indirect_levels tối đa (3 khi có largedir)
+DX_MAX_LEVELS = 3
+
+DIRENT_HEADER_STRUCT = struct.Struct('<IHBB')
+
+_MASK = 0xFFFFFFFF
+
+# (hash, logical block); entry đầu tiên không có hash (luôn là 0)
+DxEntries = List[Tuple[int, int]]
+
+
+def _rol32(x: int, s: int) -> int:
+
+    return ((x << s) | (x >> (32 - s))) & _MASK
+
+
+def _str2hashbuf(msg: bytes, num: int, signed: bool) -> List[int]:
+
+    # Đóng gói tên thành num word, phần thiếu đệm bằng độ dài (giống str2hashbuf_* của kernel)
+    pad = len(msg) | (len(msg) << 8)
+    pad = (pad | (pad << 16)) & _MASK
+    val = pad
+    buf: List[int] = []
+    for i in range(min(len(msg), num * 4)):
+        c = msg[i]
+        if signed and c >= 0x80:
+            c -= 0x100
+        val = (c + (val << 8)) & _MASK
+        if i % 4 == 3:
+            buf.append(val)
+            val = pad
+    if len(buf) < num:
+        buf.append(val)
+    while len(buf) < num:
+        buf.append(pad)
+    return buf
+
+
+def _dx_hack_hash(name: bytes, signed: bool) -> int:
+
+    hash0, hash1 = 0x12A3FE2D, 0x37ABE8F9
+    for c in name:
+        if signed and c >= 0x80:
+            c -= 0x100
+        value = (hash1 + (hash0 ^ ((c * 7152373) & _MASK))) & _MASK
+        if value & 0x80000000:
+            value = (value - 0x7FFFFFFF) & _MASK
+        hash1, hash0 = hash0, value
+    return (hash0 << 1) & _MASK
+
+
+def _half_md4_transform(buf: List[int], data: Sequence[int]) -> None:
+
+    a, b, c, d = buf
+    k2, k3 = 0o13240474631, 0o15666365641
+
+    def f(x, y, z):
+        return z ^ (x & (y ^ z))
+
+    def g(x, y, z):
+        return ((x & y) + ((x ^ y) & z)) & _MASK
+
+    def h(x, y, z):
+        return x ^ y ^ z
+
+    # Mỗi round: (hàm, [(chỉ số word, số bit xoay)...], hằng số); thứ tự a, d, c, b lặp lại
+    for fn, steps, k in ((f, ((0, 3), (1, 7), (2, 11), (3, 19), (4, 3), (5, 7), (6, 11), (7, 19)), 0),
+                         (g, ((1, 3), (3, 5), (5, 9), (7, 13), (0, 3), (2, 5), (4, 9), (6, 13)), k2),
+                         (h, ((3, 3), (7, 9), (2, 11), (6, 15), (1, 3), (5, 9), (0, 11), (4, 15)), k3)):
+        for n, (i, s) in enumerate(steps):
+            x = data[i] + k
+            if n % 4 == 0:
+                a = _rol32((a + fn(b, c, d) + x) & _MASK, s)
+            elif n % 4 == 1:
+                d = _rol32((d + fn(a, b, c) + x) & _MASK, s)
+            elif n % 4 == 2:
+                c = _rol32((c + fn(d, a, b) + x) & _MASK, s)
+            else:
+                b = _rol32((b + fn(c, d, a) + x) & _MASK, s)
+
+    buf[0] = (buf[0] + a) & _MASK
+    buf[1] = (buf[1] + b) & _MASK
+    buf[2] = (buf[2] + c) & _MASK
+    buf[3] = (buf[3] + d) & _MASK
+
+
+def _tea_transform(buf: List[int], data: Sequence[int]) -> None:
+
+    total = 0
+    b0, b1 = buf[0], buf[1]
+    a, b, c, d = data[:4]
+    for _ in range(16):
+        total = (total + 0x9E3779B9) & _MASK
+        b0 = (b0 + ((((b1 << 4) + a) & _MASK) ^ ((b1 + total) & _MASK) ^ (((b1 >> 5) + b) & _MASK))) & _MASK
+        b1 = (b1 + ((((b0 << 4) + c) & _MASK) ^ ((b0 + total) & _MASK) ^ (((b0 >> 5) + d) & _MASK))) & _MASK
+    buf[0] = (buf[0] + b0) & _MASK
+    buf[1] = (buf[1] + b1) & _MASK
+
+
+def dx_hash(name: bytes, hash_version: int, seed: Optional[Sequence[int]] = None) -> Tuple[int, int]:
+
+    # (hash, minor_hash) của tên theo ext4fs_dirhash; bit thấp của hash luôn bằng 0
+    buf = [0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476]
+    if seed and any(seed):
+        buf = [s & _MASK for s in seed]
+
+    signed = hash_version in (DX_HASH_LEGACY, DX_HASH_HALF_MD4, DX_HASH_TEA)
+    minor_hash = 0
+    if hash_version in (DX_HASH_LEGACY, DX_HASH_LEGACY_UNSIGNED):
+        value = _dx_hack_hash(name, signed)
+    elif hash_version in (DX_HASH_HALF_MD4, DX_HASH_HALF_MD4_UNSIGNED):
+        for start in range(0, len(name), 32):
+            _half_md4_transform(buf, _str2hashbuf(name[start:], 8, signed))
+        value, minor_hash = buf[1], buf[2]
+    elif hash_version in (DX_HASH_TEA, DX_HASH_TEA_UNSIGNED):
+        for start in range(0, len(name), 16):
+            _tea_transform(buf, _str2hashbuf(name[start:], 4, signed))
+        value, minor_hash = buf[0], buf[1]
+    else:
+        raise ValueError(f"Unsupported dx hash version {hash_version}")
+
+    value &= ~1 & _MASK
+    if value == EXT4_HTREE_EOF_32BIT << 1:
+        value = (EXT4_HTREE_EOF_32BIT - 1) << 1
+    return value, minor_hash
+
+
+def _parse_dx_entries(data, offset: int) -> Optional[DxEntries]:
+
+    if offset + DX_COUNTLIMIT_STRUCT.size > len(data):
+        return None
+    limit, count, first_block = DX_COUNTLIMIT_STRUCT.unpack_from(data, offset)
+    if count == 0 or count > limit or offset + limit * DX_ENTRY_STRUCT.size > len(data):
+        return None
+    entries: DxEntries = [(0, first_block)]
+    start = offset + DX_ENTRY_STRUCT.size
+    body = memoryview(data)[start:start + (count - 1) * DX_ENTRY_STRUCT.size]
+    entries.extend(DX_ENTRY_STRUCT.iter_unpack(body))
+    return entries
+
+
+def parse_dx_root(data) -> Optional[Tuple[int, int, DxEntries]]:
+
+    # (hash_version, indirect_levels, entries); None nếu block không phải dx_root hợp lệ
+    if len(data) < DX_ROOT_INFO_OFFSET + DX_ROOT_INFO_STRUCT.size:
+        return None
+    reserved, hash_version, info_length, levels, _ = DX_ROOT_INFO_STRUCT.unpack_from(data, DX_ROOT_INFO_OFFSET)
+    if reserved != 0 or info_length != 8 or levels >= DX_MAX_LEVELS:
+        return None
+    entries = _parse_dx_entries(data, DX_ROOT_INFO_OFFSET + info_length)
+    if entries is None:
+        return None
+    return hash_version, levels, entries
+
+
+def parse_dx_node(data, block_size: int) -> Optional[DxEntries]:
+
+    if not is_dx_node(data, block_size):
+        return None
+    return _parse_dx_entries(data, DX_NODE_OFFSET)
+
+
+def is_dx_node(data, block_size: int) -> bool:
+
+    # Block index bên trong: một dirent rỗng phủ cả block, phần sau là dx_entry (không phải tên file)
+    if len(data) < DX_NODE_OFFSET:
+        return False
+    inode, rec_len, name_len, _ = DIRENT_HEADER_STRUCT.unpack_from(data, 0)
+    if block_size == 65536 and rec_len in (0, 65535):
+        rec_len = 65536
+    return inode == 0 and name_len == 0 and rec_len == block_size
+
+
+def search_leaf(data, name: bytes) -> Optional[DirectoryEntry]:
+
+    # Tìm tên (so sánh bytes) trong một block dirent tuyến tính
+    offset = 0
+    size = len(data)
+    while offset + DIRENT_HEADER_STRUCT.size <= size:
+        inode, rec_len, name_len, file_type = DIRENT_HEADER_STRUCT.unpack_from(data, offset)
+        if rec_len < DIRENT_HEADER_STRUCT.size or offset + rec_len > size:
+            break
+        if inode and name_len == len(name) and \
+                bytes(data[offset + 8:offset + 8 + name_len]) == name:
+            return DirectoryEntry(inode=inode, rec_len=rec_len, name_len=name_len, file_type=file_type,
+                                  name=name.decode('utf-8', errors='ignore'))
+        offset += rec_len
+    return None
+
+
+class HTreeIndex:
+    """Tra cứu tên trong thư mục có index (EXT4_INDEX_FL) theo HTree
+
+    Hash tên theo dx_root_info.hash_version (seed s_hash_seed), tìm nhị phân qua dx_root và các
+    dx_node rồi chỉ đọc một leaf block: O(log n) thay vì đọc cả thư mục. Khi hash trùng lan sang
+    leaf kế tiếp (bit thấp của hash trong dx_entry = 1) thì đọc tiếp leaf đó.
+    """
+
+    def __init__(self, device: BlockDevice, sb: Superblock, block_size: int):
+
+        self.device = device
+        self.block_size = block_size
+        self.seed = tuple(sb.s_hash_seed)
+        self.default_version = sb.s_def_hash_version
+        self.unsigned = bool(sb.s_flags & EXT2_FLAGS_UNSIGNED_HASH)
+        self.stats = {'lookups': 0, 'index_blocks': 0, 'leaf_blocks': 0, 'fallbacks': 0}
+
+    def hash_version(self, root_version: int) -> int:
+
+        # Bản signed / unsigned tuỳ cờ trong superblock (như kernel: +3 khi UNSIGNED_HASH)
+        version = root_version
+        if version > DX_HASH_SIPHASH:
+            version = self.default_version
+        if version <= DX_HASH_TEA and self.unsigned:
+            version += 3
+        return version
+
+    def _read(self, block_map, logical: int):
+
+        physical = block_map.lookup(logical)
+        if physical is None:
+            return None
+        data = self.device.read_block(physical, self.block_size)
+        return data if data and len(data) == self.block_size else None
+
+    def leaf_blocks(self, block_map, name: bytes) -> Optional[Iterator[int]]:
+
+        # Các logical leaf block có thể chứa tên (thường chỉ một); None nếu index hỏng / không hỗ trợ
+        root = self._read(block_map, 0)
+        parsed = parse_dx_root(root) if root is not None else None
+        if parsed is None:
+            return None
+        root_version, levels, entries = parsed
+        version = self.hash_version(root_version)
+        if version == DX_HASH_SIPHASH:
+            # SipHash chỉ dùng cho thư mục casefold (khoá nằm trong xattr): đọc tuần tự
+            return None
+        target, _ = dx_hash(name, version, self.seed)
+
+        # Đường đi từ root xuống: mỗi tầng (entries, vị trí đã chọn)
+        path: List[List] = []
+        for depth in range(levels + 1):
+            if depth:
+                node = self._read(block_map, entries[path[-1][1]][1])
+                entries = parse_dx_node(node, self.block_size) if node is not None else None
+                if entries is None:
+                    return None
+                self.stats['index_blocks'] += 1
+            path.append([entries, self._probe(entries, target)])
+
+        return self._iter_leaves(block_map, path, target)
+
+    @staticmethod
+    def _probe(entries: DxEntries, target: int) -> int:
+
+        # Entry cuối cùng có hash <= target (entry 0 luôn thoả)
+        lo, hi = 1, len(entries) - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            if entries[mid][0] > target:
+                hi = mid - 1
+            else:
+                lo = mid + 1
+        return lo - 1
+
+    def _iter_leaves(self, block_map, path: List[List], target: int) -> Iterator[int]:
+
+        while True:
+            yield path[-1][0][path[-1][1]][1]
+
+            # Sang entry kế tiếp (lùi lên tầng trên nếu hết node), chỉ khi hash của nó nối tiếp target
+            depth = len(path) - 1
+            while depth >= 0 and path[depth][1] + 1 >= len(path[depth][0]):
+                depth -= 1
+            if depth < 0:
+                return
+            path[depth][1] += 1
+            next_hash = path[depth][0][path[depth][1]][0]
+            if next_hash & ~1 != target:
+                return
+            for lower in range(depth + 1, len(path)):
+                node = self._read(block_map, path[lower - 1][0][path[lower - 1][1]][1])
+                entries = parse_dx_node(node, self.block_size) if node is not None else None
+                if entries is None:
+                    return
+                self.stats['index_blocks'] += 1
+                path[lower] = [entries, 0]
+
+    def find(self, block_map, name: bytes) -> Tuple[bool, Optional[DirectoryEntry]]:
+
+        # (đã dùng được index, entry tìm thấy). False -> người gọi tự quét tuyến tính
+        self.stats['lookups'] += 1
+        leaves = self.leaf_blocks(block_map, name)
+        if leaves is None:
+            self.stats['fallbacks'] += 1
+            return False, None
+        for logical in leaves:
+            data = self._read(block_map, logical)
+            if data is None:
+                continue
+            self.stats['leaf_blocks'] += 1
+            entry = search_leaf(data, name)
+            if entry is not None:
+                return True, entry
+        return True, None
@@ -0,0 +1,203 @@
+from typing import Dict, Iterable, List, Optional
+
+from ext4_structures import (
+    Superblock, EXT4_BG_INODE_UNINIT
+)
+from block_device import BlockDevice
+from inode_table import InodeTable
+from flex_groups import FlexGroupReader
+from ext4_checksum import (
+    MetadataChecksum, EXT4_FEATURE_RO_COMPAT_GDT_CSUM, EXT4_FEATURE_RO_COMPAT_METADATA_CSUM
+)
+
+
+INODE_LIVE = 'live'
+INODE_DELETED = 'deleted'
+INODE_ORPHAN = 'orphan'
+# Không đọc được inode bitmap của group: inode đã cấp phát nhưng không biết live hay đã xoá
+INODE_UNKNOWN = 'unknown'
+INODE_STATES = (INODE_LIVE, INODE_DELETED, INODE_ORPHAN, INODE_UNKNOWN)
+
+# Inode dành riêng (1..10) trừ root và journal
+EXT4_ROOT_INO = 2
+EXT4_JOURNAL_INO = 8
+
+
+class InodeScanner:
+    """Quét inode theo group descriptor: chỉ đọc inode table thật, mỗi flex group một lần đọc
+
+    Với GDT_CSUM / METADATA_CSUM: group INODE_UNINIT bị bỏ qua, phần đuôi bg_itable_unused
+    (chưa từng được dùng) không đọc; descriptor sai checksum thì không tin các trường này
+    và đọc cả inode table của group. Mỗi inode được đối chiếu với inode bitmap để phân loại
+    live / deleted / orphan.
+
+    Inode sai checksum mặc định bị loại; reject_bad_checksum=False giữ lại với 'checksum_ok': False
+    (kết quả dùng để dựng lại bitmap không được bỏ sót inode thật chỉ vì lệch một bit).
+    """
+
+    def __init__(self, device: BlockDevice, sb: Superblock, group_descriptors,
+                 checksum: Optional[MetadataChecksum] = None, use_numpy: bool = True,
+                 reject_bad_checksum: bool = True):
+
+        self.device = device
+        self.superblock = sb
+        self.group_descriptors = group_descriptors
+        self.checksum = checksum if checksum is not None and checksum.enabled else None
+        self.use_numpy = use_numpy
+        self.reject_bad_checksum = reject_bad_checksum
+        self.block_size = sb.get_block_size()
+        self.inode_size = sb.s_inode_size
+        self.inodes_per_group = sb.s_inodes_per_group
+        # Flag / itable_unused chỉ được kernel duy trì khi descriptor có checksum
+        self.has_group_csum = bool(sb.s_feature_ro_compat & (EXT4_FEATURE_RO_COMPAT_GDT_CSUM |
+                                                             EXT4_FEATURE_RO_COMPAT_METADATA_CSUM))
+        self.respect_unused = True
+        # Group có descriptor hỏng: flag UNINIT / itable_unused có thể là rác, che mất inode thật.
+        # Vẫn kiểm tra khi caller không muốn verify inode (checksum=None)
+        self.bad_descriptors = set()
+        if self.has_group_csum and hasattr(group_descriptors, 'data'):
+            verifier = checksum if checksum is not None else MetadataChecksum(sb)
+            self.bad_descriptors = set(verifier.verify_group_descriptors(group_descriptors))
+        self.flex_reader = FlexGroupReader(device, sb, group_descriptors)
+        self.stats = {'groups_scanned': 0, 'groups_skipped': 0, 'inodes_read': 0,
+                      'inodes_skipped': 0, 'bytes_read': 0, 'checksum_rejected': 0,
+                      'checksum_flagged': 0, 'bad_descriptors': len(self.bad_descriptors),
+                      'bitmap_missing': 0,
+                      INODE_LIVE: 0, INODE_DELETED: 0, INODE_ORPHAN: 0, INODE_UNKNOWN: 0}
+
+    def group_inode_count(self, group: int) -> int:
+
+        # Số inode cần đọc ở đầu inode table của group (0 = bỏ qua cả group)
+        first_inode = group * self.inodes_per_group + 1
+        count = min(self.inodes_per_group, self.superblock.s_inodes_count - first_inode + 1)
+        if count <= 0:
+            return 0
+        if self.has_group_csum and self.respect_unused and group not in self.bad_descriptors:
+            gd = self.group_descriptors[group]
+            if gd.bg_flags & EXT4_BG_INODE_UNINIT:
+                return 0
+            unused = gd.get_itable_unused()
+            if unused <= count:
+                count -= unused
+        return count
+
+    def _read_inode_bitmap(self, group: int):
+
+        # None nếu con trỏ bitmap nằm ngoài filesystem / image (descriptor hỏng) hoặc đọc lỗi
+        block = self.group_descriptors[group].get_inode_bitmap()
+        if not self.flex_reader.valid_block(block):
+            return None
+        try:
+            return self.device.read_block(block, self.block_size)
+        except OSError:
+            return None
+
+    def scan_group(self, group: int, states: Iterable[str] = INODE_STATES,
+                   include_reserved: bool = False, data=None, bitmap=None) -> List[Dict]:
+
+        # data / bitmap: inode table và inode bitmap đã nạp sẵn (từ scan theo flex group)
+        states = set(states)
+        first_inode = group * self.inodes_per_group + 1
+        if data is None:
+            full = min(self.inodes_per_group, self.superblock.s_inodes_count - first_inode + 1)
+            count = self.group_inode_count(group)
+            self.stats['inodes_skipped'] += max(0, full - count)
+            if count <= 0:
+                self.stats['groups_skipped'] += 1
+                return []
+            gd = self.group_descriptors[group]
+            data = self.device.pread(count * self.inode_size, gd.get_inode_table() * self.block_size)
+        if not data:
+            return []
+        count = len(data) // self.inode_size
+        if bitmap is None:
+            bitmap = self._read_inode_bitmap(group)
+        self.stats['groups_scanned'] += 1
+        self.stats['inodes_read'] += count
+        self.stats['bytes_read'] += len(data) + len(bitmap or b'')
+
+        table = InodeTable(data, self.inode_size, first_inode, use_numpy=self.use_numpy)
+        if bitmap is None:
+            # Không có bitmap thì không đoán: bitmap rỗng sẽ biến mọi inode thành "deleted"
+            self.stats['bitmap_missing'] += 1
+            live, deleted, orphan = [], [], []
+            unknown = table.select(allocated=True)
+        else:
+            live, deleted, orphan = table.classify(bitmap)
+            unknown = []
+
+        classified = []
+        for state, indexes in ((INODE_LIVE, live), (INODE_DELETED, deleted), (INODE_ORPHAN, orphan),
+                               (INODE_UNKNOWN, unknown)):
+            if state in states:
+                classified.extend((index, state) for index in indexes)
+        if not include_reserved:
+            first_ino = self.superblock.s_first_ino or 11
+            classified = [(index, state) for index, state in classified
+                          if table.inode_number(index) >= first_ino
+                          or table.inode_number(index) in (EXT4_ROOT_INO, EXT4_JOURNAL_INO)]
+        classified.sort()
+
+        bad = set()
+        if self.checksum and classified:
+            # Inode sai checksum: thường là rác trong inode table, không phải inode thật
+            bad = set(self.checksum.verify_inode_table(data, first_inode,
+                                                       [index for index, _ in classified],
+                                                       self.inode_size))
+            if bad and self.reject_bad_checksum:
+                self.stats['checksum_rejected'] += len(bad)
+                classified = [(index, state) for index, state in classified if index not in bad]
+                bad = set()
+            else:
+                self.stats['checksum_flagged'] += len(bad)
+
+        indexes = [index for index, _ in classified]
+        results = []
+        for (index, state), inode in zip(classified, table.compact(indexes)):
+            self.stats[state] += 1
+            results.append({
+                'inode_num': table.inode_number(index),
+                'inode': inode,
+                'state': state,
+                'is_dir': inode.is_directory(),
+                'is_file': inode.is_regular_file(),
+                'size': inode.get_size(),
+                'checksum_ok': index not in bad
+            })
+        return results
+
+    def scan(self, groups: Optional[Iterable[int]] = None, states: Iterable[str] = INODE_STATES,
+             include_reserved: bool = False, progress: bool = False) -> List[Dict]:
+
+        if groups is None:
+            groups = range(len(self.group_descriptors))
+        groups = list(groups)
+
+        # Số inode cần đọc của từng group; group bỏ qua (INODE_UNINIT...) không nạp gì
+        counts = {}
+        for group in groups:
+            first_inode = group * self.inodes_per_group + 1
+            full = min(self.inodes_per_group, self.superblock.s_inodes_count - first_inode + 1)
+            counts[group] = self.group_inode_count(group)
+            self.stats['inodes_skipped'] += max(0, full - counts[group])
+            if counts[group] <= 0:
+                self.stats['groups_skipped'] += 1
+
+        # Inode bitmap và inode table của cả flex group được đọc gộp, rồi cắt view cho từng group
+        results = []
+        n = 0
+        for flex in self.flex_reader.flex_groups(groups):
+            wanted = [group for group in flex if counts[group] > 0]
+            n += len(flex) - len(wanted)
+            if not wanted:
+                continue
+            bitmaps = self.flex_reader.bitmaps('inode', wanted)
+            for group, data in self.flex_reader.inode_tables(wanted, counts):
+                n += 1
+                results.extend(self.scan_group(group, states, include_reserved,
+                                               data=data, bitmap=bitmaps.get(group)))
+                if progress:
+                    print(f"   Scanned group {n}/{len(groups)} ({len(results)} inodes)", end='\r')
+        if progress:
+            print()
+        return results
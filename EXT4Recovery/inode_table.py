@@ -0,0 +1,163 @@
+import struct
+from typing import List, Optional, Tuple
+
+from ext4_structures import INODE_LAYOUT, InodeView
+
+try:
+    import numpy as np
+except ImportError:
+    # Không có NumPy: dùng bộ decode thuần Python (struct.iter_unpack)
+    np = None
+
+
+HAS_NUMPY = np is not None
+
+_NUMPY_FORMATS = {'H': '<u2', 'I': '<u4', 'Q': '<u8', 'B': 'u1'}
+
+
+def inode_dtype(inode_size: int):
+
+    # Structured dtype đúng layout inode on-disk; field nào vượt inode_size thì bỏ
+    if np is None:
+        return None
+
+    names, formats, offsets = [], [], []
+    offset = 0
+    for name, fmt in INODE_LAYOUT:
+        size = struct.calcsize('<' + fmt)
+        if offset + size > inode_size:
+            break
+        if fmt[-1] == 's':
+            np_format = f'V{fmt[:-1]}'
+        elif len(fmt) > 1:
+            np_format = (_NUMPY_FORMATS[fmt[-1]], (int(fmt[:-1]),))
+        else:
+            np_format = _NUMPY_FORMATS[fmt]
+        names.append(name)
+        formats.append(np_format)
+        offsets.append(offset)
+        offset += size
+    return np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': inode_size})
+
+
+class InodeTable:
+    """Toàn bộ inode table (của một group, hoặc một vùng bất kỳ) đọc bằng một lần đọc
+
+    Có NumPy: view buffer thành structured array và lọc vector hoá trên mọi inode.
+    Không có: decode các field cần lọc bằng struct.iter_unpack.
+    """
+
+    def __init__(self, data: bytes, inode_size: int, first_inode: int = 1, use_numpy: bool = True):
+
+        self.inode_size = inode_size
+        self.first_inode = first_inode
+        self.count = len(data) // inode_size
+        self.data = data
+        self.use_numpy = use_numpy and np is not None
+
+        if self.use_numpy:
+            self.inodes = np.frombuffer(data, dtype=inode_dtype(inode_size), count=self.count)
+            mode = self.inodes['i_mode']
+            self._mode = mode
+            self._links = self.inodes['i_links_count']
+            self._dtime = self.inodes['i_dtime']
+            self._size = self.inodes['i_size_lo'].astype(np.uint64)
+            self._size |= self.inodes['i_size_high'].astype(np.uint64) << np.uint64(32)
+        else:
+            # i_mode, i_size_lo, i_dtime, i_links_count, i_size_high
+            scan = struct.Struct(f'<H2xI12xI2xH80xI{inode_size - 112}x')
+            fields = list(zip(*scan.iter_unpack(memoryview(data)[:self.count * inode_size])))
+            if not fields:
+                fields = [(), (), (), (), ()]
+            self._mode, size_lo, self._dtime, self._links, size_high = fields
+            self._size = [(hi << 32) | lo for lo, hi in zip(size_lo, size_high)]
+
+    def select(self, allocated: Optional[bool] = None, in_use: Optional[bool] = None,
+               deleted: Optional[bool] = None, directory: Optional[bool] = None,
+               regular: Optional[bool] = None, min_size: Optional[int] = None) -> List[int]:
+
+        # Trả về index (0-based trong bảng) của các inode thoả mọi điều kiện được đặt
+        #   allocated: i_mode != 0      in_use: i_links_count > 0
+        #   deleted:   i_dtime != 0     directory / regular: theo i_mode
+        #   min_size:  kích thước > min_size
+        if self.use_numpy:
+            mask = np.ones(self.count, dtype=bool)
+            file_type = self._mode & 0xF000
+            if allocated is not None:
+                mask &= (self._mode != 0) == allocated
+            if in_use is not None:
+                mask &= (self._links > 0) == in_use
+            if deleted is not None:
+                mask &= (self._dtime != 0) == deleted
+            if directory is not None:
+                mask &= (file_type == 0x4000) == directory
+            if regular is not None:
+                mask &= (file_type == 0x8000) == regular
+            if min_size is not None:
+                mask &= self._size > min_size
+            return np.flatnonzero(mask).tolist()
+
+        result = []
+        modes, links, dtimes, sizes = self._mode, self._links, self._dtime, self._size
+        for i in range(self.count):
+            mode = modes[i]
+            if allocated is not None and (mode != 0) != allocated:
+                continue
+            if in_use is not None and (links[i] > 0) != in_use:
+                continue
+            if deleted is not None and (dtimes[i] != 0) != deleted:
+                continue
+            if directory is not None and ((mode & 0xF000) == 0x4000) != directory:
+                continue
+            if regular is not None and ((mode & 0xF000) == 0x8000) != regular:
+                continue
+            if min_size is not None and sizes[i] <= min_size:
+                continue
+            result.append(i)
+        return result
+
+    def classify(self, bitmap) -> Tuple[List[int], List[int], List[int]]:
+
+        # Phân loại các inode đã cấp phát (i_mode != 0) theo inode bitmap:
+        #   live:    bit bật, i_links_count > 0
+        #   orphan:  bit bật, i_links_count == 0 (đã unlink nhưng còn mở / trong orphan list)
+        #   deleted: bit tắt (đã xoá, thường có i_dtime)
+        # Trả về (live, deleted, orphan) là các index trong bảng
+        bitmap = bytes(bitmap[:(self.count + 7) // 8]).ljust((self.count + 7) // 8, b'\0')
+        if self.use_numpy:
+            in_use = np.unpackbits(np.frombuffer(bitmap, dtype=np.uint8),
+                                   bitorder='little')[:self.count].astype(bool)
+            allocated = self._mode != 0
+            linked = self._links > 0
+            return (np.flatnonzero(allocated & in_use & linked).tolist(),
+                    np.flatnonzero(allocated & ~in_use).tolist(),
+                    np.flatnonzero(allocated & in_use & ~linked).tolist())
+
+        live, deleted, orphan = [], [], []
+        for i in self.select(allocated=True):
+            if not bitmap[i >> 3] & (1 << (i & 7)):
+                deleted.append(i)
+            elif self._links[i] > 0:
+                live.append(i)
+            else:
+                orphan.append(i)
+        return live, deleted, orphan
+
+    def inode_number(self, index: int) -> int:
+
+        return self.first_inode + index
+
+    def view(self, index: int) -> InodeView:
+
+        return InodeView(self.data, index * self.inode_size, self.inode_size)
+
+    def compact(self, indexes: List[int]) -> List[InodeView]:
+
+        # Copy riêng các inode được chọn ra buffer nhỏ: không giữ cả bảng trong bộ nhớ
+        size = self.inode_size
+        if self.use_numpy:
+            data = self.inodes[indexes].tobytes()
+        else:
+            view = memoryview(self.data)
+            data = b''.join(view[i * size:(i + 1) * size] for i in indexes)
+        return [InodeView(data, n * size, size) for n in range(len(indexes))]
@@ -0,0 +1,275 @@
+import struct
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from block_device import BlockDevice
+from block_map import InodeBlockMap
+
+
+# jbd2 ghi mọi cấu trúc theo big-endian
+JBD2_MAGIC = 0xC03B3998
+JBD2_MAGIC_BYTES = struct.pack('>I', JBD2_MAGIC)
+
+JBD2_DESCRIPTOR_BLOCK = 1
+JBD2_COMMIT_BLOCK = 2
+JBD2_SUPERBLOCK_V1 = 3
+JBD2_SUPERBLOCK_V2 = 4
+JBD2_REVOKE_BLOCK = 5
+JBD2_FC_BLOCK = 6
+
+JBD2_FEATURE_INCOMPAT_REVOKE = 0x01
+JBD2_FEATURE_INCOMPAT_64BIT = 0x02
+JBD2_FEATURE_INCOMPAT_ASYNC_COMMIT = 0x04
+JBD2_FEATURE_INCOMPAT_CSUM_V2 = 0x08
+JBD2_FEATURE_INCOMPAT_CSUM_V3 = 0x10
+
+# Cờ của tag trong descriptor block
+JBD2_FLAG_ESCAPE = 0x1       # 4 bytes đầu của block gốc là magic, đã bị thay bằng 0
+JBD2_FLAG_SAME_UUID = 0x2    # Không có 16 bytes UUID theo sau tag
+JBD2_FLAG_DELETED = 0x4
+JBD2_FLAG_LAST_TAG = 0x8
+
+# h_magic, h_blocktype, h_sequence
+JOURNAL_HEADER_STRUCT = struct.Struct('>III')
+# s_blocksize, s_maxlen, s_first, s_sequence, s_start, s_errno,
+# s_feature_compat, s_feature_incompat, s_feature_ro_compat
+JOURNAL_SUPERBLOCK_STRUCT = struct.Struct('>9I')
+# commit block: h_commit_sec (be64), h_commit_nsec (be32) ở offset 0x30
+COMMIT_TIME_STRUCT = struct.Struct('>QI')
+COMMIT_TIME_OFFSET = 0x30
+
+# Số block journal đọc trong một lần khi quét
+JOURNAL_READ_BLOCKS = 2048
+
+# (transaction id, block trong journal)
+BlockVersion = Tuple[int, int]
+
+
+class JournalSuperblock:
+
+    def __init__(self, data):
+
+        _, self.blocktype, _ = JOURNAL_HEADER_STRUCT.unpack_from(data, 0)
+        (self.blocksize, self.maxlen, self.first, self.sequence, self.start, self.errno,
+         self.feature_compat, self.feature_incompat, self.feature_ro_compat) = \
+            JOURNAL_SUPERBLOCK_STRUCT.unpack_from(data, JOURNAL_HEADER_STRUCT.size)
+        if self.blocktype == JBD2_SUPERBLOCK_V1:
+            # v1 không có feature
+            self.feature_compat = self.feature_incompat = self.feature_ro_compat = 0
+
+    def has_incompat(self, feature: int) -> bool:
+
+        return bool(self.feature_incompat & feature)
+
+    def tag_size(self) -> int:
+
+        # journal_tag_bytes() của kernel
+        if self.has_incompat(JBD2_FEATURE_INCOMPAT_CSUM_V3):
+            return 16
+        size = 12
+        if self.has_incompat(JBD2_FEATURE_INCOMPAT_CSUM_V2):
+            size += 2
+        if not self.has_incompat(JBD2_FEATURE_INCOMPAT_64BIT):
+            size -= 4
+        return size
+
+    def has_block_tail(self) -> bool:
+
+        # csum v2/v3: 4 bytes cuối của descriptor / revoke block là checksum
+        return self.has_incompat(JBD2_FEATURE_INCOMPAT_CSUM_V2 | JBD2_FEATURE_INCOMPAT_CSUM_V3)
+
+
+class JournalIndex:
+    """Đọc journal jbd2 một lần và lập chỉ mục block filesystem -> các bản trong journal
+
+    Quét tuần tự cả vùng log (không chỉ từ s_start) nên lấy được cả transaction cũ đã checkpoint:
+    block dữ liệu trong journal luôn được escape, nên block nào mở đầu bằng magic đều là
+    descriptor / commit / revoke. versions(block) trả về [(tid, journal block)] tăng dần theo tid
+    bằng một lần tra dict.
+    """
+
+    def __init__(self, device: BlockDevice, journal_map: InodeBlockMap, block_size: int):
+
+        self.device = device
+        self.journal_map = journal_map
+        self.block_size = block_size
+        self.superblock: Optional[JournalSuperblock] = None
+        self.index: Dict[int, List[BlockVersion]] = {}
+        self.revoked: Dict[int, List[int]] = {}
+        self.escaped = set()
+        self.transactions: Dict[int, Dict] = {}
+        self.stats = {'journal_blocks': 0, 'descriptor_blocks': 0, 'commit_blocks': 0,
+                      'revoke_blocks': 0, 'tags': 0, 'overwritten': 0, 'uncommitted': 0}
+
+    def _read_journal_blocks(self, first: int, count: int) -> Dict[int, memoryview]:
+
+        # Block journal (logical trong inode journal) -> dữ liệu, đọc theo từng run liên tục
+        result: Dict[int, memoryview] = {}
+        for logical, physical, length, uninit in self.journal_map.range(first, count):
+            if uninit:
+                continue
+            data = memoryview(self.device.pread(length * self.block_size, physical * self.block_size))
+            for i in range(len(data) // self.block_size):
+                result[logical + i] = data[i * self.block_size:(i + 1) * self.block_size]
+        return result
+
+    def load(self) -> bool:
+
+        header = self._read_journal_blocks(0, 1).get(0)
+        if header is None:
+            return False
+        magic, blocktype, _ = JOURNAL_HEADER_STRUCT.unpack_from(header, 0)
+        if magic != JBD2_MAGIC or blocktype not in (JBD2_SUPERBLOCK_V1, JBD2_SUPERBLOCK_V2):
+            return False
+        self.superblock = JournalSuperblock(header)
+        if self.superblock.blocksize != self.block_size:
+            return False
+        self._scan()
+        return True
+
+    def _scan(self) -> None:
+
+        jsb = self.superblock
+        first, last = jsb.first, min(jsb.maxlen, self.journal_map.end)
+        tag_size = jsb.tag_size()
+        tail = 4 if jsb.has_block_tail() else 0
+        is_64bit = jsb.has_incompat(JBD2_FEATURE_INCOMPAT_64BIT)
+        # Vị trí đã biết là block dữ liệu của một descriptor: không đọc như header
+        data_positions = set()
+        # (vị trí, tid) của mọi header theo thứ tự vị trí; bản quay vòng về đầu log kiểm tra sau
+        headers: List[Tuple[int, int]] = []
+        wrapped: List[Tuple[int, int, int, int]] = []  # (tid, block filesystem, block journal, flags)
+
+        for window in range(first, last, JOURNAL_READ_BLOCKS):
+            blocks = self._read_journal_blocks(window, min(JOURNAL_READ_BLOCKS, last - window))
+            for position in range(window, min(window + JOURNAL_READ_BLOCKS, last)):
+                self.stats['journal_blocks'] += 1
+                data = blocks.get(position)
+                if data is None or position in data_positions or data[:4] != JBD2_MAGIC_BYTES:
+                    continue
+                _, blocktype, sequence = JOURNAL_HEADER_STRUCT.unpack_from(data, 0)
+                headers.append((position, sequence))
+
+                if blocktype == JBD2_DESCRIPTOR_BLOCK:
+                    self.stats['descriptor_blocks'] += 1
+                    self._transaction(sequence)
+                    data_block = position
+                    for fs_block, flags in self._parse_tags(data, tag_size, tail, is_64bit):
+                        data_block = self._next_position(data_block, first, last)
+                        data_positions.add(data_block)
+                        self.stats['tags'] += 1
+                        if data_block < position:
+                            wrapped.append((sequence, fs_block, data_block, flags))
+                            continue
+                        self._add_version(fs_block, sequence, data_block, flags)
+                elif blocktype == JBD2_COMMIT_BLOCK:
+                    self.stats['commit_blocks'] += 1
+                    transaction = self._transaction(sequence)
+                    transaction['committed'] = True
+                    commit_sec, _ = COMMIT_TIME_STRUCT.unpack_from(data, COMMIT_TIME_OFFSET)
+                    transaction['commit_time'] = commit_sec
+                elif blocktype == JBD2_REVOKE_BLOCK:
+                    self.stats['revoke_blocks'] += 1
+                    self._transaction(sequence)
+                    for fs_block in self._parse_revoke(data, is_64bit):
+                        self.revoked.setdefault(fs_block, []).append(sequence)
+
+        # Dữ liệu quay vòng về đầu log chỉ còn nguyên nếu chưa có header mới hơn nào được ghi
+        # từ s_first tới đó (journal được reset về s_first sau khi mount lại)
+        newest_before: List[int] = []
+        for _, sequence in headers:
+            newest_before.append(max(sequence, newest_before[-1]) if newest_before else sequence)
+        positions = [position for position, _ in headers]
+        for sequence, fs_block, data_block, flags in wrapped:
+            n = bisect_right(positions, data_block)
+            if n and newest_before[n - 1] > sequence:
+                self.stats['overwritten'] += 1
+                continue
+            self._add_version(fs_block, sequence, data_block, flags)
+
+        # Sắp xếp theo tid (log quay vòng nên thứ tự quét không phải thứ tự thời gian)
+        for versions in self.index.values():
+            versions.sort()
+        self.stats['uncommitted'] = sum(1 for t in self.transactions.values() if not t['committed'])
+
+    def _add_version(self, fs_block: int, sequence: int, journal_block: int, flags: int) -> None:
+
+        self.index.setdefault(fs_block, []).append((sequence, journal_block))
+        if flags & JBD2_FLAG_ESCAPE:
+            self.escaped.add(journal_block)
+        self.transactions[sequence]['blocks'] += 1
+
+    def _transaction(self, sequence: int) -> Dict:
+
+        transaction = self.transactions.get(sequence)
+        if transaction is None:
+            transaction = {'tid': sequence, 'blocks': 0, 'committed': False, 'commit_time': 0}
+            self.transactions[sequence] = transaction
+        return transaction
+
+    @staticmethod
+    def _next_position(position: int, first: int, last: int) -> int:
+
+        # Block kế tiếp trong log vòng [first, last)
+        position += 1
+        return first if position >= last else position
+
+    def _parse_tags(self, data, tag_size: int, tail: int, is_64bit: bool):
+
+        # (block filesystem, flags) của từng tag trong descriptor block
+        offset = JOURNAL_HEADER_STRUCT.size
+        end = self.block_size - tail
+        csum_v3 = tag_size == 16
+        while offset + tag_size <= end:
+            if csum_v3:
+                blocknr, flags, blocknr_high = struct.unpack_from('>III', data, offset)
+            else:
+                blocknr, _, flags = struct.unpack_from('>IHH', data, offset)
+                blocknr_high = struct.unpack_from('>I', data, offset + 8)[0] if is_64bit else 0
+            if is_64bit:
+                blocknr |= blocknr_high << 32
+            yield blocknr, flags
+
+            offset += tag_size
+            if not flags & JBD2_FLAG_SAME_UUID:
+                offset += 16
+            if flags & JBD2_FLAG_LAST_TAG:
+                break
+
+    def _parse_revoke(self, data, is_64bit: bool) -> List[int]:
+
+        # r_count: số bytes đã dùng (tính cả header 16 bytes)
+        count = struct.unpack_from('>I', data, JOURNAL_HEADER_STRUCT.size)[0]
+        count = min(count, self.block_size)
+        size = 8 if is_64bit else 4
+        fmt = '>Q' if is_64bit else '>I'
+        return [struct.unpack_from(fmt, data, offset)[0] for offset in range(16, count - size + 1, size)]
+
+    def versions(self, fs_block: int, committed_only: bool = True) -> List[BlockVersion]:
+
+        # Các bản của một block filesystem trong journal, cũ -> mới
+        versions = self.index.get(fs_block, [])
+        if committed_only:
+            versions = [v for v in versions if self.transactions[v[0]]['committed']]
+        return versions
+
+    def read_version(self, journal_block: int) -> Optional[bytes]:
+
+        # Nội dung một bản trong journal (khôi phục 4 bytes magic nếu block đã bị escape)
+        data = self._read_journal_blocks(journal_block, 1).get(journal_block)
+        if data is None:
+            return None
+        data = bytes(data)
+        if journal_block in self.escaped:
+            data = JBD2_MAGIC_BYTES + data[4:]
+        return data
+
+    def block_history(self, fs_block: int, committed_only: bool = True) -> List[Tuple[int, bytes]]:
+
+        # [(tid, nội dung)] của một block filesystem, cũ -> mới
+        history = []
+        for tid, journal_block in self.versions(fs_block, committed_only):
+            data = self.read_version(journal_block)
+            if data is not None:
+                history.append((tid, data))
+        return history
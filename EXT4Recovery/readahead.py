@@ -0,0 +1,239 @@
+import mmap
+import queue
+import threading
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from block_device import BlockDevice
+
+
+class ReadaheadReader:
+    """Đọc trước (readahead) bằng một producer thread và hàng đợi giới hạn
+
+    Producer đọc các segment (offset, length) vào buffer căn theo page, đẩy vào
+    queue; scanner tiêu thụ buffer trong lúc producer đọc segment kế tiếp, nên
+    I/O và phần parse bằng Python chạy chồng lên nhau.
+
+    memoryview nhận được chỉ hợp lệ tới lần lặp kế tiếp: buffer sẽ được tái sử
+    dụng (double-buffering), cần giữ lại dữ liệu nào thì copy ra.
+    """
+
+    DEFAULT_WINDOW_SIZE = 16 * 1024 * 1024
+    DEFAULT_QUEUE_DEPTH = 2
+
+    _DONE = object()
+
+    def __init__(self, device: BlockDevice, start: int = 0, end: Optional[int] = None,
+                 window_size: int = DEFAULT_WINDOW_SIZE, queue_depth: int = DEFAULT_QUEUE_DEPTH,
+                 align: int = 4096, segments: Optional[Iterable[Tuple[int, int]]] = None,
+                 skip_holes: bool = False):
+
+        self.device = device
+        self.queue_depth = max(1, queue_depth)
+        self.window_size = max(align, (window_size // align) * align)
+
+        # Hole của image sparse (offset, length): không đọc, coi như toàn zero
+        self.holes: List[Tuple[int, int]] = []
+        self.bytes_skipped = 0
+
+        device_size = device.size()
+        if segments is None:
+            if end is None or end > device_size:
+                end = device_size
+            if skip_holes:
+                segments = self._data_windows(start, end, align)
+            else:
+                segments = self._windows(start, end, self.window_size)
+        else:
+            segments = self._clamp(segments, device_size)
+        self._segments = segments
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=self.queue_depth)
+        self._free: "queue.Queue" = queue.Queue()
+        # queue_depth buffer trong hàng đợi + 1 đang đọc + 1 đang được tiêu thụ
+        for _ in range(self.queue_depth + 2):
+            self._free.put(mmap.mmap(-1, self.window_size))
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._current = None
+
+        # Thống kê
+        self.bytes_read = 0
+        self.segments_read = 0
+        self.io_time = 0.0
+        self.stall_time = 0.0
+        self._started_at = 0.0
+        self._finished_at = 0.0
+
+    @classmethod
+    def for_segments(cls, device: BlockDevice, segments: Iterable[Tuple[int, int]],
+                     segment_size: int, queue_depth: int = 64) -> "ReadaheadReader":
+
+        # Đọc trước các vùng nhỏ rời rạc (ví dụ superblock ứng viên mỗi 1MB)
+        return cls(device, window_size=segment_size, queue_depth=queue_depth,
+                   align=1, segments=segments)
+
+    @staticmethod
+    def _windows(start: int, end: int, window_size: int) -> Iterator[Tuple[int, int]]:
+
+        offset = start
+        while offset < end:
+            length = min(window_size, end - offset)
+            yield offset, length
+            offset += length
+
+    def _data_windows(self, start: int, end: int, align: int) -> List[Tuple[int, int]]:
+
+        # Chỉ đọc vùng có dữ liệu, mở rộng ra biên align để block không bị cắt đôi
+        ranges: List[Tuple[int, int]] = []
+        for offset, length in self.device.data_ranges(start, end):
+            lo = max(start, offset - (offset - start) % align)
+            hi = min(end, offset + length + (-(offset + length - start)) % align)
+            if ranges and lo <= ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], hi))
+            else:
+                ranges.append((lo, hi))
+
+        position = start
+        for lo, hi in ranges:
+            if lo > position:
+                self.holes.append((position, lo - position))
+            position = hi
+        if position < end:
+            self.holes.append((position, end - position))
+        self.bytes_skipped = sum(length for _, length in self.holes)
+
+        return [window for lo, hi in ranges for window in self._windows(lo, hi, self.window_size)]
+
+    def _clamp(self, segments: Iterable[Tuple[int, int]], device_size: int) -> Iterator[Tuple[int, int]]:
+
+        for offset, length in segments:
+            if offset >= device_size:
+                continue
+            length = min(length, device_size - offset, self.window_size)
+            if length > 0:
+                yield offset, length
+
+    def start(self) -> "ReadaheadReader":
+
+        if self._thread is None:
+            self._started_at = time.perf_counter()
+            self._thread = threading.Thread(target=self._produce, name="readahead", daemon=True)
+            self._thread.start()
+        return self
+
+    def _put(self, item) -> bool:
+
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self) -> None:
+
+        try:
+            for offset, length in self._segments:
+                if self._stop.is_set():
+                    break
+                buf = self._free.get()
+
+                t0 = time.perf_counter()
+                view = memoryview(buf)[:length]
+                got = self.device.readinto(view, offset)
+                self.io_time += time.perf_counter() - t0
+
+                self.bytes_read += got
+                self.segments_read += 1
+                if not self._put((offset, buf, view[:got])):
+                    break
+        except Exception as e:
+            self._put(e)
+        finally:
+            self._put(self._DONE)
+
+    def _recycle_current(self) -> None:
+
+        if self._current is not None:
+            self._free.put(self._current)
+            self._current = None
+
+    def __iter__(self) -> Iterator[Tuple[int, memoryview]]:
+
+        self.start()
+        try:
+            while True:
+                self._recycle_current()
+
+                t0 = time.perf_counter()
+                item = self._queue.get()
+                self.stall_time += time.perf_counter() - t0
+
+                if item is self._DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                offset, buf, view = item
+                self._current = buf
+                yield offset, view
+        finally:
+            self._finished_at = time.perf_counter()
+            self.close()
+
+    def iter_blocks(self, block_size: int) -> Iterator[Tuple[int, memoryview]]:
+
+        # Cắt từng window thành các block (block_number, view). Phần lẻ cuối image (kích thước
+        # không chia hết block_size) được pad zeros như _read_block_uncached, không bị bỏ sót
+        for offset, view in self:
+            first = offset // block_size
+            full, tail = divmod(len(view), block_size)
+            for i in range(full):
+                yield first + i, view[i * block_size:(i + 1) * block_size]
+            if tail:
+                padded = view[full * block_size:].tobytes() + b'\x00' * (block_size - tail)
+                yield first + full, memoryview(padded)
+
+    def close(self) -> None:
+
+        self._stop.set()
+        # Xả hàng đợi để producer không bị kẹt ở put()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def stats(self) -> dict:
+
+        end = self._finished_at or time.perf_counter()
+        elapsed = end - self._started_at if self._started_at else 0.0
+        return {
+            'bytes_read': self.bytes_read,
+            'bytes_skipped': self.bytes_skipped,
+            'segments': self.segments_read,
+            'io_time': self.io_time,
+            'stall_time': self.stall_time,
+            'elapsed': elapsed,
+            'throughput_mb_s': (self.bytes_read / 1024**2 / elapsed) if elapsed > 0 else 0.0,
+        }
+
+    def format_stats(self) -> str:
+
+        s = self.stats()
+        text = (f"Readahead: {s['bytes_read'] / 1024**2:.1f} MB trong {s['elapsed']:.2f}s "
+                f"({s['throughput_mb_s']:.1f} MB/s), chờ I/O {s['stall_time']:.2f}s")
+        if s['bytes_skipped']:
+            text += f", bỏ qua {s['bytes_skipped'] / 1024**2:.1f} MB hole"
+        return text
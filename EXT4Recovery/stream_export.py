@@ -0,0 +1,77 @@
+import csv
+import json
+from typing import Dict, Iterable, List, Optional
+
+
+EXPORT_FORMATS = ('jsonl', 'csv', 'tsv')
+
+# Đuôi file -> định dạng
+_EXTENSIONS = {'.jsonl': 'jsonl', '.ndjson': 'jsonl', '.csv': 'csv', '.tsv': 'tsv'}
+
+
+def export_format(output_file: str, fmt: Optional[str] = None) -> Optional[str]:
+
+    # Định dạng chỉ định, hoặc đoán theo đuôi file; None nếu không phải định dạng dạng bản ghi
+    if fmt:
+        fmt = fmt.lower()
+        return fmt if fmt in EXPORT_FORMATS else None
+    for extension, name in _EXTENSIONS.items():
+        if output_file.lower().endswith(extension):
+            return name
+    return None
+
+
+class RecordWriter:
+    """Ghi từng bản ghi (dict) ra file ngay khi có: JSON Lines, CSV hoặc TSV
+
+    Không giữ bản ghi nào trong bộ nhớ. CSV / TSV lấy cột từ fields, hoặc từ bản ghi đầu tiên;
+    key không có trong danh sách cột bị bỏ qua.
+    """
+
+    def __init__(self, output_file: str, fmt: str = 'jsonl', fields: Optional[List[str]] = None):
+
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        self.output_file = output_file
+        self.fmt = fmt
+        self.fields = list(fields) if fields else None
+        self.count = 0
+        self._file = open(output_file, 'w', encoding='utf-8', newline='')
+        self._writer = None
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+
+        self.close()
+
+    def write(self, record: Dict) -> None:
+
+        if self.fmt == 'jsonl':
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        else:
+            if self._writer is None:
+                if self.fields is None:
+                    self.fields = list(record)
+                self._writer = csv.DictWriter(self._file, self.fields, extrasaction='ignore',
+                                              dialect='excel-tab' if self.fmt == 'tsv' else 'excel')
+                self._writer.writeheader()
+            self._writer.writerow(record)
+        self.count += 1
+
+    def close(self) -> None:
+
+        if not self._file.closed:
+            self._file.close()
+
+
+def export_records(records: Iterable[Dict], output_file: str, fmt: str = 'jsonl',
+                   fields: Optional[List[str]] = None) -> int:
+
+    # Tiêu thụ một generator bản ghi, ghi dần ra file; trả về số bản ghi đã ghi
+    with RecordWriter(output_file, fmt, fields) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.count
@@ -5,18 +5,33 @@ import struct
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'EXT4Recovery'))
 from ext4_structures import EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE
 from ext4_utils import EXT4Utils
+from block_device import open_image
+from readahead import ReadaheadReader
+from ext4_checksum import MetadataChecksum
+from stream_export import export_format, export_records
+
+
+DIRENT_HEADER = struct.Struct('<IHBB')
 
 
 class DirectoryCarver:
-    def __init__(self, image_file):
+    def __init__(self, image_file, use_mmap=True, direct=None):
         self.image_file = image_file
+        self.device = open_image(image_file, use_mmap=use_mmap, direct=direct)
         self.utils = EXT4Utils()
         self.superblock = None
         self.found_entries = []
         self.directory_tree = {}
+        # Readahead: kich thuoc moi window va so window doc truoc
+        self.readahead_window = ReadaheadReader.DEFAULT_WINDOW_SIZE
+        self.readahead_depth = ReadaheadReader.DEFAULT_QUEUE_DEPTH
+        self.readahead_stats = None
+        self.readahead_stats_text = ''
+        self.skipped_no_tail = 0
+        self.metadata_csum = False
         
     def load_filesystem_info(self):
-        sb_data = self.utils.read_bytes(self.image_file, EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE)
+        sb_data = self.utils.read_bytes(self.device, EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE)
         if not sb_data:
             return False
             
@@ -24,41 +39,66 @@ class DirectoryCarver:
         if not self.superblock or not self.superblock.is_valid():
             return False
         
+        # metadata_csum: moi block thu muc (leaf) deu co dirent tail 12 bytes o cuoi
+        self.metadata_csum = MetadataChecksum(self.superblock).enabled
         return True
     
     def scan_directory_blocks(self):
         if not self.superblock:
             return False
         
+        found_count = 0
+        for entry in self.iter_entries():
+            self.found_entries.append(entry)
+            found_count += 1
+        
+        print(f"\n\n✓ Scan complete! Found {found_count} directory entries")
+        if self.metadata_csum:
+            print(f"   Bo qua {self.skipped_no_tail:,} blocks khong co dirent tail (metadata_csum)")
+        print(f"   {self.readahead_stats_text}")
+        return True
+    
+    def iter_entries(self):
+        """
+        Generator: yield tung directory entry ngay khi tim thay, khong giu lai trong bo nho
+        """
+        if not self.superblock:
+            return
+        
         block_size = self.superblock.get_block_size()
         total_blocks = self.superblock.get_total_blocks()
         
         print(f"\nScanning {total_blocks:,} blocks for directory entries...")
         print(f"   Block size: {block_size} bytes")
         
+        self.skipped_no_tail = 0
         found_count = 0
+        has_dirent_tail = MetadataChecksum.has_dirent_tail
         
-        # Scan từng block
-        for block_num in range(total_blocks):
-            block_offset = block_num * block_size
-            block_data = self.utils.read_bytes(self.image_file, block_offset, block_size)
-            
-            if not block_data:
+        reader = ReadaheadReader(self.device, 0, total_blocks * block_size,
+                                 window_size=self.readahead_window,
+                                 queue_depth=self.readahead_depth, align=block_size,
+                                 skip_holes=True)
+        
+        # Scan từng block (thread readahead đọc trước các window tiếp theo,
+        # hole của image sparse toàn zero nên bỏ qua luôn)
+        for block_num, block_data in reader.iter_blocks(block_size):
+            # metadata_csum: block không có dirent tail thì không phải block thư mục
+            if self.metadata_csum and not has_dirent_tail(block_data):
+                self.skipped_no_tail += 1
                 continue
             
             # Parse directory entries trong block này
             entries = self._parse_directory_entries(block_data, block_num)
-            
-            if entries:
-                self.found_entries.extend(entries)
-                found_count += len(entries)
+            found_count += len(entries)
+            yield from entries
             
             # Progress indicator
             if block_num % 1000 == 0 and block_num > 0:
                 print(f"   Progress: {block_num:,}/{total_blocks:,} blocks ({found_count} entries)", end='\r')
         
-        print(f"\n\n✓ Scan complete! Found {found_count} directory entries")
-        return True
+        self.readahead_stats = reader.stats()
+        self.readahead_stats_text = reader.format_stats()
     
     def _parse_directory_entries(self, block_data, block_num):
         entries = []
@@ -66,10 +106,8 @@ class DirectoryCarver:
         
         while offset < len(block_data) - 8:
             # Parse entry header
-            inode = struct.unpack('<I', block_data[offset:offset+4])[0]
-            rec_len = struct.unpack('<H', block_data[offset+4:offset+6])[0]
-            name_len = block_data[offset+6]
-            file_type = block_data[offset+7]
+            # unpack_from doc truc tiep tren memoryview, khong tao bytes tam
+            inode, rec_len, name_len, file_type = DIRENT_HEADER.unpack_from(block_data, offset)
             
             # Validate entry
             if not self._is_valid_entry(inode, rec_len, name_len, file_type):
@@ -78,7 +116,7 @@ class DirectoryCarver:
             
             # Extract name
             if name_len > 0 and offset + 8 + name_len <= len(block_data):
-                name_bytes = block_data[offset+8:offset+8+name_len]
+                name_bytes = bytes(block_data[offset+8:offset+8+name_len])
                 
                 try:
                     name = name_bytes.decode('utf-8', errors='ignore')
@@ -200,9 +238,26 @@ class DirectoryCarver:
                 else:
                     print(f"   {name:30s} (inodes {', '.join(map(str, inodes))})")
     
+    def export_entries(self, output_file, fmt='jsonl'):
+        """
+        Ghi tung entry ra JSON Lines / CSV / TSV. Chua scan thi vua scan vua ghi
+        (khong tich luy found_entries), bo nho khong tang theo so entry
+        """
+        entries = self.found_entries if self.found_entries else self.iter_entries()
+        fields = ['block', 'inode', 'name', 'file_type', 'file_type_str']
+        count = export_records(entries, output_file, fmt, fields)
+        print(f"✓ Exported {count:,} entries ({fmt}) to {output_file}")
+        return count
+    
     def export_directory_list(self, output_file):
         print(f"\nExporting directory list to: {output_file}")
         
+        # .jsonl / .csv / .tsv: ghi tung entry, khong can dung cay
+        fmt = export_format(output_file)
+        if fmt:
+            self.export_entries(output_file, fmt)
+            return
+        
         with open(output_file, 'w') as f:
             f.write("=" * 70 + "\n")
             f.write("RECOVERED DIRECTORY STRUCTURE\n")
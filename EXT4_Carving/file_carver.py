@@ -4,6 +4,8 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'EXT4Recovery'))
 from ext4_structures import EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE
 from ext4_utils import EXT4Utils
+from block_device import open_image
+from readahead import ReadaheadReader
 
 
 # File signatures (magic bytes)
@@ -87,15 +89,24 @@ FILE_SIGNATURES = {
 }
 
 
+# Header phai nam trong 512 bytes dau block -> chi can copy vung nay de do
+HEADER_PROBE_SIZE = 512 + max(len(sig['header']) for sig in FILE_SIGNATURES.values())
+
+
 class FileCarver:
-    def __init__(self, image_file):
+    def __init__(self, image_file, use_mmap=True, direct=None):
         self.image_file = image_file
+        self.device = open_image(image_file, use_mmap=use_mmap, direct=direct)
         self.utils = EXT4Utils()
         self.superblock = None
         self.found_files = []
+        # Readahead: kich thuoc moi window va so window doc truoc
+        self.readahead_window = ReadaheadReader.DEFAULT_WINDOW_SIZE
+        self.readahead_depth = ReadaheadReader.DEFAULT_QUEUE_DEPTH
+        self.readahead_stats = None
         
     def load_filesystem_info(self):
-        sb_data = self.utils.read_bytes(self.image_file, EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE)
+        sb_data = self.utils.read_bytes(self.device, EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE)
         if not sb_data:
             return False
             
@@ -125,24 +136,27 @@ class FileCarver:
         last_found_block = -1
         seen_signatures = set()  # Track để tránh duplicate files
         
-        # Scan từng block
-        for block_num in range(start_block, end_block):
+        reader = ReadaheadReader(self.device, start_block * block_size, end_block * block_size,
+                                 window_size=self.readahead_window,
+                                 queue_depth=self.readahead_depth, align=block_size,
+                                 skip_holes=True)
+        
+        # Scan từng block (thread readahead đọc trước các window tiếp theo,
+        # hole của image sparse toàn zero nên bỏ qua luôn)
+        for block_num, block_data in reader.iter_blocks(block_size):
             # Skip block nếu nằm trong file vừa tìm được (tránh duplicate)
             if block_num <= last_found_block:
                 continue
             
-            block_offset = block_num * block_size
-            block_data = self.utils.read_bytes(self.image_file, block_offset, block_size)
-            
-            if not block_data:
-                continue
+            # Chỉ copy phần đầu block để tìm header, phần còn lại giữ nguyên trên mapping
+            probe = bytes(block_data[:HEADER_PROBE_SIZE])
             
             # Check xem block này có chứa file signature không
             for file_type, sig_info in FILE_SIGNATURES.items():
                 header = sig_info['header']
                 
                 # Check header position (có thể ở đầu block hoặc offset 512)
-                header_pos = block_data.find(header)
+                header_pos = probe.find(header)
                 
                 if header_pos != -1 and header_pos < 512:  # Header phải gần đầu block
                     # Tìm thấy file header!
@@ -187,6 +201,8 @@ class FileCarver:
                 if progress_callback:
                     progress_callback(block_num, end_block, found_count, None)
         
+        self.readahead_stats = reader.stats()
+        print(f"   {reader.format_stats()}")
         return True
     
     def _extract_file(self, start_block, sig_info, header_offset=0):
@@ -204,7 +220,7 @@ class FileCarver:
         # Đọc blocks cho đến khi gặp footer hoặc đạt giới hạn
         while len(data) < max_size and blocks_read < max_blocks:
             block_offset = current_block * block_size
-            block_data = self.utils.read_bytes(self.image_file, block_offset, block_size)
+            block_data = self.utils.read_view(self.device, block_offset, block_size)
             
             if not block_data:
                 break
@@ -291,8 +307,8 @@ class FileCarver:
                         need_extra = footer_pos + len(footer) + footer_extra - len(data)
                         if need_extra > 0:
                             current_block += 1
-                            extra_block = self.utils.read_bytes(
-                                self.image_file, 
+                            extra_block = self.utils.read_view(
+                                self.device, 
                                 current_block * block_size, 
                                 block_size
                             )
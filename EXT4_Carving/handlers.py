@@ -7,6 +7,7 @@ from directory_carver import DirectoryCarver
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'EXT4Recovery'))
 from ext4_structures import EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE
 from ext4_utils import EXT4Utils
+from block_device import BlockDevice
 
 
 def handle_check_data(image_file):
@@ -23,7 +24,8 @@ def handle_check_data(image_file):
     
     # Load filesystem info
     utils = EXT4Utils()
-    sb_data = utils.read_bytes(image_file, EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE)
+    with BlockDevice(image_file) as device:
+        sb_data = utils.read_bytes(device, EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE)
     
     if not sb_data:
         print("\n✗ Failed to read superblock!")
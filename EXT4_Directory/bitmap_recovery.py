@@ -6,24 +6,32 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'EXT4Recovery'))
 from ext4_structures import (
     Superblock, GroupDescriptor, Inode, DirectoryEntry,
-    EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE,
-    EXT4_GROUP_DESC_SIZE
+    EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE
 )
 from ext4_utils import EXT4Utils
+from group_descriptors import load_group_descriptors, descriptor_size
+from block_device import BlockDevice
+from extent_tree import ExtentTree
+from indirect_map import IndirectBlockMapper
+from flex_groups import FlexGroupReader
 
 
 class BitmapRecovery:
     
     def __init__(self, image_file):
         self.image_file = image_file
+        self.device = BlockDevice(image_file)
         self.utils = EXT4Utils()
         self.superblock = None
         self.group_descriptors = []
+        self.extent_tree = None
+        self.indirect_mapper = None
+        self.flex_reader = None
         
     def load_filesystem_info(self):
         
         # Doc superblock
-        sb_data = self.utils.read_bytes(self.image_file, EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE)
+        sb_data = self.utils.read_bytes(self.device, EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE)
         if not sb_data:
             print("   Loi: Khong doc duoc superblock data")
             return False
@@ -37,22 +45,18 @@ class BitmapRecovery:
             print(f"   Canh bao: Superblock khong hop le (magic = 0x{self.superblock.s_magic:X})")
             print("   Tiep tuc thu doc group descriptors...")
         
-        # Doc group descriptors
+        # Doc group descriptors: ca GDT trong mot lan doc, dung chung cache voi cac tool khac
         try:
-            block_size = self.superblock.get_block_size()
-            gdt_block = 1 if block_size == 1024 else 0
-            gdt_offset = (gdt_block + 1) * block_size
-            
-            num_groups = (self.superblock.s_blocks_count_lo + self.superblock.s_blocks_per_group - 1) // self.superblock.s_blocks_per_group
-            
-            for i in range(num_groups):
-                offset = gdt_offset + i * EXT4_GROUP_DESC_SIZE
-                gd_data = self.utils.read_bytes(self.image_file, offset, EXT4_GROUP_DESC_SIZE)
-                
-                if gd_data:
-                    gd = self.utils.parse_group_descriptor(gd_data)
-                    if gd:
-                        self.group_descriptors.append(gd)
+            table = load_group_descriptors(self.device, self.superblock)
+            if table is None:
+                print("   Loi: Khong xac dinh duoc vi tri GDT")
+                return False
+            self.group_descriptors = table
+            self.extent_tree = ExtentTree(self.device, self.superblock.get_block_size(),
+                                          max_block=self.superblock.get_total_blocks())
+            self.indirect_mapper = IndirectBlockMapper(self.device, self.superblock.get_block_size(),
+                                                       self.superblock.get_total_blocks())
+            self.flex_reader = FlexGroupReader(self.device, self.superblock, self.group_descriptors)
             
             return True
         except Exception as e:
@@ -67,7 +71,7 @@ class BitmapRecovery:
         gd = self.group_descriptors[group_num]
         block_size = self.superblock.get_block_size()
         
-        bitmap_block = gd.bg_block_bitmap_lo
+        bitmap_block = gd.get_block_bitmap()
         bitmap_offset = bitmap_block * block_size
         
         return {
@@ -85,7 +89,7 @@ class BitmapRecovery:
         gd = self.group_descriptors[group_num]
         block_size = self.superblock.get_block_size()
         
-        bitmap_block = gd.bg_inode_bitmap_lo
+        bitmap_block = gd.get_inode_bitmap()
         bitmap_offset = bitmap_block * block_size
         
         return {
@@ -101,7 +105,12 @@ class BitmapRecovery:
         if not info:
             return None
         
-        return self.utils.read_bytes(self.image_file, info['bitmap_offset'], info['size'])
+        # Bitmap cua ca flex group nam lien nhau: doc mot lan (preadv), cac group sau lay tu cache
+        if self.flex_reader:
+            bitmap = self.flex_reader.bitmap('block', group_num)
+            if bitmap is not None:
+                return bytes(bitmap)
+        return self.utils.read_block(self.device, info['bitmap_block'], info['size'])
     
     def read_inode_bitmap(self, group_num):
         
@@ -109,7 +118,12 @@ class BitmapRecovery:
         if not info:
             return None
         
-        return self.utils.read_bytes(self.image_file, info['bitmap_offset'], info['size'])
+        # Bitmap cua ca flex group nam lien nhau: doc mot lan (preadv), cac group sau lay tu cache
+        if self.flex_reader:
+            bitmap = self.flex_reader.bitmap('inode', group_num)
+            if bitmap is not None:
+                return bytes(bitmap)
+        return self.utils.read_block(self.device, info['bitmap_block'], info['size'])
     
     def corrupt_block_bitmap(self, group_num):
         
@@ -132,9 +146,7 @@ class BitmapRecovery:
         
         # Ghi de bang zeros
         try:
-            with open(self.image_file, 'r+b') as f:
-                f.seek(info['bitmap_offset'])
-                f.write(b'\x00' * info['size'])
+            self.device.pwrite(b'\x00' * info['size'], info['bitmap_offset'])
             
             print(" Da pha hong block bitmap!")
             return True
@@ -163,9 +175,7 @@ class BitmapRecovery:
         
         # Ghi de bang zeros
         try:
-            with open(self.image_file, 'r+b') as f:
-                f.seek(info['bitmap_offset'])
-                f.write(b'\x00' * info['size'])
+            self.device.pwrite(b'\x00' * info['size'], info['bitmap_offset'])
             
             print(" Da pha hong inode bitmap!")
             return True
@@ -204,7 +214,7 @@ class BitmapRecovery:
             # 2. Group Descriptor Table
             # GDT bat dau sau superblock
             gdt_start = 2 if group_num == 0 else 0
-            gdt_blocks = (num_groups * 32 + block_size - 1) // block_size
+            gdt_blocks = (num_groups * descriptor_size(self.superblock) + block_size - 1) // block_size
             for i in range(gdt_blocks):
                 self._mark_block_used(new_bitmaps, group_num, gdt_start + i, blocks_per_group)
             
@@ -214,15 +224,15 @@ class BitmapRecovery:
                 self._mark_block_used(new_bitmaps, group_num, gdt_start + gdt_blocks + i, blocks_per_group)
             
             # 4. Block bitmap
-            block_bitmap_block = gd.bg_block_bitmap_lo
+            block_bitmap_block = gd.get_block_bitmap()
             self._mark_block_used_absolute(new_bitmaps, block_bitmap_block, blocks_per_group)
             
             # 5. Inode bitmap
-            inode_bitmap_block = gd.bg_inode_bitmap_lo
+            inode_bitmap_block = gd.get_inode_bitmap()
             self._mark_block_used_absolute(new_bitmaps, inode_bitmap_block, blocks_per_group)
             
             # 6. Inode table
-            inode_table_block = gd.bg_inode_table_lo
+            inode_table_block = gd.get_inode_table()
             inodes_per_group = self.superblock.s_inodes_per_group
             inode_size = self.superblock.s_inode_size
             inode_table_blocks = (inodes_per_group * inode_size + block_size - 1) // block_size
@@ -253,9 +263,7 @@ class BitmapRecovery:
             info = self.get_block_bitmap_info(group_num)
             if info:
                 try:
-                    with open(self.image_file, 'r+b') as f:
-                        f.seek(info['bitmap_offset'])
-                        f.write(bytes(new_bitmaps[group_num]))
+                    self.device.pwrite(bytes(new_bitmaps[group_num]), info['bitmap_offset'])
                     print(f"   Group {group_num}: OK")
                 except Exception as e:
                     print(f"   Group {group_num}: Loi - {e}")
@@ -299,9 +307,7 @@ class BitmapRecovery:
             info = self.get_inode_bitmap_info(group_num)
             if info:
                 try:
-                    with open(self.image_file, 'r+b') as f:
-                        f.seek(info['bitmap_offset'])
-                        f.write(bytes(new_bitmaps[group_num]))
+                    self.device.pwrite(bytes(new_bitmaps[group_num]), info['bitmap_offset'])
                     print(f"   Group {group_num}: OK")
                 except Exception as e:
                     print(f"   Group {group_num}: Loi - {e}")
@@ -342,79 +348,23 @@ class BitmapRecovery:
         if not inode:
             return
         
-        # i_block is a tuple of 15 integers (4 bytes each)
-        # Pack it into bytes for parsing
-        i_block_bytes = b''
-        for val in inode.i_block:
-            i_block_bytes += val.to_bytes(4, 'little')
-        
         # Parse extent tree de lay block numbers
         if inode.i_flags & 0x80000:  # EXT4_EXTENTS_FL
-            extent_header_data = i_block_bytes[:12]
+            extents, tree_blocks = self.extent_tree.walk_inode(inode)
             
-            if len(extent_header_data) < 12:
-                return
+            # Block index/leaf cua tree cung la block dang dung
+            for block_num in tree_blocks:
+                self._mark_block_used_absolute(bitmaps, block_num, blocks_per_group)
             
-            # Check magic
-            try:
-                eh_magic = int.from_bytes(extent_header_data[0:2], 'little')
-            except:
-                return
-                
-            if eh_magic != 0xF30A:
-                return
-            
-            eh_entries = int.from_bytes(extent_header_data[2:4], 'little')
-            eh_depth = int.from_bytes(extent_header_data[6:8], 'little')
-            
-            if eh_depth == 0:  # Leaf node
-                # Parse extent entries
-                for i in range(min(eh_entries, 4)):  # Max 4 extents in inode
-                    extent_offset = 12 + i * 12
-                    if extent_offset + 12 <= len(i_block_bytes):
-                        extent_data = i_block_bytes[extent_offset:extent_offset+12]
-                        
-                        ee_len = int.from_bytes(extent_data[4:6], 'little')
-                        ee_start_hi = int.from_bytes(extent_data[6:8], 'little')
-                        ee_start_lo = int.from_bytes(extent_data[8:12], 'little')
-                        
-                        physical_block = (ee_start_hi << 32) | ee_start_lo
-                        
-                        # Danh dau cac blocks
-                        for block_num in range(physical_block, physical_block + ee_len):
-                            self._mark_block_used_absolute(bitmaps, block_num, blocks_per_group)
-            else:
-                # Internal node - would need to follow extent index
-                # For now, just mark the extent tree blocks themselves
-                for i in range(min(eh_entries, 4)):
-                    extent_offset = 12 + i * 12
-                    if extent_offset + 12 <= len(i_block_bytes):
-                        extent_data = i_block_bytes[extent_offset:extent_offset+12]
-                        
-                        # ei_leaf points to next level
-                        ei_leaf_lo = int.from_bytes(extent_data[4:8], 'little')
-                        ei_leaf_hi = int.from_bytes(extent_data[8:10], 'little')
-                        leaf_block = (ei_leaf_hi << 32) | ei_leaf_lo
-                        
-                        self._mark_block_used_absolute(bitmaps, leaf_block, blocks_per_group)
+            # Extent uninit van la block da cap phat
+            for block_num in ExtentTree.physical_blocks(extents, include_uninit=True):
+                self._mark_block_used_absolute(bitmaps, block_num, blocks_per_group)
         else:
-            # Direct/indirect block pointers (old style)
-            # Direct blocks (0-11)
-            for i in range(12):
-                if i < len(inode.i_block):
-                    block_num = inode.i_block[i]
-                    if block_num > 0:
-                        self._mark_block_used_absolute(bitmaps, block_num, blocks_per_group)
-            
-            # Indirect block (12)
-            if 12 < len(inode.i_block):
-                indirect_block = inode.i_block[12]
-                if indirect_block > 0:
-                    self._mark_block_used_absolute(bitmaps, indirect_block, blocks_per_group)
+            # Direct/indirect block pointers (old style): ca pointer block lan data block
+            runs, pointer_blocks = self.indirect_mapper.walk_inode(inode)
+            for block_num in pointer_blocks:
+                self._mark_block_used_absolute(bitmaps, block_num, blocks_per_group)
             
-            # Double indirect (13) and Triple indirect (14)
-            for i in [13, 14]:
-                if i < len(inode.i_block):
-                    block_num = inode.i_block[i]
-                    if block_num > 0:
-                        self._mark_block_used_absolute(bitmaps, block_num, blocks_per_group)
+            for _, physical, length, _ in runs:
+                for block_num in range(physical, physical + length):
+                    self._mark_block_used_absolute(bitmaps, block_num, blocks_per_group)
@@ -2,30 +2,47 @@
 
 import sys
 import os
+from collections import deque
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'EXT4Recovery'))
 from ext4_structures import (
-    Superblock, GroupDescriptor, Inode, DirectoryEntry,
-    EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE,
-    EXT4_GROUP_DESC_SIZE
+    Superblock, GroupDescriptor, Inode, DirectoryEntry, InodeView,
+    EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE
 )
 from ext4_utils import EXT4Utils
+from group_descriptors import load_group_descriptors
+from block_device import open_image
+from inode_table import HAS_NUMPY
+from inode_scanner import InodeScanner
+from ext4_checksum import MetadataChecksum
+from extent_tree import ExtentTree
+from indirect_map import IndirectBlockMapper
+from htree import is_dx_node
+from stream_export import export_format, export_records
 
 
 class DirectoryScanner:
     
-    def __init__(self, image_file):
+    def __init__(self, image_file, use_mmap=True):
         self.image_file = image_file
+        self.device = open_image(image_file, use_mmap=use_mmap)
         self.utils = EXT4Utils()
         self.superblock = None
         self.group_descriptors = []
         self.found_inodes = []
+        self.scan_stats = {}
         self.directory_tree = {}
+        # metadata_csum: kiem tra checksum inode khi quet. found_inodes dung de rebuild bitmap nen
+        # inode sai checksum khong bi loai, chi danh dau 'checksum_ok': False
+        self.verify_checksums = True
+        self.checksum = None
+        self.extent_tree = None
+        self.indirect_mapper = None
         
     def load_filesystem_info(self):
         
         # Doc superblock
-        sb_data = self.utils.read_bytes(self.image_file, EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE)
+        sb_data = self.utils.read_bytes(self.device, EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE)
         if not sb_data:
             print("   Loi: Khong doc duoc superblock data")
             return False
@@ -34,35 +51,31 @@ class DirectoryScanner:
         if not self.superblock:
             print("   Loi: Khong parse duoc superblock")
             return False
+        self.checksum = MetadataChecksum(self.superblock)
+        self.extent_tree = ExtentTree(self.device, self.superblock.get_block_size(), self.checksum,
+                                      self.superblock.get_total_blocks())
+        self.indirect_mapper = IndirectBlockMapper(self.device, self.superblock.get_block_size(),
+                                                   self.superblock.get_total_blocks())
         
         if not self.superblock.is_valid():
             print(f"   Canh bao: Superblock khong hop le (magic = 0x{self.superblock.s_magic:X})")
             print("   Tiep tuc thu doc group descriptors...")
             # Khong return False, van thu tiep
         
-        # Doc group descriptors
+        # Doc group descriptors: ca GDT trong mot lan doc, dung chung cache voi cac tool khac
         try:
-            block_size = self.superblock.get_block_size()
-            gdt_block = 1 if block_size == 1024 else 0
-            gdt_offset = (gdt_block + 1) * block_size
-            
-            num_groups = (self.superblock.s_blocks_count_lo + self.superblock.s_blocks_per_group - 1) // self.superblock.s_blocks_per_group
-            
-            for i in range(num_groups):
-                offset = gdt_offset + i * EXT4_GROUP_DESC_SIZE
-                gd_data = self.utils.read_bytes(self.image_file, offset, EXT4_GROUP_DESC_SIZE)
-                
-                if gd_data:
-                    gd = self.utils.parse_group_descriptor(gd_data)
-                    if gd:
-                        self.group_descriptors.append(gd)
+            table = load_group_descriptors(self.device, self.superblock)
+            if table is None:
+                print("   Loi: Khong xac dinh duoc vi tri GDT")
+                return False
+            self.group_descriptors = table
             
             return True
         except Exception as e:
             print(f"   Loi khi doc group descriptors: {e}")
             return False
     
-    def read_inode(self, inode_num):
+    def read_inode(self, inode_num, lazy=False):
         
         if not self.superblock or not self.group_descriptors:
             return None
@@ -76,19 +89,24 @@ class DirectoryScanner:
         
         # Lay inode table offset
         gd = self.group_descriptors[group_num]
-        inode_table_block = gd.bg_inode_table_lo
+        inode_table_block = gd.get_inode_table()
         
         block_size = self.superblock.get_block_size()
         inode_size = self.superblock.s_inode_size
         
-        inode_offset = inode_table_block * block_size + local_index * inode_size
+        inode_offset = local_index * inode_size
         
-        # Doc inode
-        inode_data = self.utils.read_bytes(self.image_file, inode_offset, inode_size)
-        if not inode_data:
+        # Doc ca block cua inode table qua block cache (16 inode / block 4K)
+        block_num = inode_table_block + inode_offset // block_size
+        block_data = self.utils.read_block(self.device, block_num, block_size)
+        if not block_data:
             return None
         
-        return self.utils.parse_inode(inode_data)
+        start = inode_offset % block_size
+        if lazy:
+            # View tren block: chi decode field nao duoc doc toi
+            return InodeView(block_data, start, inode_size)
+        return self.utils.parse_inode(block_data, start, inode_size)
     
     def read_directory_entries(self, inode_num):
         
@@ -98,57 +116,39 @@ class DirectoryScanner:
         
         entries = []
         block_size = self.superblock.get_block_size()
+        block_nums = self._directory_blocks(inode_num, inode)
         
-        # Doc extent header
-        extent_header_data = inode.i_block[:12]
-        
-        # Simple case: direct blocks in i_block
-        # Gia su su dung extent tree
-        if inode.i_flags & 0x80000:  # EXT4_EXTENTS_FL
-            # Parse extent tree (simplified)
-            # Chi xu ly extent leaf nodes
-            num_extents = extent_header_data[2]  # eh_entries
-            
-            for i in range(min(num_extents, 4)):  # Goi han 4 extents
-                extent_offset = 12 + i * 12
-                if extent_offset + 12 <= len(inode.i_block):
-                    extent_data = inode.i_block[extent_offset:extent_offset+12]
-                    
-                    # Parse extent entry
-                    ee_block = int.from_bytes(extent_data[0:4], 'little')
-                    ee_len = int.from_bytes(extent_data[4:6], 'little')
-                    ee_start_hi = int.from_bytes(extent_data[6:8], 'little')
-                    ee_start_lo = int.from_bytes(extent_data[8:12], 'little')
-                    
-                    physical_block = (ee_start_hi << 32) | ee_start_lo
-                    
-                    # Doc data block
-                    for block_idx in range(ee_len):
-                        data_offset = (physical_block + block_idx) * block_size
-                        block_data = self.utils.read_bytes(self.image_file, data_offset, block_size)
-                        
-                        if block_data:
-                            entries.extend(self.parse_directory_block(block_data))
-        else:
-            # Direct blocks
-            for i in range(12):
-                block_num = int.from_bytes(inode.i_block[i*4:(i+1)*4], 'little')
-                if block_num == 0:
-                    break
-                
-                data_offset = block_num * block_size
-                block_data = self.utils.read_bytes(self.image_file, data_offset, block_size)
-                
-                if block_data:
-                    entries.extend(self.parse_directory_block(block_data))
+        # Doc gop cac block lien ke thanh it lan doc
+        blocks = self.utils.read_blocks(self.device, block_nums, block_size)
+        for block_num in block_nums:
+            if block_num in blocks:
+                entries.extend(self.parse_directory_block(blocks[block_num]))
         
         return entries
     
+    def _directory_blocks(self, inode_num, inode):
+        
+        if inode.i_flags & 0x80000:  # EXT4_EXTENTS_FL
+            # Extent tree day du (index node moi do sau), block theo thu tu logical
+            extents = self.extent_tree.extents(inode, inode_num)
+            return ExtentTree.physical_blocks(extents)
+        
+        # Direct + indirect/double/triple-indirect blocks
+        runs, _ = self.indirect_mapper.walk_inode(inode)
+        block_nums = []
+        for _, physical, length, _ in runs:
+            block_nums.extend(range(physical, physical + length))
+        return block_nums
+    
     def parse_directory_block(self, block_data):
         
         entries = []
         offset = 0
         
+        # Block index cua HTree (dx_node): noi dung la dx_entry, khong phai dirent
+        if is_dx_node(block_data, len(block_data)):
+            return entries
+        
         while offset < len(block_data):
             if offset + 8 > len(block_data):
                 break
@@ -162,7 +162,7 @@ class DirectoryScanner:
                 break
             
             if inode != 0 and name_len > 0:
-                name = block_data[offset+8:offset+8+name_len].decode('utf-8', errors='ignore')
+                name = bytes(block_data[offset+8:offset+8+name_len]).decode('utf-8', errors='ignore')
                 
                 entries.append({
                     'inode': inode,
@@ -181,30 +181,36 @@ class DirectoryScanner:
         
         print(" Dang quet tat ca inodes...")
         
-        total_inodes = self.superblock.s_inodes_count
         self.found_inodes = []
         
-        for inode_num in range(1, total_inodes + 1):
-            # Skip reserved inodes
-            if inode_num < 11 and inode_num not in [2, 8]:  # Root=2, Journal=8
-                continue
-            
-            inode = self.read_inode(inode_num)
-            
-            if inode and inode.i_mode != 0:
-                self.found_inodes.append({
-                    'inode_num': inode_num,
-                    'inode': inode,
-                    'is_dir': inode.is_directory(),
-                    'is_file': inode.is_regular_file(),
-                    'size': inode.get_size()
-                })
-            
-            # Progress
-            if inode_num % 1000 == 0:
-                print(f"   Scanned {inode_num}/{total_inodes} inodes...", end='\r')
+        if HAS_NUMPY:
+            print("   (NumPy: loc inode vector hoa theo tung group)")
+        
+        # Doc inode table cua moi group trong mot lan doc (bo qua group INODE_UNINIT va phan
+        # duoi itable_unused), doi chieu inode bitmap de phan loai live / deleted / orphan
+        scanner = InodeScanner(self.device, self.superblock, self.group_descriptors,
+                               self.checksum if self.verify_checksums else None,
+                               reject_bad_checksum=False)
+        self.found_inodes = scanner.scan(progress=True)
+        self.scan_stats = scanner.stats
         
+        stats = scanner.stats
         print(f"\n Tim thay {len(self.found_inodes)} inodes hop le!")
+        print(f"   live: {stats['live']}, deleted: {stats['deleted']}, orphan: {stats['orphan']}")
+        if stats['inodes_skipped']:
+            print(f"   Bo qua {stats['inodes_skipped']} inodes chua tung dung ({stats['groups_skipped']} groups uninit)")
+        if stats['checksum_flagged']:
+            print(f" {stats['checksum_flagged']} inodes sai checksum (metadata_csum), giu lai voi checksum_ok=False")
+        if stats['bad_descriptors']:
+            print(f" {stats['bad_descriptors']} group descriptors sai checksum: doc ca inode table")
+        if stats['bitmap_missing']:
+            print(f" {stats['bitmap_missing']} groups khong doc duoc inode bitmap: "
+                  f"{stats['unknown']} inodes trang thai khong xac dinh")
+        
+        if self.device.cache:
+            stats = self.device.cache.stats()
+            print(f" Block cache: {stats['hit_ratio'] * 100:.1f}% hit, "
+                  f"{stats['evictions']} evictions, tiet kiem {stats['bytes_saved'] / 1024**2:.1f} MB")
         return True
     
     def rebuild_directory_tree(self):
@@ -216,52 +222,119 @@ class DirectoryScanner:
         
         self.directory_tree = {}
         
-        # Bat dau tu root (inode 2)
-        root_entries = self.read_directory_entries(2)
-        
-        if root_entries:
-            self.directory_tree[2] = {
-                'path': '/',
-                'entries': root_entries,
-                'parent': 0
+        # Duyet theo chieu rong, khong gioi han do sau
+        for inode_num, path, parent, entries in self.walk_directories():
+            self.directory_tree[inode_num] = {
+                'path': path,
+                'entries': entries,
+                'parent': parent
             }
-            
-            print(f"   Root directory: {len(root_entries)} entries")
-            
-            # Recursively scan subdirectories
-            self._scan_directory_recursive(2, '/')
+            if inode_num == 2:
+                print(f"   Root directory: {len(entries)} entries")
         
         return True
     
-    def _scan_directory_recursive(self, inode_num, current_path, max_depth=10):
-        
-        if max_depth <= 0:
-            return
+    def walk_directories(self, root_inode=2, root_path='/', batch_dirs=256, batch_blocks=4096):
         
-        if inode_num not in self.directory_tree:
-            return
-        
-        entries = self.directory_tree[inode_num]['entries']
+        # Duyet cay thu muc bang hang doi (BFS), khong de quy, khong gioi han do sau.
+        # Moi lan lay mot lo thu muc dang cho: doc inode cua ca lo theo thu tu inode table,
+        # roi doc block du lieu cua ca lo sap xep theo vi tri tren dia (gop thanh it preadv).
+        # Yield (inode, path, parent, entries) cho tung thu muc co entry
+        block_size = self.superblock.get_block_size()
+        inodes_per_block = block_size // self.superblock.s_inode_size
+        queue = deque([(root_inode, root_path, 0)])
+        visited = {root_inode}
         
-        for entry in entries:
-            if entry['name'] in ['.', '..']:
-                continue
+        while queue:
+            batch = [queue.popleft() for _ in range(min(batch_dirs, len(queue)))]
+            
+            # Inode table: cac block chua inode cua ca lo, doc gop mot lan (vao block cache)
+            table_blocks = []
+            for inode_num, _, _ in batch:
+                group = (inode_num - 1) // self.superblock.s_inodes_per_group
+                if group < len(self.group_descriptors):
+                    index = (inode_num - 1) % self.superblock.s_inodes_per_group
+                    table_blocks.append(self.group_descriptors[group].get_inode_table() + index // inodes_per_block)
+            self.utils.read_blocks(self.device, table_blocks, block_size)
+            
+            # Block du lieu cua tung thu muc; lo bi cat khi tong so block vuot batch_blocks
+            pending = []
+            total = 0
+            for n, (inode_num, path, parent) in enumerate(batch):
+                inode = self.read_inode(inode_num)
+                if not inode or not inode.is_directory():
+                    continue
+                block_nums = self._directory_blocks(inode_num, inode)
+                if pending and total + len(block_nums) > batch_blocks:
+                    # Phan con lai cua lo quay lai dau hang doi, giu thu tu
+                    queue.extendleft(reversed(batch[n:]))
+                    break
+                pending.append((inode_num, path, parent, block_nums))
+                total += len(block_nums)
             
-            if entry['file_type'] == 2:  # Directory
-                subdir_path = os.path.join(current_path, entry['name'])
-                subdir_inode = entry['inode']
+            all_blocks = [block for _, _, _, block_nums in pending for block in block_nums]
+            blocks = self.utils.read_blocks(self.device, all_blocks, block_size, use_cache=False)
+            
+            for inode_num, path, parent, block_nums in pending:
+                entries = []
+                for block_num in block_nums:
+                    if block_num in blocks:
+                        entries.extend(self.parse_directory_block(blocks[block_num]))
+                if not entries:
+                    continue
                 
-                subdir_entries = self.read_directory_entries(subdir_inode)
+                yield inode_num, path, parent, entries
                 
-                if subdir_entries:
-                    self.directory_tree[subdir_inode] = {
-                        'path': subdir_path,
-                        'entries': subdir_entries,
-                        'parent': inode_num
-                    }
-                    
-                    # Recursive
-                    self._scan_directory_recursive(subdir_inode, subdir_path, max_depth - 1)
+                for entry in entries:
+                    if entry['file_type'] != 2 or entry['name'] in ('.', '..'):
+                        continue
+                    # Thu muc hong co the tro vong lai (hard link thu muc / rac)
+                    if entry['inode'] in visited:
+                        continue
+                    visited.add(entry['inode'])
+                    queue.append((entry['inode'], os.path.join(path, entry['name']), inode_num))
+    
+    def walk_tree(self, root_inode=2, root_path='/', **kwargs):
+        
+        # Stream (path, entry) cho moi entry (tru . va ..) trong khi duyet, khong giu ca cay
+        for _, path, _, entries in self.walk_directories(root_inode, root_path, **kwargs):
+            for entry in entries:
+                if entry['name'] in ('.', '..'):
+                    continue
+                yield os.path.join(path, entry['name']), entry
+    
+    def iter_tree(self, root_inode=2, root_path='/'):
+        
+        # Tung thu muc ngay khi doc xong: cay da rebuild thi theo thu tu path, chua thi duyet truc tiep
+        if self.directory_tree:
+            for inode_num, dir_info in sorted(self.directory_tree.items(), key=lambda x: x[1]['path']):
+                yield {'inode': inode_num, **dir_info}
+            return
+        for inode_num, path, parent, entries in self.walk_directories(root_inode, root_path):
+            yield {'inode': inode_num, 'path': path, 'entries': entries, 'parent': parent}
+    
+    def iter_entries(self, root_inode=2, root_path='/'):
+        
+        # Ban ghi phang cho moi entry (dung cho export JSON Lines / CSV / TSV)
+        for directory in self.iter_tree(root_inode, root_path):
+            for entry in directory['entries']:
+                if entry['name'] in ('.', '..'):
+                    continue
+                yield {
+                    'path': os.path.join(directory['path'], entry['name']),
+                    'name': entry['name'],
+                    'inode': entry['inode'],
+                    'parent_inode': directory['inode'],
+                    'file_type': entry['file_type'],
+                    'type': {1: 'file', 2: 'dir', 7: 'symlink'}.get(entry['file_type'], 'other')
+                }
+    
+    def export_entries(self, output_file, fmt='jsonl'):
+        
+        # Ghi tung ban ghi ngay khi duyet toi, bo nho khong tang theo so entry
+        count = export_records(self.iter_entries(), output_file, fmt)
+        print(f" Da xuat {count:,} entries ({fmt}) -> {output_file}")
+        return count
     
     def print_directory_tree(self):
         
@@ -269,14 +342,13 @@ class DirectoryScanner:
         print(" CAY THU MUC")
         print("=" * 70)
         
-        if not self.directory_tree:
+        if not self.superblock:
             print(" Chua co du lieu!")
             return
         
-        # In theo thu tu path
-        sorted_dirs = sorted(self.directory_tree.items(), key=lambda x: x[1]['path'])
-        
-        for inode_num, dir_info in sorted_dirs:
+        # In theo thu tu path (cay da rebuild) hoac ngay trong khi duyet
+        for dir_info in self.iter_tree():
+            inode_num = dir_info['inode']
             path = dir_info['path']
             entries = dir_info['entries']
             
@@ -298,13 +370,17 @@ class DirectoryScanner:
         
         print(f"\n Xuat danh sach file -> {output_file}")
         
+        # .jsonl / .csv / .tsv: moi entry mot ban ghi, ghi dan trong khi duyet
+        fmt = export_format(output_file)
+        if fmt:
+            self.export_entries(output_file, fmt)
+            return
+        
         with open(output_file, 'w') as f:
             f.write("# EXT4 Directory Recovery - File List\n\n")
             
-            if self.directory_tree:
-                sorted_dirs = sorted(self.directory_tree.items(), key=lambda x: x[1]['path'])
-                
-                for inode_num, dir_info in sorted_dirs:
+            if self.superblock:
+                for dir_info in self.iter_tree():
                     path = dir_info['path']
                     f.write(f"\n{path}:\n")
                     
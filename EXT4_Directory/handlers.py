@@ -391,9 +391,9 @@ def handle_show_details(image_file):
     
     for i, gd in enumerate(scanner.group_descriptors[:3]):  # Show first 3 groups
         print(f"\nGroup {i}:")
-        print(f"  Block bitmap:      {gd.bg_block_bitmap_lo}")
-        print(f"  Inode bitmap:      {gd.bg_inode_bitmap_lo}")
-        print(f"  Inode table:       {gd.bg_inode_table_lo}")
+        print(f"  Block bitmap:      {gd.get_block_bitmap()}")
+        print(f"  Inode bitmap:      {gd.get_inode_bitmap()}")
+        print(f"  Inode table:       {gd.get_inode_table()}")
         print(f"  Free blocks:       {gd.bg_free_blocks_count_lo}")
         print(f"  Free inodes:       {gd.bg_free_inodes_count_lo}")
     
@@ -7,16 +7,27 @@ import struct
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'EXT4Recovery'))
 from ext4_structures import *
 from ext4_utils import EXT4Utils
+from block_device import open_image
+from readahead import ReadaheadReader
 
 
 class PartitionScanner:
     
 
-    def __init__(self, device_path):
+    def __init__(self, device_path, direct=None):
         self.device_path = device_path
+        # direct=None: tu bo qua page cache neu la block device that
+        self.direct = direct
+        self.device = None
         self.found_partitions = []
         self.utils = EXT4Utils()
 
+    def open(self):
+        
+        if self.device is None:
+            self.device = open_image(self.device_path, use_mmap=False, direct=self.direct)
+        return self.device
+
     def scan_for_ext4(self, max_size_gb=100):
         
         print("\n" + "=" * 70)
@@ -27,7 +38,8 @@ class PartitionScanner:
             print(f"Loi: File khong ton tai: {self.device_path}")
             return False
         
-        file_size = os.path.getsize(self.device_path)
+        device = self.open()
+        file_size = device.size()
         print(f"\nFile: {self.device_path}")
         print(f"Size: {file_size:,} bytes ({file_size / 1024**3:.2f} GB)")
         
@@ -40,52 +52,49 @@ class PartitionScanner:
         scan_step = 1024 * 1024  # 1MB
         scanned = 0
         
-        for offset in range(0, max_scan, scan_step):
+        # Chi doc truoc 1KB superblock ung vien o moi buoc 1MB (khong doc ca disk)
+        candidates = ((offset + 1024, 1024) for offset in range(0, max_scan, scan_step))
+        reader = ReadaheadReader.for_segments(device, candidates, 1024)
+        
+        for sb_offset, sb_data in reader:
+            offset = sb_offset - 1024
+            
             # Hien thi tien do
             if offset % (100 * 1024 * 1024) == 0:  # Moi 100MB
                 percent = (offset / max_scan) * 100
                 print(f"  Tien do: {percent:.1f}% ({offset / 1024**3:.2f} GB)", end='\r')
             
-            # Doc 2 bytes tai vi tri magic number
             # EXT4 magic: offset + 1024 (superblock) + 56 (magic offset)
-            magic_offset = offset + 1024 + 56
-            
-            if magic_offset + 2 > file_size:
+            if len(sb_data) < 58:
                 break
             
-            data = self.utils.read_bytes(self.device_path, magic_offset, 2)
+            magic = struct.unpack_from('<H', sb_data, 56)[0]
             
-            if data and len(data) == 2:
-                magic = struct.unpack('<H', data)[0]
+            if magic == 0xEF53:
+                # Tim thay EXT4!
+                print(f"\n\n  Tim thay EXT4 tai offset: {offset:,} bytes")
                 
-                if magic == 0xEF53:
-                    # Tim thay EXT4!
-                    print(f"\n\n  Tim thay EXT4 tai offset: {offset:,} bytes")
+                # Superblock day du da co san trong segment vua doc
+                sb = self.utils.parse_superblock(bytes(sb_data))
+                
+                if sb and sb.is_valid():
+                    partition_info = {
+                        'offset': offset,
+                        'superblock_offset': sb_offset,
+                        'superblock': sb,
+                        'block_size': sb.get_block_size(),
+                        'total_size': sb.get_total_blocks() * sb.get_block_size(),
+                        'start_sector': offset // 512,
+                        'size_sectors': (sb.get_total_blocks() * sb.get_block_size()) // 512
+                    }
                     
-                    # Doc superblock day du
-                    sb_offset = offset + 1024
-                    sb_data = self.utils.read_bytes(self.device_path, sb_offset, 1024)
+                    self.found_partitions.append(partition_info)
                     
-                    if sb_data:
-                        sb = self.utils.parse_superblock(sb_data)
-                        
-                        if sb and sb.is_valid():
-                            partition_info = {
-                                'offset': offset,
-                                'superblock_offset': sb_offset,
-                                'superblock': sb,
-                                'block_size': sb.get_block_size(),
-                                'total_size': sb.get_total_blocks() * sb.get_block_size(),
-                                'start_sector': offset // 512,
-                                'size_sectors': (sb.get_total_blocks() * sb.get_block_size()) // 512
-                            }
-                            
-                            self.found_partitions.append(partition_info)
-                            
-                            print(f"    Block Size: {partition_info['block_size']} bytes")
-                            print(f"    Total Size: {partition_info['total_size'] / 1024**3:.2f} GB")
-                            print(f"    Start Sector: {partition_info['start_sector']}")
+                    print(f"    Block Size: {partition_info['block_size']} bytes")
+                    print(f"    Total Size: {partition_info['total_size'] / 1024**3:.2f} GB")
+                    print(f"    Start Sector: {partition_info['start_sector']}")
         
+        print(f"\n  {reader.format_stats()}")
         print("\n\n" + "=" * 70)
         print(f"KET QUA: Tim thay {len(self.found_partitions)} EXT4 partition(s)")
         print("=" * 70)
@@ -155,26 +164,41 @@ class PartitionScanner:
         print(f"Size: {part['total_size'] / 1024**3:.2f} GB")
         
         try:
-            with open(self.device_path, 'rb') as src:
-                src.seek(part['offset'])
+            device = self.open()
+            
+            with open(output_file, 'wb') as dst:
+                start = part['offset']
+                end = start + part['total_size']
+                chunk_size = 1024 * 1024  # 1MB
+                copied = 0
                 
-                with open(output_file, 'wb') as dst:
-                    remaining = part['total_size']
-                    chunk_size = 1024 * 1024  # 1MB
+                # Chi copy vung co du lieu; hole cua image sparse -> seek qua (giu sparse)
+                for range_offset, range_length, is_data in device.iter_ranges(start, end):
+                    if not is_data:
+                        dst.seek(range_offset + range_length - start)
+                        copied += range_length
+                        continue
                     
+                    dst.seek(range_offset - start)
+                    src_offset = range_offset
+                    remaining = range_length
                     while remaining > 0:
-                        read_size = min(chunk_size, remaining)
-                        data = src.read(read_size)
+                        data = device.pread(min(chunk_size, remaining), src_offset)
                         
                         if not data:
                             break
                         
                         dst.write(data)
                         remaining -= len(data)
+                        src_offset += len(data)
+                        copied += len(data)
                         
                         # Progress
-                        percent = ((part['total_size'] - remaining) / part['total_size']) * 100
+                        percent = (copied / part['total_size']) * 100
                         print(f"  Tien do: {percent:.1f}%", end='\r')
+                
+                # Hole o cuoi file: seek khong tao byte nao, truncate de dat dung kich thuoc
+                dst.truncate(min(end, device.size()) - start)
             
             print(f"\n\nXuat thanh cong: {output_file}")
             return True
@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import struct
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'EXT4Recovery'))
+from block_device import BlockDevice
+
 
 def check_partition_table_valid(disk_image):
     
@@ -10,8 +14,8 @@ def check_partition_table_valid(disk_image):
         return False
     
     try:
-        with open(disk_image, 'rb') as f:
-            mbr = f.read(512)
+        with BlockDevice(disk_image) as device:
+            mbr = device.pread(512, 0)
             
             # Check MBR signature (0x55AA at end)
             if len(mbr) >= 512 and mbr[510:512] == b'\x55\xaa':
@@ -59,9 +63,8 @@ def corrupt_partition_table(disk_image):
     print("\n Dang ghi de partition table...")
     
     try:
-        with open(disk_image, 'r+b') as f:
-            f.seek(0)
-            f.write(b'\x00' * 512)  # Ghi 512 bytes 0
+        with BlockDevice(disk_image, writable=True) as device:
+            device.pwrite(b'\x00' * 512, 0)  # Ghi 512 bytes 0
         
         print(" Da pha hong partition table!")
         
@@ -6,6 +6,7 @@ import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'EXT4Recovery'))
 from ext4_utils import EXT4Utils
 from ext4_structures import EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE
+from block_device import BlockDevice
 
 
 def check_and_display_filesystem(image_file, mount_point="/mnt/recovery_test"):
@@ -26,7 +27,8 @@ def check_and_display_filesystem(image_file, mount_point="/mnt/recovery_test"):
     print("\n Dang kiem tra superblock...")
     
     utils = EXT4Utils()
-    data = utils.read_bytes(image_file, EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE)
+    with BlockDevice(image_file) as device:
+        data = utils.read_bytes(device, EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE)
     
     if not data:
         print(" Khong the doc superblock!")
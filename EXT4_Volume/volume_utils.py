@@ -6,12 +6,17 @@ import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'EXT4Recovery'))
 from ext4_utils import EXT4Utils
 from ext4_structures import EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE
+from block_device import BlockDevice
 
 
 def check_superblock_valid(image_file):
     
     utils = EXT4Utils()
-    data = utils.read_bytes(image_file, EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE)
+    try:
+        with BlockDevice(image_file) as device:
+            data = utils.read_bytes(device, EXT4_SUPERBLOCK_OFFSET, EXT4_SUPERBLOCK_SIZE)
+    except OSError:
+        return False
     if not data:
         return False
     
@@ -49,9 +54,8 @@ def corrupt_superblock(image_file):
     print("\n Dang ghi de superblock tai offset 1024...")
     
     try:
-        with open(image_file, 'r+b') as f:
-            f.seek(1024)
-            f.write(b'\x00' * 100)  # Ghi 100 bytes 0
+        with BlockDevice(image_file, writable=True) as device:
+            device.pwrite(b'\x00' * 100, 1024)  # Ghi 100 bytes 0
         
         print(" Da pha hong superblock!")
         
@@ -78,38 +82,42 @@ def find_backup_superblock(image_file):
     backup_offset = None
     backup_group = None
     
-    for block_size in [4096, 2048, 1024]:
-        print(f"\n  Thu block size = {block_size} bytes...")
-        blocks_per_group = 8 * block_size
+    try:
+        device = BlockDevice(image_file)
+    except OSError:
+        return None
+    
+    with device:
+        file_size = device.size()
         
-        for group_num in [1, 3, 5, 7, 9]:
-            group_start_block = group_num * blocks_per_group
-            
-            if block_size == 1024:
-                offset = group_start_block * block_size + 1024
-            else:
-                offset = group_start_block * block_size
+        for block_size in [4096, 2048, 1024]:
+            print(f"\n  Thu block size = {block_size} bytes...")
+            blocks_per_group = 8 * block_size
             
-            try:
-                file_size = os.path.getsize(image_file)
+            for group_num in [1, 3, 5, 7, 9]:
+                group_start_block = group_num * blocks_per_group
+                
+                if block_size == 1024:
+                    offset = group_start_block * block_size + 1024
+                else:
+                    offset = group_start_block * block_size
+                
                 if offset + 1024 > file_size:
                     continue
-            except:
-                continue
+                
+                data = utils.read_bytes(device, offset, 1024)
+                if data:
+                    sb = utils.parse_superblock(data)
+                    if sb and sb.is_valid():
+                        backup_sb_data = data
+                        block_size_found = block_size
+                        backup_offset = offset
+                        backup_group = group_num
+                        print(f"   Tim thay backup tai group {group_num} (offset: {offset})")
+                        break
             
-            data = utils.read_bytes(image_file, offset, 1024)
-            if data:
-                sb = utils.parse_superblock(data)
-                if sb and sb.is_valid():
-                    backup_sb_data = data
-                    block_size_found = block_size
-                    backup_offset = offset
-                    backup_group = group_num
-                    print(f"   Tim thay backup tai group {group_num} (offset: {offset})")
-                    break
-        
-        if backup_sb_data:
-            break
+            if backup_sb_data:
+                break
     
     if backup_sb_data:
         return {
@@ -140,9 +148,9 @@ def restore_superblock_from_backup(image_file, backup_data):
     print("\n Dang ghi superblock...")
     
     try:
-        with open(image_file, 'r+b') as f:
-            f.seek(1024)
-            f.write(backup_data)
+        with BlockDevice(image_file, writable=True) as device:
+            device.pwrite(backup_data, 1024)
+            device.flush()
         
         return True
         